@@ -0,0 +1,12 @@
+from enum import Enum
+
+
+class EntityTasks(Enum):
+    """
+What an entity is doing, stored as one byte per entity.
+    """
+
+    IDLE = 0
+    MOVING = 1
+    WORKING = 2
+    ATTACKING = 3
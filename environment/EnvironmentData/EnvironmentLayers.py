@@ -0,0 +1,11 @@
+from enum import Enum, auto
+
+
+class EnvironmentLayers(Enum):
+    """
+The parts of an environment that generators read from and write to.
+    """
+
+    TERRAIN = auto()
+    STRUCTURES = auto()
+    PLAYER_BASES = auto()
@@ -0,0 +1,14 @@
+from enum import Enum
+
+
+class TimerEvents(Enum):
+    """
+The kinds of event fired by a Simulation's timers, each event is a tuple starting with its kind.
+    """
+
+    # (SPAWNED, spawner id, the ids of the entities spawned)
+    SPAWNED = 0
+    # (BUILD_FINISHED, blueprint id)
+    BUILD_FINISHED = 1
+    # (HARVESTED, entity id), once per harvest interval of a harvesting entity
+    HARVESTED = 2
@@ -1,2 +1,9 @@
 from .GridSquareStructures import GridSquareStructures
 from .GridSquareTerrain import GridSquareTerrain
+from .EnvironmentLayers import EnvironmentLayers
+from .EntityTasks import EntityTasks
+from .TimerEvents import TimerEvents
+
+# Lookups from the value stored in an environment's arrays back to the enum, index 0 is unused as enum values start at 1
+TERRAIN_BY_VALUE: tuple[GridSquareTerrain | None, ...] = (None, *GridSquareTerrain)
+STRUCTURE_BY_VALUE: tuple[GridSquareStructures | None, ...] = (None, *GridSquareStructures)
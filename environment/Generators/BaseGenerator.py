@@ -1,14 +1,24 @@
 from abc import ABC
 
-from .. import NoiseMap, Environment
+from .. import NoiseMap, NoiseMapCache, Profiler, Environment
+from ..EnvironmentData import EnvironmentLayers
 
 
 class BaseGenerator(ABC):
     """
 A base class of an environment generator.
 Used to generate specific aspects of the environment, e.g. terrain.
+Children declare the layers of the environment they read and write, the GeneratorHandler uses these to order the
+generators and to skip the ones with nothing new to do.
     """
 
+    # The layers of the environment the noise map and generate depend on
+    reads: frozenset[EnvironmentLayers] = frozenset()
+    # The layers of reads the noise map depends on, the others only change what generate does with it
+    noise_reads: frozenset[EnvironmentLayers] = frozenset()
+    # The layers of the environment generate changes
+    writes: frozenset[EnvironmentLayers] = frozenset()
+
     def __init__(self, environment: Environment):
         """
         :param environment: The environment the generator works on.
@@ -17,6 +27,13 @@ Used to generate specific aspects of the environment, e.g. terrain.
         self.environment = environment
 
         self.noise_map: NoiseMap = NoiseMap(environment.x_size, environment.y_size)
+
+        # The number of processes used to generate the noise, the result is the same for any number
+        self.workers: int = 1
+        # Where generated noise maps are saved to and loaded from, if anywhere
+        self.noise_map_cache: NoiseMapCache | None = None
+        # Records how long normalising the noise map takes, if given
+        self.profiler: Profiler | None = None
         
         self._out_of_date: bool = True
         self._out_of_date_save: bool = True
@@ -24,6 +41,19 @@ Used to generate specific aspects of the environment, e.g. terrain.
     @property
     def is_out_of_date(self):
         return self._out_of_date
+
+    @property
+    def parameters(self) -> dict[str, object]:
+        """
+Every parameter of the generator that can be set, by name, e.g. the seed.
+        """
+
+        names = {name
+                 for cls in type(self).__mro__
+                 for name, attribute in vars(cls).items()
+                 if isinstance(attribute, property) and attribute.fset is not None}
+
+        return {name: getattr(self, name) for name in sorted(names)}
         
     def make_out_of_date(self):
         self._out_of_date = True
@@ -37,6 +67,58 @@ Used to generate specific aspects of the environment, e.g. terrain.
     def return_out_of_date(self):
         self._out_of_date = self._out_of_date_save
 
+    def noise_map_key(self) -> str:
+        """
+Returns the key of the noise map in the noise map cache.
+Made from the type of generator, its parameters, the size of the environment and every layer the noise map reads.
+        """
+
+        parts = [type(self).__qualname__, self.parameters, self.environment.x_size, self.environment.y_size]
+
+        for layer in sorted(self.noise_reads, key=lambda read: read.value):
+            if layer == EnvironmentLayers.TERRAIN:
+                parts.append(self.environment.terrain_values)
+            elif layer == EnvironmentLayers.STRUCTURES:
+                parts.append(self.environment.structure_values)
+            elif layer == EnvironmentLayers.PLAYER_BASES:
+                parts.append(self.environment.player_base_locations)
+
+        return NoiseMapCache.make_key(*parts)
+
+    def load_cached_noise_map(self) -> bool:
+        """
+Loads the noise map from the noise map cache, if there is a cache and the map is in it.
+        :return: True if the noise map was loaded and is now in date.
+        """
+
+        if self.noise_map_cache is None:
+            return False
+
+        values = self.noise_map_cache.load(self.noise_map_key())
+        if values is None:
+            return False
+
+        self.noise_map.set_values(values)
+        self.make_in_date()
+
+        return True
+
+    def store_cached_noise_map(self):
+        """
+Saves the noise map to the noise map cache, if there is one.
+        """
+
+        if self.noise_map_cache is not None:
+            self.noise_map_cache.store(self.noise_map_key(), self.noise_map.values)
+
+    def _normalise_noise_map(self, make_min_0: bool = True):
+        """
+Normalises the noise map, recorded as a stage in the profiler if there is one.
+        """
+
+        with Profiler.stage_of(self.profiler, Profiler.NORMALISE, self.noise_map.values.size, type(self).__name__):
+            self.noise_map.normalise_values(make_min_0)
+
     def generate_noise_map(self):
         raise NotImplementedError
 
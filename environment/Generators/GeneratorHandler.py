@@ -1,26 +1,162 @@
 from . import BaseGenerator
+from .. import NoiseMapCache, Profiler
+from ..EnvironmentData import EnvironmentLayers
 
 
 class GeneratorHandler:
     """
 Holds multiple generator objects and handles the creation of the noise map and changing of the environment for them all.
+The generators are run in the order of what they read and write, e.g. terrain before the generators that read the
+terrain, and a generator is only run again if its parameters or something it reads have changed.
     """
 
-    def __init__(self, *args: BaseGenerator):
+    def __init__(self, *args: BaseGenerator, workers: int | None = None, noise_map_cache: NoiseMapCache | None = None,
+                 profiler: Profiler | None = None):
         """
 Takes in any number of BaseGenerator children.
-Generators that change terrain should come first so ones that use the terrain can work correctly.
+Generators that both read what the other writes, e.g. two structure generators, are run in the order given.
+        :param workers: If given then every generator generates its noise map across this many processes, the maps are
+        the same as generating them in one process.
+        :param noise_map_cache: If given then every generator loads its noise map from, and saves it to, this cache.
+        :param profiler: If given then every stage of generating, and the connection updates of the environments, are
+        recorded in it.
         """
 
         self.generators: list[BaseGenerator] = list(args)
 
-    def generate(self):
+        if workers is not None:
+            assert workers >= 1, "Workers must be a positive integer"
+
+            for generator in self.generators:
+                generator.workers = workers
+
+        if noise_map_cache is not None:
+            for generator in self.generators:
+                generator.noise_map_cache = noise_map_cache
+
+        self.profiler: Profiler | None = profiler
+
+        if profiler is not None:
+            for generator in self.generators:
+                generator.profiler = profiler
+                generator.environment.profiler = profiler
+
+        # The state of every layer each generator reads, as of the end of the last generate it was part of
+        self._seen_states: dict[BaseGenerator, dict[EnvironmentLayers, object]] = {}
+
+    # region - Getters
+    @property
+    def order(self) -> list[BaseGenerator]:
         """
-Runs through every generator provided and if the noise map is out of date, generates it, otherwise just changes  the environment.
+The generators in the order they are run.
         """
 
-        for generator in self.generators:
+        return self._sort()
+
+    # endregion - Getters
+
+    def dependencies(self, generator: BaseGenerator) -> list[BaseGenerator]:
+        """
+Returns the generators that write something the given generator reads, so have to run before it.
+        """
+
+        index = self.generators.index(generator)
+        dependencies = []
+
+        for other_index, other in enumerate(self.generators):
+            if other is generator or not other.writes & generator.reads:
+                continue
+
+            # Both read what the other writes, so the order given decides
+            if generator.writes & other.reads and index < other_index:
+                continue
+
+            dependencies.append(other)
+
+        return dependencies
+
+    def generate(self, force: bool = False) -> list[BaseGenerator]:
+        """
+Runs through every generator that has anything new to do, generating the noise map first if it is out of date.
+A generator has something new to do if its parameters changed, a layer it reads was changed outside of the handler,
+or a generator it depends on was run.
+The noise map is only generated again if its parameters or a layer the noise map reads changed, otherwise only generate
+is run again, e.g. trees are placed again around new structures on the same noise map.
+        :param force: If true then every generator is run.
+        :return: The generators that were run, in order.
+        """
+
+        ran: list[BaseGenerator] = []
+
+        for generator in self._sort():
+            seen_states = self._seen_states.get(generator)
+            layer_states = self._layer_states(generator)
+            changed_layers = (set(generator.reads) if seen_states is None or force else
+                              {layer for layer in generator.reads if seen_states[layer] != layer_states[layer]})
+
+            for dependency in self.dependencies(generator):
+                if dependency in ran:
+                    changed_layers |= dependency.writes & generator.reads
+
+            if not force and not changed_layers and not generator.is_out_of_date:
+                continue
+
+            # The noise maps are worked out from what the noise map reads, so they need redoing too
+            if force or changed_layers & generator.noise_reads:
+                generator.make_out_of_date()
+
+            cells = generator.environment.x_size * generator.environment.y_size
+            label = type(generator).__name__
+
             if generator.is_out_of_date:
-                generator.generate_noise_map()
+                with Profiler.stage_of(self.profiler, Profiler.NOISE_MAP, cells, label):
+                    generator.generate_noise_map()
+
+            with Profiler.stage_of(self.profiler, Profiler.APPLY, cells, label):
+                generator.generate()
+
+            ran.append(generator)
+
+        for generator in self.generators:
+            self._seen_states[generator] = self._layer_states(generator)
+
+        return ran
+
+    def _sort(self) -> list[BaseGenerator]:
+        """
+Orders the generators so each comes after everything it depends on, otherwise keeping the order given.
+        """
+
+        remaining = self.generators.copy()
+        dependencies = {generator: self.dependencies(generator) for generator in remaining}
+        order = []
+
+        while remaining:
+            for generator in remaining:
+                if all(dependency in order for dependency in dependencies[generator]):
+                    order.append(generator)
+                    remaining.remove(generator)
+                    break
+            else:
+                raise ValueError(f"Generators depend on each other in a loop: {remaining}")
+
+        return order
+
+    @staticmethod
+    def _layer_states(generator: BaseGenerator) -> dict[EnvironmentLayers, object]:
+        """
+Returns something that changes whenever a layer the generator reads changes.
+        """
+
+        environment = generator.environment
+        states = {}
+
+        for layer in generator.reads:
+            if layer == EnvironmentLayers.TERRAIN:
+                states[layer] = environment.terrain_version
+            elif layer == EnvironmentLayers.STRUCTURES:
+                states[layer] = environment.structure_version
+            elif layer == EnvironmentLayers.PLAYER_BASES:
+                states[layer] = tuple(environment.player_base_locations)
 
-            generator.generate()
+        return states
@@ -1,10 +1,8 @@
-from math import sqrt
-
-from perlin_noise import PerlinNoise
+import numpy as np
 
 from . import BaseGenerator
-from .. import Environment
-from ..EnvironmentData import GridSquareTerrain, GridSquareStructures
+from .. import Environment, NoiseEngine
+from ..EnvironmentData import GridSquareTerrain, GridSquareStructures, EnvironmentLayers
 
 
 class StoneGenerator(BaseGenerator):
@@ -12,6 +10,11 @@ class StoneGenerator(BaseGenerator):
 Allows for the generation of stone deposits for the given environment.
     """
 
+    reads = frozenset({EnvironmentLayers.TERRAIN, EnvironmentLayers.STRUCTURES, EnvironmentLayers.PLAYER_BASES})
+    # Structures are only checked when placing, not in the noise map
+    noise_reads = frozenset({EnvironmentLayers.TERRAIN, EnvironmentLayers.PLAYER_BASES})
+    writes = frozenset({EnvironmentLayers.STRUCTURES})
+
     def __init__(self,
                  environment: Environment,
                  seed: int = 1,
@@ -164,53 +167,23 @@ Generates the noise map using the information stored.
 Should be called after changing any values.
         """
 
-        # Mr Clean 2
-        self.noise_map.clear()
+        if self.load_cached_noise_map():
+            return
 
         # Add perlin noise
-        all_noise = [PerlinNoise(octaves=octave, seed=self._seed) for octave in self._octaves]
-        for y in range(self.environment.y_size):
-            for x in range(self.environment.x_size):
-                for i, noise in enumerate(all_noise, start=2):
-                    self.noise_map[x, y] += noise([x / self.environment.x_size, y / self.environment.y_size]) / i
-
-        self.noise_map.normalise_values()
-
-        # Terrain base chances
-        for y in range(self.environment.y_size):
-            for x in range(self.environment.x_size):
-                terrain = self.environment[x, y].terrain
-
-                if terrain == GridSquareTerrain.CLEAR:
-                    if self._clear_terrain_base_chance < 0:
-                        self.noise_map[x, y] = float('-inf')
-                    else:
-                        self.noise_map[x, y] += self._clear_terrain_base_chance
-
-                elif terrain == GridSquareTerrain.HILL:
-                    if self._hill_terrain_base_chance < 0:
-                        self.noise_map[x, y] = float('-inf')
-                    else:
-                        self.noise_map[x, y] += self._hill_terrain_base_chance
-
-                elif terrain == GridSquareTerrain.MOUNTAIN:
-                    if self._mountain_terrain_base_chance < 0:
-                        self.noise_map[x, y] = float('-inf')
-                    else:
-                        self.noise_map[x, y] += self._mountain_terrain_base_chance
-
-                elif terrain == GridSquareTerrain.SNOW:
-                    if self._snow_terrain_base_chance < 0:
-                        self.noise_map[x, y] = float('-inf')
-                    else:
-                        self.noise_map[x, y] += self._snow_terrain_base_chance
-
-                # Remove close to bases
-                for location in self.environment.player_base_locations:
-                    distance = sqrt((location[0] - x) ** 2 + (location[1] - y) ** 2)
-
-                    if distance < self._player_base_radius:
-                        self.noise_map[x, y] = 0
+        noise_engine = NoiseEngine(self._seed, self._octaves, self.workers)
+        values = noise_engine.generate(self.environment.x_size, self.environment.y_size)
+        self.noise_map.set_values(values)
+
+        self._normalise_noise_map()
+
+        # Terrain base chances, negative means no stone
+        self.noise_map.add(self._terrain_chances(set_negative_to=float('-inf'))[self.environment.terrain_values])
+
+        # Remove close to bases
+        self.noise_map.values[self.environment.get_player_base_mask(self._player_base_radius)] = 0
+
+        self.store_cached_noise_map()
 
         # In date
         self.make_in_date()
@@ -224,13 +197,28 @@ Ignores any grid squares that already have a structure.
         assert self.is_out_of_date is False, "Current noise map is out of date, please call generate_noise_map before " \
                                             "this"
 
-        for y in range(self.environment.y_size):
-            for x in range(self.environment.x_size):
-                if self.environment[x, y].terrain == GridSquareTerrain.RIVER:
-                    continue
+        stone = (
+                (self.noise_map.values > 0.85)
+                & (self.environment.terrain_values != GridSquareTerrain.RIVER.value)
+                & (self.environment.structure_values == GridSquareStructures.NONE.value)
+        )
+
+        structures = self.environment.structure_values.copy()
+        structures[stone] = GridSquareStructures.STONE.value
+        self.environment.set_structure_values(structures)
+
+    def _terrain_chances(self, set_negative_to: float) -> np.ndarray:
+        """
+Returns the base chance of every terrain as an array indexed by the terrain value, 0 for terrains without a chance.
+        :param set_negative_to: What negative chances are replaced with.
+        """
+
+        chances = np.zeros(len(GridSquareTerrain) + 1, dtype=np.float64)
 
-                if self.environment[x, y].structure != GridSquareStructures.NONE:
-                    continue
+        for terrain, chance in ((GridSquareTerrain.CLEAR, self._clear_terrain_base_chance),
+                                (GridSquareTerrain.HILL, self._hill_terrain_base_chance),
+                                (GridSquareTerrain.MOUNTAIN, self._mountain_terrain_base_chance),
+                                (GridSquareTerrain.SNOW, self._snow_terrain_base_chance)):
+            chances[terrain.value] = set_negative_to if chance < 0 else chance
 
-                if self.noise_map[x, y] > 0.85:
-                    self.environment[x, y].structure = GridSquareStructures.STONE
+        return chances
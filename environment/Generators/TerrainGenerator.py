@@ -1,10 +1,10 @@
 from math import sqrt
 
-from perlin_noise import PerlinNoise
+import numpy as np
 
 from . import BaseGenerator
-from .. import Environment
-from ..EnvironmentData import GridSquareTerrain
+from .. import Environment, NoiseEngine
+from ..EnvironmentData import GridSquareTerrain, EnvironmentLayers
 
 
 class TerrainGenerator(BaseGenerator):
@@ -12,6 +12,8 @@ class TerrainGenerator(BaseGenerator):
 Allows for the generation of terrain for the given environment.
     """
 
+    writes = frozenset({EnvironmentLayers.TERRAIN})
+
     def __init__(self,
                  environment: Environment,
                  seed: int = 1,
@@ -136,26 +138,29 @@ Generates the noise map using the information stored.
 Should be called after changing any values.
         """
 
-        all_noise = [PerlinNoise(octaves=octave, seed=self._seed) for octave in self._octaves]
+        if self.load_cached_noise_map():
+            return
 
-        center_x, center_y = self.environment.x_size / 2, self.environment.y_size / 2
+        x_size, y_size = self.environment.x_size, self.environment.y_size
+        center_x, center_y = x_size / 2, y_size / 2
 
         largest_value = sqrt(center_x * center_x + center_y * center_y)
 
-        self.noise_map.clear()
+        # Distance from the center, the squares are done per axis so they match the per cell maths exactly
+        x_squared = np.array([(x - center_x) ** 2 for x in range(x_size)], dtype=np.float64)
+        y_squared = np.array([(y - center_y) ** 2 for y in range(y_size)], dtype=np.float64)
 
-        for y in range(self.environment.y_size):
-            for x in range(self.environment.x_size):
-                value = largest_value - sqrt((x - center_x) ** 2 + (y - center_y) ** 2)
-                value /= largest_value
+        values = largest_value - np.sqrt(x_squared[np.newaxis, :] + y_squared[:, np.newaxis])
+        values /= largest_value
 
-                for i, noise in enumerate(all_noise, start=2):
-                    value += noise([x / self.environment.x_size, y / self.environment.y_size]) / i
+        values = NoiseEngine(self._seed, self._octaves, self.workers).generate(x_size, y_size, initial=values)
 
-                self.noise_map[x, y] = value
+        self.noise_map.set_values(values)
 
         # Normalise
-        self.noise_map.normalise_values()
+        self._normalise_noise_map()
+
+        self.store_cached_noise_map()
 
         # Now in date
         self.make_in_date()
@@ -168,16 +173,12 @@ Sets the terrain parameter in every grid square of the environment according to
         assert self.is_out_of_date is False, "Current noise map is out of date, please call generate_noise_map before " \
                                              "this"
 
-        for y in range(self.environment.y_size):
-            for x in range(self.environment.x_size):
-                value = self.noise_map[x, y]
+        values = self.noise_map.values
 
-                terrain_type = GridSquareTerrain.CLEAR
-                if value > self._snow_height:
-                    terrain_type = GridSquareTerrain.SNOW
-                elif value > self._mountain_height:
-                    terrain_type = GridSquareTerrain.MOUNTAIN
-                elif value > self._hill_height:
-                    terrain_type = GridSquareTerrain.HILL
+        # Each height overwrites the ones below it, the heights are checked to go up in the setters
+        terrain = np.full(values.shape, GridSquareTerrain.CLEAR.value, dtype=np.uint8)
+        terrain[values > self._hill_height] = GridSquareTerrain.HILL.value
+        terrain[values > self._mountain_height] = GridSquareTerrain.MOUNTAIN.value
+        terrain[values > self._snow_height] = GridSquareTerrain.SNOW.value
 
-                self.environment[x, y].terrain = terrain_type
+        self.environment.set_terrain_values(terrain)
@@ -1,11 +1,10 @@
 import random
-from math import sqrt
 
-from perlin_noise import PerlinNoise
+import numpy as np
 
 from . import BaseGenerator
-from .. import Environment
-from ..EnvironmentData import GridSquareTerrain, GridSquareStructures
+from .. import Environment, NoiseEngine
+from ..EnvironmentData import GridSquareTerrain, GridSquareStructures, EnvironmentLayers
 
 
 class TreeGenerator(BaseGenerator):
@@ -13,6 +12,11 @@ class TreeGenerator(BaseGenerator):
 Allows for the generation of trees for the given environment.
     """
 
+    reads = frozenset({EnvironmentLayers.TERRAIN, EnvironmentLayers.STRUCTURES, EnvironmentLayers.PLAYER_BASES})
+    # Structures are only checked when placing, not in the noise map
+    noise_reads = frozenset({EnvironmentLayers.TERRAIN, EnvironmentLayers.PLAYER_BASES})
+    writes = frozenset({EnvironmentLayers.STRUCTURES})
+
     def __init__(self,
                  environment: Environment,
                  seed: int = 1,
@@ -219,58 +223,29 @@ Generates the noise map using the information stored.
 Should be called after changing any values.
         """
 
+        if self.load_cached_noise_map():
+            return
+
         # Mr Clean
         self.noise_map.clear()
 
-        # Terrain base chances
-        for y in range(self.environment.y_size):
-            for x in range(self.environment.x_size):
-                terrain = self.environment[x, y].terrain
-
-                if terrain == GridSquareTerrain.CLEAR:
-                    if self._clear_terrain_base_chance < 0:
-                        self.noise_map[x, y] = float('-inf')
-                    else:
-                        self.noise_map[x, y] = self._clear_terrain_base_chance
-
-                elif terrain == GridSquareTerrain.HILL:
-                    if self._hill_terrain_base_chance < 0:
-                        self.noise_map[x, y] = float('-inf')
-                    else:
-                        self.noise_map[x, y] = self._hill_terrain_base_chance
-
-                elif terrain == GridSquareTerrain.MOUNTAIN:
-                    if self._mountain_terrain_base_chance < 0:
-                        self.noise_map[x, y] = float('-inf')
-                    else:
-                        self.noise_map[x, y] = self._mountain_terrain_base_chance
-
-                elif terrain == GridSquareTerrain.SNOW:
-                    if self._snow_terrain_base_chance < 0:
-                        self.noise_map[x, y] = float('-inf')
-                    else:
-                        self.noise_map[x, y] = self._snow_terrain_base_chance
-
-                # Player Base, base chance
-                if self._player_base_tree_chance < 0:
-                    continue
-
-                for location in self.environment.player_base_locations:
-                    distance = sqrt((location[0] - x) ** 2 + (location[1] - y) ** 2)
-
-                    if distance < self._player_base_radius:
-                        self.noise_map[x, y] = self._player_base_tree_chance
+        # Terrain base chances, negative means no trees
+        self.noise_map.set_values(self._terrain_chances(set_negative_to=float('-inf'))[self.environment.terrain_values])
 
-        # Perlin noise time
-        all_noise = [PerlinNoise(octaves=octave, seed=self._seed) for octave in self._octaves]
+        # Player Base, base chance
+        if self._player_base_tree_chance >= 0:
+            self.noise_map.values[self.environment.get_player_base_mask(self._player_base_radius)] = \
+                self._player_base_tree_chance
 
-        for y in range(self.environment.y_size):
-            for x in range(self.environment.x_size):
-                for i, noise in enumerate(all_noise, start=2):
-                    self.noise_map[x, y] += noise([x / self.environment.x_size, y / self.environment.y_size]) / i
+        # Perlin noise time
+        noise_engine = NoiseEngine(self._seed, self._octaves, self.workers)
+        values = noise_engine.generate(self.environment.x_size, self.environment.y_size, initial=self.noise_map.values)
+        self.noise_map.set_values(values)
 
         # Normalise
-        self.noise_map.normalise_values(make_min_0=False)
+        self._normalise_noise_map(make_min_0=False)
+
+        self.store_cached_noise_map()
 
         # Now in date
         self.make_in_date()
@@ -287,43 +262,26 @@ Ignores any grid squares that already have a structure.
         # Kinda seedy
         random.seed(self._seed)
 
-        # Generate the trees
-        for y in range(self.environment.y_size):
-            for x in range(self.environment.x_size):
-                number = random.random()
+        # Generate the trees, a random number for every grid square in one go
+        numbers = _random_values(self.environment.y_size * self.environment.x_size)
+        numbers = numbers.reshape(self.environment.y_size, self.environment.x_size)
 
-                if self.environment[x, y].terrain == GridSquareTerrain.RIVER:
-                    continue
+        trees = (
+                (numbers < self.noise_map.values)
+                & (self.environment.terrain_values != GridSquareTerrain.RIVER.value)
+                & (self.environment.structure_values == GridSquareStructures.NONE.value)
+        )
 
-                if self.environment[x, y].structure != GridSquareStructures.NONE:
-                    continue
-
-                if number < self.noise_map[x, y]:
-                    self.environment[x, y].structure = GridSquareStructures.TREE
+        structures = self.environment.structure_values.copy()
+        structures[trees] = GridSquareStructures.TREE.value
+        self.environment.set_structure_values(structures)
 
         # Check for the min and max number of trees
         for location in self.environment.player_base_locations:
-            grid_squares_with_trees = []
-
-            y_min = location[1] - self._player_base_radius
-            y_min = y_min if y_min > 0 else 0
-            y_max = location[1] + self._player_base_radius + 1
-            y_max = y_max if y_max < self.environment.y_size else self.environment.y_size
-
-            x_min = location[0] - self._player_base_radius
-            x_min = x_min if x_min > 0 else 0
-            x_max = location[0] + self._player_base_radius + 1
-            x_max = x_max if x_max < self.environment.y_size else self.environment.x_size
-
-            for y in range(y_min, y_max):
-                for x in range(x_min, x_max):
-                    distance = sqrt((location[0] - x) ** 2 + (location[1] - y) ** 2)
+            # Every grid square within the radius of this base, in the order of the rows
+            in_radius = self.environment.get_player_base_mask(self._player_base_radius, location, inclusive=True)
 
-                    if distance > self._player_base_radius:
-                        continue
-
-                    if self.environment[x, y].structure == GridSquareStructures.TREE:
-                        grid_squares_with_trees.append(self.environment[x, y])
+            grid_squares_with_trees = self._grid_squares_with(in_radius, GridSquareStructures.TREE)
 
             # Too many trees
             if len(grid_squares_with_trees) > self._player_base_max_num_trees:
@@ -335,7 +293,7 @@ Ignores any grid squares that already have a structure.
 
                 # Remove trees
                 for i in range(num_to_remove):
-                    grid_squares_with_trees[i].structure = GridSquareStructures.NONE
+                    self.environment.set_structure(*grid_squares_with_trees[i], GridSquareStructures.NONE)
 
             # Too little trees
             elif len(grid_squares_with_trees) < self._player_base_min_num_trees:
@@ -343,17 +301,7 @@ Ignores any grid squares that already have a structure.
                 num_to_add = self._player_base_min_num_trees - len(grid_squares_with_trees) + 1
 
                 # Get all grid squares with no structures
-                grid_squares_with_no_structures = []
-
-                for y in range(y_min, y_max):
-                    for x in range(x_min, x_max):
-                        distance = sqrt((location[0] - x) ** 2 + (location[1] - y) ** 2)
-
-                        if distance > self._player_base_radius:
-                            continue
-
-                        if self.environment[x, y].structure == GridSquareStructures.NONE:
-                            grid_squares_with_no_structures.append(self.environment[x, y])
+                grid_squares_with_no_structures = self._grid_squares_with(in_radius, GridSquareStructures.NONE)
 
                 # Prevent index errors
                 if num_to_add > len(grid_squares_with_no_structures):
@@ -362,4 +310,54 @@ Ignores any grid squares that already have a structure.
                 # Shuffle and add
                 random.shuffle(grid_squares_with_no_structures)
                 for i in range(num_to_add):
-                    grid_squares_with_no_structures[i].structure = GridSquareStructures.TREE
+                    self.environment.set_structure(*grid_squares_with_no_structures[i], GridSquareStructures.TREE)
+
+    def _grid_squares_with(self, mask: np.ndarray, structure: GridSquareStructures) -> list[tuple[int, int]]:
+        """
+Returns the coordinates of the grid squares in the mask with the given structure, going along each row in turn.
+        """
+
+        y_coords, x_coords = np.nonzero(mask & (self.environment.structure_values == structure.value))
+
+        return list(zip(x_coords.tolist(), y_coords.tolist()))
+
+    def _terrain_chances(self, set_negative_to: float) -> np.ndarray:
+        """
+Returns the base chance of every terrain as an array indexed by the terrain value, 0 for terrains without a chance.
+        :param set_negative_to: What negative chances are replaced with.
+        """
+
+        chances = np.zeros(len(GridSquareTerrain) + 1, dtype=np.float64)
+
+        for terrain, chance in ((GridSquareTerrain.CLEAR, self._clear_terrain_base_chance),
+                                (GridSquareTerrain.HILL, self._hill_terrain_base_chance),
+                                (GridSquareTerrain.MOUNTAIN, self._mountain_terrain_base_chance),
+                                (GridSquareTerrain.SNOW, self._snow_terrain_base_chance)):
+            chances[terrain.value] = set_negative_to if chance < 0 else chance
+
+        return chances
+
+
+def _random_values(count: int) -> np.ndarray:
+    """
+Returns the next count values of random.random() all at once, then moves the random module on past them.
+Draws from a numpy MT19937 given the same state, so the values and everything random afterwards are the same as
+calling random.random() count times.
+    """
+
+    version, internal_state, gauss_next = random.getstate()
+
+    bit_generator = np.random.MT19937()
+    bit_generator.state = {
+        "bit_generator": "MT19937",
+        "state": {"key": np.array(internal_state[:-1], dtype=np.uint32), "pos": internal_state[-1]}
+    }
+
+    # random.random() makes a 53 bit float out of two 32 bit numbers
+    raw = bit_generator.random_raw(2 * count).reshape(count, 2)
+    values = ((raw[:, 0] >> 5) * 67108864. + (raw[:, 1] >> 6)) * (1. / 9007199254740992.)
+
+    state = bit_generator.state["state"]
+    random.setstate((version, (*state["key"].tolist(), int(state["pos"])), gauss_next))
+
+    return values
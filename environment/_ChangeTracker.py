@@ -0,0 +1,59 @@
+class ChangeTracker:
+    """
+Collects the coordinates of grid squares that changed in an environment until they are cleared.
+Anything that caches data worked out from the environment can add one to the environment and only redo the parts
+that changed.
+    """
+
+    def __init__(self, all_changed: bool = False):
+        """
+        :param all_changed: If true then starts off with every grid square counted as changed.
+        """
+
+        self._cells: set[tuple[int, int]] = set()
+
+        # True when every grid square counts as changed, no need to track individual cells then
+        self._all_changed: bool = all_changed
+
+    # region - Getters
+    @property
+    def cells(self) -> set[tuple[int, int]]:
+        """
+The grid squares that changed, empty if every grid square changed, check all_changed for that.
+        """
+
+        return self._cells
+
+    @property
+    def all_changed(self) -> bool:
+        return self._all_changed
+
+    @property
+    def has_changes(self) -> bool:
+        return self._all_changed or bool(self._cells)
+
+    # endregion - Getters
+
+    def mark(self, x: int, y: int):
+        """
+Records that the grid square changed.
+        """
+
+        if not self._all_changed:
+            self._cells.add((x, y))
+
+    def mark_all(self):
+        """
+Records that every grid square changed.
+        """
+
+        self._all_changed = True
+        self._cells.clear()
+
+    def clear(self):
+        """
+Forgets every change, call once the changes have been dealt with.
+        """
+
+        self._all_changed = False
+        self._cells.clear()
@@ -0,0 +1,359 @@
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from . import NoiseEngine, MapFile
+from .EnvironmentData import GridSquareTerrain, GridSquareStructures
+
+# The noise from the noise engine stays within about plus or minus this, used to normalise without seeing every value
+_NOISE_RANGE: float = 0.4
+
+
+class Chunk:
+    """
+A square of grid squares in an endless world, holding the terrain and structure values indexed [y, x].
+    """
+
+    def __init__(self, chunk_x: int, chunk_y: int, terrain: np.ndarray, structures: np.ndarray):
+        self.chunk_x: int = chunk_x
+        self.chunk_y: int = chunk_y
+
+        self.terrain: np.ndarray = terrain
+        self.structures: np.ndarray = structures
+
+        # True if changed since generated, so it has to be saved rather than thrown away when evicted
+        self.modified: bool = False
+
+    def get_terrain(self, x: int, y: int) -> GridSquareTerrain:
+        """
+Returns the terrain of the grid square, x and y are within the chunk.
+        """
+
+        return GridSquareTerrain(self.terrain.item(y, x))
+
+    def set_terrain(self, x: int, y: int, terrain: GridSquareTerrain):
+        if self.terrain[y, x] != terrain.value:
+            self.terrain[y, x] = terrain.value
+            self.modified = True
+
+    def get_structure(self, x: int, y: int) -> GridSquareStructures:
+        """
+Returns the structure of the grid square, x and y are within the chunk.
+        """
+
+        return GridSquareStructures(self.structures.item(y, x))
+
+    def set_structure(self, x: int, y: int, structure: GridSquareStructures):
+        if self.structures[y, x] != structure.value:
+            self.structures[y, x] = structure.value
+            self.modified = True
+
+
+class ChunkManager:
+    """
+An endless world of terrain, trees and stone, generated a chunk at a time as it is needed.
+The noise is worked out from world coordinates, so chunks line up seamlessly whatever order they are made in, and the
+random numbers are seeded per chunk so a chunk always comes out the same.
+Only a bounded number of chunks are kept in memory, the least recently used one is evicted after that: thrown away if
+it can be generated again, saved to the directory if it has been changed.
+The rules are the same as the Terrain, Tree and Stone generators, but without the falloff towards the edges of the
+map, player bases, or normalising by the min and max of the whole map, as there is no whole map.
+    """
+
+    def __init__(self,
+                 seed: int = 1,
+                 chunk_size: int = 64,
+                 noise_scale: int = 512,
+                 max_resident_chunks: int = 64,
+                 directory: str | None = None,
+                 terrain_octaves: list[int] | None = None,
+                 tree_octaves: list[int] | None = None,
+                 stone_octaves: list[int] | None = None,
+                 terrain_heights: dict[GridSquareTerrain, float] | None = None,
+                 tree_chances: dict[GridSquareTerrain, float] | None = None,
+                 stone_chances: dict[GridSquareTerrain, float] | None = None,
+                 stone_threshold: float = 0.85):
+        """
+        :param seed: The seed for the noise and random numbers. Same seed -> same world.
+        :param chunk_size: The width and height of each chunk.
+        :param noise_scale: The number of grid squares the octaves are spread over, the same as the size of a map.
+        :param max_resident_chunks: The most chunks to keep in memory.
+        :param directory: Where changed chunks are saved to when evicted.
+        If not given a temporary directory is used, deleted by close.
+        :param terrain_octaves: The octaves of the terrain noise, default is [3, 6, 12, 24].
+        :param tree_octaves: The octaves of the tree noise, default is [5, 10].
+        :param stone_octaves: The octaves of the stone noise, default is [30, 60].
+        :param terrain_heights: The minimum height of each terrain, anything lower is clear.
+        Default is hill 0.5, mountain 0.75, snow 0.9.
+        :param tree_chances: The base chance of trees on each terrain, negative means no trees.
+        Default is clear 0.1, hill 0.05, mountain 0.001, snow -1.
+        :param stone_chances: The base chance of stone on each terrain, negative means no stone.
+        Default is clear -1, hill 0, mountain 0.15, snow 0.25.
+        :param stone_threshold: The value the stone noise has to be over for stone to be placed.
+        """
+
+        assert chunk_size > 0, "Chunk size must be a positive integer"
+        assert noise_scale > 0, "Noise scale must be a positive integer"
+        assert max_resident_chunks > 0, "Max resident chunks must be a positive integer"
+
+        self.seed: int = seed
+        self.chunk_size: int = chunk_size
+        self.noise_scale: int = noise_scale
+        self.max_resident_chunks: int = max_resident_chunks
+
+        # Made when first needed if not given, and deleted by close
+        self._directory: str | None = directory
+        self._temporary_directory: tempfile.TemporaryDirectory | None = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+        # Endless so the world doesn't repeat
+        self._terrain_noise: NoiseEngine = NoiseEngine(seed, terrain_octaves or [3, 6, 12, 24], endless=True)
+        self._tree_noise: NoiseEngine = NoiseEngine(seed, tree_octaves or [5, 10], endless=True)
+        self._stone_noise: NoiseEngine = NoiseEngine(seed, stone_octaves or [30, 60], endless=True)
+
+        self.terrain_heights: dict[GridSquareTerrain, float] = terrain_heights or {
+            GridSquareTerrain.HILL: 0.5,
+            GridSquareTerrain.MOUNTAIN: 0.75,
+            GridSquareTerrain.SNOW: 0.9
+        }
+        self.tree_chances: dict[GridSquareTerrain, float] = tree_chances or {
+            GridSquareTerrain.CLEAR: 0.1,
+            GridSquareTerrain.HILL: 0.05,
+            GridSquareTerrain.MOUNTAIN: 0.001,
+            GridSquareTerrain.SNOW: -1.
+        }
+        self.stone_chances: dict[GridSquareTerrain, float] = stone_chances or {
+            GridSquareTerrain.CLEAR: -1.,
+            GridSquareTerrain.HILL: 0.,
+            GridSquareTerrain.MOUNTAIN: 0.15,
+            GridSquareTerrain.SNOW: 0.25
+        }
+        self.stone_threshold: float = stone_threshold
+
+        # The chunks in memory, least recently used first
+        self._chunks: OrderedDict[tuple[int, int], Chunk] = OrderedDict()
+        # The chunks that have been saved to the directory
+        self._saved: set[tuple[int, int]] = set()
+
+        # Counters for sizing the number of resident chunks
+        self.generated: int = 0
+        self.loaded: int = 0
+        self.saved: int = 0
+        self.evicted: int = 0
+
+    # region - Getters
+    @property
+    def directory(self) -> str:
+        """
+Where changed chunks are saved, a temporary directory is made on first use if one wasn't given.
+        """
+
+        if self._directory is None:
+            self._temporary_directory = tempfile.TemporaryDirectory(prefix="chunks_")
+            self._directory = self._temporary_directory.name
+
+        return self._directory
+
+    @property
+    def resident_chunks(self) -> list[tuple[int, int]]:
+        """
+The coordinates of the chunks in memory, least recently used first.
+        """
+
+        return list(self._chunks)
+
+    # endregion - Getters
+
+    def chunk_of(self, x: int, y: int) -> tuple[int, int]:
+        """
+Returns the coordinates of the chunk the grid square is in, grid squares can be at any coordinates.
+        """
+
+        return x // self.chunk_size, y // self.chunk_size
+
+    def get_chunk(self, chunk_x: int, chunk_y: int) -> Chunk:
+        """
+Returns the chunk, loading or generating it if it isn't in memory and evicting the least recently used chunk if there
+are too many.
+        """
+
+        key = (chunk_x, chunk_y)
+        chunk = self._chunks.get(key)
+
+        if chunk is not None:
+            self._chunks.move_to_end(key)
+            return chunk
+
+        if key in self._saved:
+            terrain, structures, _ = MapFile.read(self._chunk_path(key))
+            chunk = Chunk(chunk_x, chunk_y, np.array(terrain), np.array(structures))
+            chunk.modified = True
+            self.loaded += 1
+        else:
+            chunk = self.generate_chunk(chunk_x, chunk_y)
+            self.generated += 1
+
+        self._chunks[key] = chunk
+
+        while len(self._chunks) > self.max_resident_chunks:
+            self._evict(next(iter(self._chunks)))
+
+        return chunk
+
+    def load_around(self, x: int, y: int, radius: int) -> list[Chunk]:
+        """
+Makes sure every chunk within the radius of the grid square is in memory, e.g. around each player.
+        :param radius: The distance in grid squares.
+        :return: The chunks around the grid square.
+        """
+
+        min_x, min_y = self.chunk_of(x - radius, y - radius)
+        max_x, max_y = self.chunk_of(x + radius, y + radius)
+
+        return [self.get_chunk(chunk_x, chunk_y)
+                for chunk_y in range(min_y, max_y + 1)
+                for chunk_x in range(min_x, max_x + 1)]
+
+    # region - Grid square state
+
+    def get_terrain(self, x: int, y: int) -> GridSquareTerrain:
+        chunk = self.get_chunk(*self.chunk_of(x, y))
+        return chunk.get_terrain(x - chunk.chunk_x * self.chunk_size, y - chunk.chunk_y * self.chunk_size)
+
+    def set_terrain(self, x: int, y: int, terrain: GridSquareTerrain):
+        chunk = self.get_chunk(*self.chunk_of(x, y))
+        chunk.set_terrain(x - chunk.chunk_x * self.chunk_size, y - chunk.chunk_y * self.chunk_size, terrain)
+
+    def get_structure(self, x: int, y: int) -> GridSquareStructures:
+        chunk = self.get_chunk(*self.chunk_of(x, y))
+        return chunk.get_structure(x - chunk.chunk_x * self.chunk_size, y - chunk.chunk_y * self.chunk_size)
+
+    def set_structure(self, x: int, y: int, structure: GridSquareStructures):
+        chunk = self.get_chunk(*self.chunk_of(x, y))
+        chunk.set_structure(x - chunk.chunk_x * self.chunk_size, y - chunk.chunk_y * self.chunk_size, structure)
+
+    # endregion - Grid square state
+
+    def generate_chunk(self, chunk_x: int, chunk_y: int) -> Chunk:
+        """
+Generates a chunk from the noise, the same chunk coordinates always give the same chunk.
+Doesn't add it to the chunks in memory, use get_chunk for that.
+        """
+
+        size = self.chunk_size
+        bounds = (chunk_x * size, chunk_y * size, (chunk_x + 1) * size, (chunk_y + 1) * size)
+
+        # Terrain, the noise moved into [0, 1] then binned by height
+        heights = self._normalise(self._terrain_noise.generate_tile(self.noise_scale, self.noise_scale, bounds))
+
+        terrain = np.full((size, size), GridSquareTerrain.CLEAR.value, dtype=np.uint8)
+        for terrain_type, height in sorted(self.terrain_heights.items(), key=lambda item: item[1]):
+            terrain[heights > height] = terrain_type.value
+
+        structures = np.full((size, size), GridSquareStructures.NONE.value, dtype=np.uint8)
+
+        # Trees, a random number under the terrain chance plus the noise
+        tree_chances = self._terrain_lookup(self.tree_chances)
+        trees = self._tree_noise.generate_tile(self.noise_scale, self.noise_scale, bounds, initial=tree_chances[terrain])
+        trees /= max(tree_chances.max(), 0.) + _NOISE_RANGE
+
+        rng = np.random.default_rng((self.seed, chunk_x & 0xFFFFFFFF, chunk_y & 0xFFFFFFFF))
+        structures[rng.random((size, size)) < trees] = GridSquareStructures.TREE.value
+
+        # Stone, over the threshold after adding the terrain chance, on grid squares without trees
+        stone = self._normalise(self._stone_noise.generate_tile(self.noise_scale, self.noise_scale, bounds))
+        stone += self._terrain_lookup(self.stone_chances)[terrain]
+
+        stone_placed = (stone > self.stone_threshold) & (structures == GridSquareStructures.NONE.value)
+        structures[stone_placed] = GridSquareStructures.STONE.value
+
+        return Chunk(chunk_x, chunk_y, terrain, structures)
+
+    def flush(self):
+        """
+Saves every changed chunk in memory to the directory, they stay in memory.
+        """
+
+        for key, chunk in self._chunks.items():
+            if chunk.modified:
+                self._save(key, chunk)
+
+    def close(self):
+        """
+Deletes the temporary directory if one was made, along with the chunks saved to it, as they can't be loaded again.
+A directory that was given is left alone. Chunks still in memory are kept.
+        """
+
+        if self._temporary_directory is None:
+            return
+
+        self._temporary_directory.cleanup()
+        self._temporary_directory = None
+        self._directory = None
+        self._saved.clear()
+
+    def __del__(self):
+        # Not set if __init__ failed
+        if hasattr(self, "_temporary_directory"):
+            self.close()
+
+    def stats(self) -> dict[str, int]:
+        """
+Returns the counters and how many chunks are in memory, for sizing the number of resident chunks.
+        """
+
+        return {
+            "resident": len(self._chunks),
+            "max_resident_chunks": self.max_resident_chunks,
+            "saved_chunks": len(self._saved),
+            "generated": self.generated,
+            "loaded": self.loaded,
+            "saved": self.saved,
+            "evicted": self.evicted
+        }
+
+    def _evict(self, key: tuple[int, int]):
+        chunk = self._chunks.pop(key)
+
+        # Unchanged chunks can just be generated again
+        if chunk.modified:
+            self._save(key, chunk)
+
+        self.evicted += 1
+
+    def _save(self, key: tuple[int, int], chunk: Chunk):
+        MapFile.write(self._chunk_path(key), chunk.terrain, chunk.structures,
+                      {"chunk": list(key), "chunk_size": self.chunk_size, "seed": self.seed})
+
+        self._saved.add(key)
+        self.saved += 1
+
+    def _chunk_path(self, key: tuple[int, int]) -> str:
+        return os.path.join(self.directory, f"chunk_{key[0]}_{key[1]}.map")
+
+    @staticmethod
+    def _normalise(values: np.ndarray) -> np.ndarray:
+        """
+Moves noise into [0, 1] using the range it stays within.
+        """
+
+        values += _NOISE_RANGE
+        values /= 2 * _NOISE_RANGE
+
+        return np.clip(values, 0., 1., out=values)
+
+    @staticmethod
+    def _terrain_lookup(chances: dict[GridSquareTerrain, float]) -> np.ndarray:
+        """
+Turns chances per terrain into an array indexed by terrain value, negative chances become -inf.
+        """
+
+        lookup = np.full(len(GridSquareTerrain) + 1, -np.inf, dtype=np.float64)
+
+        for terrain, chance in chances.items():
+            lookup[terrain.value] = chance if chance >= 0 else -np.inf
+
+        return lookup
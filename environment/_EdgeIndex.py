@@ -0,0 +1,158 @@
+import math
+
+import numpy as np
+
+
+class EdgeIndex:
+    """
+The weight of every connection between neighbouring grid squares, stored as one dense array per direction.
+Each connection is only stored once, from the grid square it leaves in one of the forward directions, so looking up
+or updating a weight is a direct array access.
+The weight of a connection is the largest of its length and the potential of the two grid squares it connects.
+    """
+
+    # The forward directions, the other four are these reversed
+    ORTHOGONAL_OFFSETS: tuple[tuple[int, int], ...] = ((1, 0), (0, 1))
+    DIAGONAL_OFFSETS: tuple[tuple[int, int], ...] = ((1, 1), (-1, 1))
+
+    def __init__(self, x_size: int, y_size: int, diagonal: bool = True):
+        """
+        :param x_size: The x size of the grid.
+        :param y_size: The y size of the grid.
+        :param diagonal: If true then grid squares are connected to all 8 neighbours, otherwise just the 4 orthogonal.
+        """
+
+        self._x_size: int = x_size
+        self._y_size: int = y_size
+        self._diagonal: bool = diagonal
+
+        self._offsets: tuple[tuple[int, int], ...] = self.ORTHOGONAL_OFFSETS
+        if diagonal:
+            self._offsets += self.DIAGONAL_OFFSETS
+
+        # The length of a step in each direction
+        self._lengths: tuple[float, ...] = tuple(math.sqrt(dx * dx + dy * dy) for dx, dy in self._offsets)
+
+        # Offset -> (direction, True if stored from this grid square or False if stored from the other)
+        self._lookup: dict[tuple[int, int], tuple[int, bool]] = {}
+        for direction, (dx, dy) in enumerate(self._offsets):
+            self._lookup[dx, dy] = (direction, True)
+            self._lookup[-dx, -dy] = (direction, False)
+
+        # weights[direction, y, x] is the weight of the connection from (x, y) to (x + dx, y + dy), inf if off the grid
+        self._weights: np.ndarray = np.full((len(self._offsets), y_size, x_size), np.inf, dtype=np.float32)
+
+    # region - Getters
+    @property
+    def x_size(self) -> int:
+        return self._x_size
+
+    @property
+    def y_size(self) -> int:
+        return self._y_size
+
+    @property
+    def diagonal(self) -> bool:
+        return self._diagonal
+
+    @property
+    def offsets(self) -> tuple[tuple[int, int], ...]:
+        """
+The forward offset of each direction, in the same order as the first axis of weights.
+        """
+
+        return self._offsets
+
+    @property
+    def lengths(self) -> tuple[float, ...]:
+        """
+The length of a step in each direction, in the same order as the first axis of weights.
+        """
+
+        return self._lengths
+
+    @property
+    def weights(self) -> np.ndarray:
+        """
+The weights of every connection, indexed [direction, y, x].
+        """
+
+        return self._weights
+
+    # endregion - Getters
+
+    def weight(self, x: int, y: int, other_x: int, other_y: int) -> float:
+        """
+Returns the weight of the connection between two neighbouring grid squares.
+Raises a KeyError if the grid squares are not neighbours.
+        """
+
+        direction, forward = self._lookup[other_x - x, other_y - y]
+
+        if forward:
+            return float(self._weights[direction, y, x])
+
+        return float(self._weights[direction, other_y, other_x])
+
+    def flat_moves(self) -> dict[tuple[int, int], tuple[int, memoryview, bool]]:
+        """
+Returns every move from a grid square in terms of flat indices (y * x_size + x), for searches.
+Moves off the left or right of the grid wrap onto a connection that is off the grid, which weighs inf, so only moves
+off the top or bottom need checking.
+        :return: (dx, dy) -> (flat offset, weights indexed by flat index, True if the weight is stored on the grid square
+        moved from or False if stored on the grid square moved to).
+        """
+
+        moves = {}
+        for direction, (dx, dy) in enumerate(self._offsets):
+            weights = memoryview(self._weights[direction].reshape(-1))
+
+            moves[dx, dy] = (dy * self._x_size + dx, weights, True)
+            moves[-dx, -dy] = (-(dy * self._x_size + dx), weights, False)
+
+        return moves
+
+    def rebuild(self, potentials: np.ndarray):
+        """
+Recomputes the weight of every connection.
+        :param potentials: The potential of every grid square, indexed [y, x].
+        """
+
+        for direction, (dx, dy) in enumerate(self._offsets):
+            weights = self._weights[direction]
+            weights.fill(np.inf)
+
+            # The grid squares that have a neighbour in this direction
+            x_start, x_stop = max(0, -dx), self._x_size - max(0, dx)
+            y_stop = self._y_size - dy
+
+            mine = potentials[0:y_stop, x_start:x_stop]
+            others = potentials[dy:y_stop + dy, x_start + dx:x_stop + dx]
+
+            np.maximum(np.maximum(mine, others), self._lengths[direction],
+                       out=weights[0:y_stop, x_start:x_stop])
+
+    def update_cells(self, potentials: np.ndarray, cells: set[tuple[int, int]]):
+        """
+Recomputes the weights of every connection touching the given grid squares.
+        :param potentials: The potential of every grid square, indexed [y, x].
+        :param cells: The coordinates of the grid squares that changed.
+        """
+
+        x_size, y_size = self._x_size, self._y_size
+
+        for x, y in cells:
+            potential = potentials[y, x]
+
+            for direction, (dx, dy) in enumerate(self._offsets):
+                length = self._lengths[direction]
+
+                # The connection leaving this grid square
+                other_x, other_y = x + dx, y + dy
+                if 0 <= other_x < x_size and 0 <= other_y < y_size:
+                    self._weights[direction, y, x] = max(length, potential, potentials[other_y, other_x])
+
+                # The connection arriving at this grid square
+                other_x, other_y = x - dx, y - dy
+                if 0 <= other_x < x_size and 0 <= other_y < y_size:
+                    self._weights[direction, other_y, other_x] = max(length, potential, potentials[other_y, other_x])
@@ -1,40 +1,380 @@
+from typing import Iterable, Any
+
+import numpy as np
 from AStar import NodeGenerator
 
-from . import GridSquare
-from .EnvironmentData import GridSquareStructures
+from . import GridSquare, EdgeIndex, Pathfinder, HierarchicalPathfinder, PathCache, ChangeTracker, FlowField
+from . import MapFile, Profiler, StructureIndex
+from .EnvironmentData import GridSquareTerrain, GridSquareStructures, TERRAIN_BY_VALUE, STRUCTURE_BY_VALUE
+
+# Lookups from the value stored in the arrays to the weight
+_TERRAIN_WEIGHTS: np.ndarray = np.array([0, *(terrain.weight for terrain in GridSquareTerrain)], dtype=np.uint8)
+_STRUCTURE_WEIGHTS: np.ndarray = np.array([0, *(structure.weight for structure in GridSquareStructures)],
+                                          dtype=np.uint8)
+
+# How many grid squares the potentials are worked out for at a time
+_POTENTIAL_BLOCK_SIZE: int = 1 << 20
 
 
 class Environment:
-    def __init__(self, width: int, height: int):
-        self.grid: NodeGenerator.Grid = NodeGenerator.Grid(width, height, node_class=GridSquare)
+    """
+Holds the state of every grid square.
+The terrain and structure of each grid square are stored as one byte per cell in numpy arrays, indexed [y, x].
+    """
+
+    def __init__(self, width: int, height: int, compact: bool = False):
+        """
+        :param width: The x size of the environment.
+        :param height: The y size of the environment.
+        :param compact: If true then the GridSquare objects are only created when they are asked for, otherwise the
+        whole AStar grid is created straight away.
+        """
+
+        self._setup(np.full((height, width), GridSquareTerrain.CLEAR.value, dtype=np.uint8),
+                    np.full((height, width), GridSquareStructures.NONE.value, dtype=np.uint8), compact)
+
+    def _setup(self, terrain: np.ndarray, structures: np.ndarray, compact: bool):
+        """
+Sets up an environment around the given terrain and structure values, used by both __init__ and load.
+        """
+
+        self._x_size: int = terrain.shape[1]
+        self._y_size: int = terrain.shape[0]
+        self._compact: bool = compact
+
+        # The state of every grid square, holding the enum values
+        self._terrain: np.ndarray = terrain
+        self._structures: np.ndarray = structures
+        # The terrain weight plus the structure weight of every grid square, worked out when first needed
+        self._potentials: np.ndarray | None = None
+
+        # The AStar grid, only created when needed if compact
+        self._grid: NodeGenerator.Grid | None = None
+        # Grid squares handed out before the grid was created
+        self._grid_squares: dict[tuple[int, int], GridSquare] = {}
+
+        # Grid squares whose terrain or structure changed since the node connections were last updated
+        self._connection_changes: ChangeTracker = ChangeTracker(all_changed=True)
+        # Everything told about changes to grid squares, including the connection changes
+        self._change_trackers: list[ChangeTracker] = [self._connection_changes]
+        # Goes up every time a grid square changes, lets caches know they are out of date
+        self._version: int = 0
+        # The same, but only for terrain and only for structures
+        self._terrain_version: int = 0
+        self._structure_version: int = 0
+
+        # The weight of every connection, created on the first update
+        self._edge_index: EdgeIndex | None = None
+
+        # Finds paths using the edge index rather than the AStar grid
+        self.pathfinder: Pathfinder = Pathfinder(self)
+        # Finds long paths over clusters of grid squares first
+        self.hierarchical_pathfinder: HierarchicalPathfinder = HierarchicalPathfinder(self)
+        # Paths found by find_path, dropped when a grid square they cross changes
+        self.path_cache: PathCache = PathCache(self)
+        # Where every structure of each type is, for finding the closest ones
+        self.structure_index: StructureIndex = StructureIndex(self)
+
+        if not compact:
+            self._create_grid()
 
         self.player_base_locations: list[tuple[int, int]] = []
 
+        # Distance fields and masks around the player bases, thrown away when the player base locations change
+        self._player_base_key: tuple[tuple[int, int], ...] = ()
+        self._player_base_distances: dict[tuple[int, int] | None, np.ndarray] = {}
+        self._player_base_masks: dict[tuple[float, tuple[int, int] | None, bool], np.ndarray] = {}
+
+        # Flow fields towards each player base, keyed by the location of the base, made when first asked for
+        self._flow_fields: dict[tuple[int, int], FlowField] = {}
+
+        # The type and parameters of the generators saved with the map, if loaded from a file
+        self.generator_parameters: list[dict[str, Any]] = []
+
+        # Records how long connection updates take, if given
+        self.profiler: Profiler | None = None
+
     # region - __Dunders__
 
     def __getitem__(self, coords: tuple[int, int]) -> GridSquare:
         """
 Returns the GridSquare at the corresponding coordinates.
+If compact and the grid has not been created yet then a grid square without any connections is created and kept.
         :param coords: The coordinates of the grid square to lookup.
         :return: The grid square at the coordinates
         """
 
-        return self.grid.__getitem__(coords)
+        if self._grid is not None:
+            return self._grid.__getitem__(coords)
+
+        grid_square = self._grid_squares.get(coords)
+        if grid_square is None:
+            x, y = coords
+
+            if x < 0 or x >= self._x_size:
+                raise IndexError(f"Provided x coordinate '{x}' is not within the bounds [0, {self._x_size})")
+            if y < 0 or y >= self._y_size:
+                raise IndexError(f"Provided y coordinate '{y}' is not within the bounds [0, {self._y_size})")
+
+            grid_square = GridSquare(x, y, self)
+            self._grid_squares[coords] = grid_square
+
+        return grid_square
 
     # endregion - __Dunders__
 
     # region - Properties
 
     @property
-    def x_size(self):
-        return self.grid.x_size
+    def x_size(self) -> int:
+        return self._x_size
 
     @property
-    def y_size(self):
-        return self.grid.y_size
+    def y_size(self) -> int:
+        return self._y_size
+
+    @property
+    def compact(self) -> bool:
+        return self._compact
+
+    @property
+    def grid(self) -> NodeGenerator.Grid:
+        """
+The AStar grid of GridSquares, created on first use if compact.
+        """
+
+        if self._grid is None:
+            self._create_grid()
+
+        return self._grid
+
+    @property
+    def terrain_values(self) -> np.ndarray:
+        """
+The GridSquareTerrain values of every grid square, indexed [y, x].
+        """
+
+        return self._terrain
+
+    @property
+    def structure_values(self) -> np.ndarray:
+        """
+The GridSquareStructures values of every grid square, indexed [y, x].
+        """
+
+        return self._structures
+
+    @property
+    def potential_values(self) -> np.ndarray:
+        """
+The terrain weight plus the structure weight of every grid square, indexed [y, x].
+Worked out the first time it is asked for, which also checks every terrain and structure value exists.
+        """
+
+        if self._potentials is None:
+            self._potentials = self._work_out_potentials()
+
+        return self._potentials
+
+    @property
+    def edge_index(self) -> EdgeIndex:
+        """
+The weight of every connection between neighbouring grid squares.
+Only up to date as of the last call to update_node_connections.
+        """
+
+        if self._edge_index is None:
+            self.update_node_connections()
+
+        return self._edge_index
+
+    @property
+    def dirty_cells(self) -> set[tuple[int, int]]:
+        """
+A copy of the grid squares that have changed since the node connections were last updated.
+Empty if every grid square is dirty, check all_dirty for that.
+        """
+
+        return self._connection_changes.cells.copy()
+
+    @property
+    def all_dirty(self) -> bool:
+        return self._connection_changes.all_changed
+
+    @property
+    def version(self) -> int:
+        """
+A number that goes up every time the terrain or structure of a grid square changes.
+        """
+
+        return self._version
+
+    @property
+    def terrain_version(self) -> int:
+        """
+A number that goes up every time the terrain of a grid square changes.
+        """
+
+        return self._terrain_version
+
+    @property
+    def structure_version(self) -> int:
+        """
+A number that goes up every time the structure of a grid square changes.
+        """
+
+        return self._structure_version
 
     # endregion - Properties
 
+    # region - Grid square state
+
+    def get_terrain(self, x: int, y: int) -> GridSquareTerrain:
+        return TERRAIN_BY_VALUE[self._terrain[y, x]]
+
+    def set_terrain(self, x: int, y: int, terrain: GridSquareTerrain):
+        if self._terrain[y, x] != terrain.value:
+            self._terrain[y, x] = terrain.value
+            if self._potentials is not None:
+                self._potentials[y, x] = terrain.weight + _STRUCTURE_WEIGHTS[self._structures[y, x]]
+            self._terrain_version += 1
+            self.mark_dirty(x, y)
+
+    def get_structure(self, x: int, y: int) -> GridSquareStructures:
+        return STRUCTURE_BY_VALUE[self._structures[y, x]]
+
+    def set_structure(self, x: int, y: int, structure: GridSquareStructures):
+        if self._structures[y, x] != structure.value:
+            self._structures[y, x] = structure.value
+            if self._potentials is not None:
+                self._potentials[y, x] = _TERRAIN_WEIGHTS[self._terrain[y, x]] + structure.weight
+            self._structure_version += 1
+            self.mark_dirty(x, y)
+
+    def set_terrain_values(self, values: np.ndarray):
+        """
+Sets the terrain of every grid square at once from an array of GridSquareTerrain values, indexed [y, x].
+        """
+
+        self._set_values(self._terrain, values)
+
+    def set_structure_values(self, values: np.ndarray):
+        """
+Sets the structure of every grid square at once from an array of GridSquareStructures values, indexed [y, x].
+        """
+
+        self._set_values(self._structures, values)
+
+    def _set_values(self, target: np.ndarray, values: np.ndarray):
+        """
+Copies the values into the terrain or structure array, updating the potentials and marking only the grid squares
+that changed as dirty.
+        """
+
+        assert values.shape == target.shape, f"Values must have the shape {target.shape}"
+
+        changed = target != values
+        if not changed.any():
+            return
+
+        target[changed] = values[changed]
+        if self._potentials is not None:
+            self._potentials[changed] = (_TERRAIN_WEIGHTS[self._terrain[changed]]
+                                         + _STRUCTURE_WEIGHTS[self._structures[changed]])
+
+        if target is self._terrain:
+            self._terrain_version += 1
+        else:
+            self._structure_version += 1
+
+        y_coords, x_coords = np.nonzero(changed)
+
+        # Tracking every grid square costs more than starting over once most of them have changed
+        if len(x_coords) > target.size // 4:
+            self.mark_all_dirty()
+        else:
+            for x, y in zip(x_coords.tolist(), y_coords.tolist()):
+                self.mark_dirty(x, y)
+
+    def _work_out_potentials(self) -> np.ndarray:
+        """
+Works out the potential of every grid square a block of rows at a time, so a memory mapped map is read once without
+a full size copy of its values.
+        :raises ValueError: If a terrain or structure value doesn't exist, e.g. in a damaged map file.
+        """
+
+        potentials = np.empty((self._y_size, self._x_size), dtype=np.uint8)
+        block_rows = max(1, _POTENTIAL_BLOCK_SIZE // max(self._x_size, 1))
+
+        for start in range(0, self._y_size, block_rows):
+            terrain = self._terrain[start:start + block_rows]
+            structures = self._structures[start:start + block_rows]
+
+            if terrain.size and (terrain.max() >= len(TERRAIN_BY_VALUE)
+                                 or structures.max() >= len(STRUCTURE_BY_VALUE)):
+                raise ValueError(f"Rows {start} to {start + len(terrain) - 1} have terrain or structure values that "
+                                 f"don't exist")
+
+            potentials[start:start + block_rows] = _TERRAIN_WEIGHTS[terrain] + _STRUCTURE_WEIGHTS[structures]
+
+        return potentials
+
+    # endregion - Grid square state
+
+    # region - Dirty tracking
+
+    def mark_dirty(self, x: int, y: int):
+        """
+Marks the grid square as changed so its connections, and anything with a change tracker, are updated next time.
+        """
+
+        self._version += 1
+
+        for tracker in self._change_trackers:
+            tracker.mark(x, y)
+
+    def mark_all_dirty(self):
+        """
+Marks every grid square as changed, the next connection update will be a full rebuild and every change tracker
+starts over.
+        """
+
+        self._version += 1
+
+        for tracker in self._change_trackers:
+            tracker.mark_all()
+
+    def add_change_tracker(self, tracker: ChangeTracker):
+        """
+Adds a change tracker that will be told about every grid square that changes from now on.
+        """
+
+        self._change_trackers.append(tracker)
+
+    def remove_change_tracker(self, tracker: ChangeTracker):
+        self._change_trackers.remove(tracker)
+
+    # endregion - Dirty tracking
+
+    def _create_grid(self):
+        """
+Creates the AStar grid and points every grid square in it at this environment.
+        """
+
+        self._grid = NodeGenerator.Grid(self._x_size, self._y_size, node_class=GridSquare)
+
+        for y in range(self._y_size):
+            for x in range(self._x_size):
+                self._grid[x, y].environment = self
+
+        # The grid squares from the grid are used from now on
+        self._grid_squares.clear()
+
+        # None of the new connections have been weighted
+        self._connection_changes.mark_all()
+
+    # region - Player bases
+
     def set_player_base(self, x_location: int, y_location: int):
         """
 Sets the nodes at the given location to a player base.
@@ -45,33 +385,231 @@ Please don't set bases where there are already bases, this is undefined behaviou
         """
 
         assert x_location >= 0, "x location must be larger than 0"
-        assert x_location < self.grid.x_size, f"x location must be less than the x size {self.grid.x_size}"
+        assert x_location < self._x_size, f"x location must be less than the x size {self._x_size}"
         assert y_location >= 0, "y location must be larger than 0"
-        assert y_location < self.grid.y_size, f"y location must be less than the y size {self.grid.y_size}"
+        assert y_location < self._y_size, f"y location must be less than the y size {self._y_size}"
 
         self.player_base_locations.append((x_location, y_location))
 
         for y in range(y_location, y_location + 2):
             for x in range(x_location, x_location + 2):
-                self.grid[x, y].structure = GridSquareStructures.PLAYER_BASE
+                self.set_structure(x, y, GridSquareStructures.PLAYER_BASE)
+
+    def get_player_base_distances(self, location: tuple[int, int] | None = None) -> np.ndarray:
+        """
+Returns the distance from every grid square to the top left of the nearest player base, indexed [y, x].
+Worked out once and kept until the player base locations change, don't change the returned array.
+        :param location: If given then the distances to only the player base at this location instead.
+        :return: The distances, inf everywhere if there are no player bases.
+        """
+
+        self._check_player_bases()
+
+        distances = self._player_base_distances.get(location)
+        if distances is not None:
+            return distances
+
+        locations = self.player_base_locations if location is None else [location]
+
+        distances = np.full((self._y_size, self._x_size), np.inf, dtype=np.float64)
+        for x_location, y_location in locations:
+            x_squared = (np.arange(self._x_size, dtype=np.float64) - x_location) ** 2
+            y_squared = (np.arange(self._y_size, dtype=np.float64) - y_location) ** 2
+
+            np.minimum(distances, np.sqrt(x_squared[np.newaxis, :] + y_squared[:, np.newaxis]), out=distances)
+
+        self._player_base_distances[location] = distances
+        return distances
+
+    def get_player_base_mask(self, radius: float, location: tuple[int, int] | None = None,
+                             inclusive: bool = False) -> np.ndarray:
+        """
+Returns which grid squares are within the radius of a player base, indexed [y, x].
+Kept until the player base locations change, don't change the returned array.
+        :param radius: The distance from the top left of the player base.
+        :param location: If given then only the player base at this location is checked.
+        :param inclusive: If true then grid squares exactly the radius away are included.
+        """
+
+        self._check_player_bases()
+
+        key = (radius, location, inclusive)
+        mask = self._player_base_masks.get(key)
+
+        if mask is None:
+            distances = self.get_player_base_distances(location)
+            mask = distances <= radius if inclusive else distances < radius
+            self._player_base_masks[key] = mask
+
+        return mask
 
-    def update_node_connections(self):
+    def _check_player_bases(self):
         """
-Updates the weights on all node connections based off of the terrain and structure values.
+Throws away the player base distances and masks if the player base locations have changed.
         """
 
-        for y in range(self.y_size):
-            for x in range(self.x_size):
-                my_potential = self[x, y].terrain.weight + self[x, y].structure.weight
+        key = tuple(self.player_base_locations)
+
+        if key != self._player_base_key:
+            self._player_base_key = key
+            self._player_base_distances.clear()
+            self._player_base_masks.clear()
+
+    # endregion - Player bases
+
+    # region - Saving and loading
+
+    def save(self, path: str, generators: Iterable[Any] = ()):
+        """
+Saves the environment to a map file, see MapFile for the format.
+        :param path: The file to save to.
+        :param generators: The generators used to make the map, their parameters are saved alongside it.
+        """
+
+        metadata = {
+            "player_base_locations": [list(location) for location in self.player_base_locations],
+            "generators": [{"type": type(generator).__name__, "parameters": generator.parameters}
+                           for generator in generators] or self.generator_parameters
+        }
+
+        MapFile.write(path, self._terrain, self._structures, metadata)
+
+    @classmethod
+    def load(cls, path: str, compact: bool = True) -> "Environment":
+        """
+Loads an environment from a map file.
+The grids are memory mapped, so a large map opens without reading every grid square. The potentials, and from them
+the connections, are only worked out when first needed, which is also when terrain or structure values that don't
+exist raise a ValueError.
+        :param path: The file to load from.
+        :param compact: If false then the whole AStar grid is created straight away, reading every grid square.
+        """
+
+        terrain, structures, metadata = MapFile.read(path)
+
+        # Skips __init__, which would fill full size arrays only to throw them away
+        environment = cls.__new__(cls)
+        environment._setup(terrain, structures, compact=True)
+
+        environment.player_base_locations = [tuple(location) for location in metadata["player_base_locations"]]
+        environment.generator_parameters = metadata["generators"]
+
+        if not compact:
+            environment._compact = False
+            environment._create_grid()
+
+        return environment
+
+    # endregion - Saving and loading
+
+    def update_node_connections(self, full_rebuild: bool = False):
+        """
+Updates the weights on node connections based off of the terrain and structure values.
+The weights are stored in the edge index, and copied onto the AStar grid connections if the grid has been created.
+Only the connections of grid squares that changed since the last update are recomputed, unless every grid square is
+dirty or a full rebuild is asked for.
+        :param full_rebuild: If true then every connection is recomputed.
+        """
+
+        if self._edge_index is None:
+            self._edge_index = EdgeIndex(self._x_size, self._y_size)
+            full_rebuild = True
+
+        changes = self._connection_changes
+        full_rebuild = full_rebuild or changes.all_changed
+
+        cells = self._x_size * self._y_size if full_rebuild else len(changes.cells)
+
+        with Profiler.stage_of(self.profiler, Profiler.CONNECTION_UPDATE, cells, "Environment"):
+            if full_rebuild:
+                self._edge_index.rebuild(self.potential_values)
+
+                if self._grid is not None:
+                    self._copy_weights_to_grid(((x, y) for y in range(self._y_size) for x in range(self._x_size)),
+                                               forward_only=True)
+            else:
+                self._edge_index.update_cells(self.potential_values, changes.cells)
+
+                if self._grid is not None:
+                    self._copy_weights_to_grid(changes.cells)
+
+        changes.clear()
+
+    def find_path(self, start: tuple[int, int], goal: tuple[int, int],
+                  use_cache: bool = True, hierarchical: bool = False) -> list[tuple[int, int]] | None:
+        """
+Finds the cheapest path between two grid squares using the pathfinder.
+        :param start: The coordinates to start from.
+        :param goal: The coordinates to path to.
+        :param use_cache: If true then the path is looked up in, and added to, the path cache.
+        :param hierarchical: If true then the hierarchical pathfinder is used instead, much faster across large maps but
+        the path may cost a little more than the cheapest. These paths are not cached.
+        :return: Every grid square on the path, including the start and goal, or None if there is no path.
+        """
+
+        if hierarchical:
+            return self.hierarchical_pathfinder.find_path(start, goal)
+
+        if use_cache:
+            return self.path_cache.find_path(start, goal)
+
+        return self.pathfinder.find_path(start, goal)
+
+    def get_flow_field(self, player_base_location: tuple[int, int]) -> FlowField:
+        """
+Returns the flow field towards the player base at the given location, brought up to date with any changes.
+Every entity heading for the base can look up its next step from it.
+        :param player_base_location: The location of the top left of the player base, as given to set_player_base.
+        """
+
+        assert player_base_location in self.player_base_locations, f"There is no player base at {player_base_location}"
+
+        flow_field = self._flow_fields.get(player_base_location)
+
+        if flow_field is None:
+            x_location, y_location = player_base_location
+            targets = [(x, y)
+                       for y in range(y_location, min(y_location + 2, self._y_size))
+                       for x in range(x_location, min(x_location + 2, self._x_size))]
+
+            flow_field = FlowField(self, targets)
+            self._flow_fields[player_base_location] = flow_field
+        else:
+            flow_field.update()
+
+        return flow_field
+
+    def find_nearest_structures(self, x: int, y: int, structure: GridSquareStructures, k: int = 1,
+                                by_path: bool = False) -> list[tuple[int, int]]:
+        """
+Finds the grid squares holding the structure closest to the given one, e.g. the trees for a worker to cut down.
+        :param k: How many to find, fewer are returned if there aren't enough.
+        :param by_path: If true then closest is by the cost of pathing there, otherwise by straight line distance, which
+        is quicker.
+        :return: The coordinates of each grid square, closest first.
+        """
+
+        if by_path:
+            return [cell for cell, _ in self.structure_index.nearest_by_path(x, y, structure, k)]
+
+        return self.structure_index.nearest(x, y, structure, k)
+
+    def _copy_weights_to_grid(self, cells: Iterable[tuple[int, int]], forward_only: bool = False):
+        """
+Sets the weights of the AStar grid connections of the given grid squares from the edge index.
+        :param cells: The coordinates of the grid squares to update.
+        :param forward_only: If true then each connection is only visited from the grid square that comes first, for
+        when every grid square is being updated.
+        """
 
-                other_node: GridSquare
-                for other_node in self[x, y].get_connected_nodes():
-                    other_potential = other_node.terrain.weight + other_node.structure.weight
+        for x, y in cells:
+            grid_square = self._grid[x, y]
 
-                    connection = self[x, y].find_connection_with(other_node)
+            other_node: GridSquare
+            for other_node in grid_square.get_connected_nodes():
+                other_x, other_y = other_node.grid_position
 
-                    if my_potential > connection.weight:
-                        connection.weight = my_potential
+                if forward_only and (other_y, other_x) < (y, x):
+                    continue
 
-                    if other_potential > connection.weight:
-                        connection.weight = other_potential
+                grid_square.find_connection_with(other_node).weight = self._edge_index.weight(x, y, other_x, other_y)
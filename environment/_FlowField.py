@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import math
+from heapq import heappush, heappop
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from . import ChangeTracker
+
+if TYPE_CHECKING:
+    from ._Environment import Environment
+
+
+class FlowField:
+    """
+The cost from every grid square to a set of target grid squares, and the next step to take from each one.
+Worked out once with Dijkstra over the environment's edge index, so any number of entities heading to the same place
+can look up their next step in O(1).
+Repairs itself when grid squares change, only redoing the grid squares whose cheapest path went through a change.
+    """
+
+    def __init__(self, environment: Environment, targets: list[tuple[int, int]]):
+        """
+        :param environment: The environment to path across.
+        :param targets: The grid squares to path towards, e.g. the grid squares of a player base.
+        """
+
+        self.environment: Environment = environment
+        self.targets: list[tuple[int, int]] = targets.copy()
+
+        x_size, y_size = environment.x_size, environment.y_size
+
+        # The cost to the nearest target, indexed [y, x]
+        self._costs: np.ndarray = np.full((y_size, x_size), np.inf, dtype=np.float64)
+        # The flat index (y * x_size + x) of the next grid square towards the nearest target, -1 if there isn't one
+        self._next: np.ndarray = np.full(y_size * x_size, -1, dtype=np.int64)
+
+        # The changes since the field was last worked out
+        self._changes: ChangeTracker = ChangeTracker(all_changed=True)
+        environment.add_change_tracker(self._changes)
+
+        self.update()
+
+    # region - Getters
+    @property
+    def costs(self) -> np.ndarray:
+        """
+The integration field, the cost from every grid square to the nearest target, indexed [y, x].
+        """
+
+        return self._costs
+
+    @property
+    def next_indices(self) -> np.ndarray:
+        """
+The direction field, the flat index (y * x_size + x) of the next grid square from every grid square, -1 if there
+isn't one.
+        """
+
+        return self._next
+
+    @property
+    def is_out_of_date(self) -> bool:
+        return self._changes.has_changes
+
+    # endregion - Getters
+
+    def cost(self, x: int, y: int) -> float:
+        """
+Returns the cost from the grid square to the nearest target.
+        """
+
+        return self._costs.item(y, x)
+
+    def next_step(self, x: int, y: int) -> tuple[int, int] | None:
+        """
+Returns the next grid square to move to from the given one, or None if it is a target or can't reach one.
+Call update first if the environment might have changed.
+        """
+
+        next_index = self._next.item(y * self.environment.x_size + x)
+        if next_index < 0:
+            return None
+
+        next_x, next_y = next_index % self.environment.x_size, next_index // self.environment.x_size
+        if (next_x, next_y) == (x, y):
+            return None
+
+        return next_x, next_y
+
+    def direction(self, x: int, y: int) -> tuple[int, int]:
+        """
+Returns the (dx, dy) of the next step from the given grid square, (0, 0) if there isn't one.
+        """
+
+        next_step = self.next_step(x, y)
+        if next_step is None:
+            return 0, 0
+
+        return next_step[0] - x, next_step[1] - y
+
+    def add_targets(self, targets: list[tuple[int, int]]):
+        """
+Adds target grid squares, the field is repaired around them on the next update.
+        """
+
+        for x, y in targets:
+            self.targets.append((x, y))
+            self._changes.mark(x, y)
+
+    def remove_targets(self, targets: list[tuple[int, int]]):
+        """
+Removes target grid squares, the field is repaired around them on the next update.
+        """
+
+        removing = set(targets)
+        self.targets = [target for target in self.targets if target not in removing]
+
+        for x, y in removing:
+            self._changes.mark(x, y)
+
+    def detach(self):
+        """
+Stops listening to changes in the environment, call before throwing the flow field away.
+        """
+
+        self.environment.remove_change_tracker(self._changes)
+
+    def update(self):
+        """
+Brings the flow field up to date with the environment.
+Does nothing if no grid squares changed, redoes everything if every grid square changed, otherwise only redoes the
+grid squares whose cheapest path went through a changed grid square.
+        """
+
+        if not self._changes.has_changes:
+            return
+
+        self.environment.update_node_connections()
+
+        if self._changes.all_changed:
+            self._recompute()
+        else:
+            self._repair(self._changes.cells)
+
+        self._changes.clear()
+
+    def _recompute(self):
+        """
+Works out the whole field from scratch.
+        """
+
+        self._costs.fill(np.inf)
+        self._next.fill(-1)
+
+        costs = memoryview(self._costs.reshape(-1))
+        next_indices = memoryview(self._next)
+
+        heap = []
+        for index in self._target_indices():
+            costs[index] = 0.
+            next_indices[index] = index
+            heap.append((0., index))
+
+        self._propagate(heap)
+
+    def _repair(self, cells: set[tuple[int, int]]):
+        """
+Redoes the grid squares whose next steps lead through any of the changed grid squares.
+The changed weights only touch connections of the changed grid squares, so every other grid square keeps its cost.
+        """
+
+        x_size = self.environment.x_size
+        cell_count = len(self._next)
+        moves = list(self.environment.edge_index.flat_moves().values())
+
+        costs = memoryview(self._costs.reshape(-1))
+        next_indices = memoryview(self._next)
+
+        # Every grid square that flows through a changed grid square
+        invalid = set()
+        stack = [y * x_size + x for x, y in cells]
+        while stack:
+            index = stack.pop()
+            if index in invalid:
+                continue
+            invalid.add(index)
+
+            for offset, _, _ in moves:
+                other = index + offset
+                if 0 <= other < cell_count and next_indices[other] == index and other != index:
+                    stack.append(other)
+
+        for index in invalid:
+            costs[index] = math.inf
+            next_indices[index] = -1
+
+        for index in self._target_indices():
+            if index in invalid:
+                costs[index] = 0.
+                next_indices[index] = index
+
+        # Seed from the grid squares around the invalid ones that are still right
+        heap = []
+        for index in invalid:
+            for offset, weights, forward in moves:
+                other = index + offset
+                if other < 0 or other >= cell_count or other in invalid:
+                    continue
+
+                cost = costs[other] + (weights[index] if forward else weights[other])
+                if cost < costs[index]:
+                    costs[index] = cost
+                    next_indices[index] = other
+
+            if costs[index] < math.inf:
+                heap.append((costs[index], index))
+
+        self._propagate(heap)
+
+    def _propagate(self, heap: list[tuple[float, int]]):
+        """
+Dijkstra outwards from the grid squares on the heap, lowering the cost of any grid square that can be reached for
+less.
+        """
+
+        cell_count = len(self._next)
+        moves = list(self.environment.edge_index.flat_moves().values())
+
+        costs = memoryview(self._costs.reshape(-1))
+        next_indices = memoryview(self._next)
+
+        heap.sort()
+
+        while heap:
+            cost, index = heappop(heap)
+
+            # Already reached for less
+            if cost > costs[index]:
+                continue
+
+            for offset, weights, forward in moves:
+                other = index + offset
+                if other < 0 or other >= cell_count:
+                    continue
+
+                other_cost = cost + (weights[index] if forward else weights[other])
+
+                if other_cost < costs[other]:
+                    costs[other] = other_cost
+                    next_indices[other] = index
+                    heappush(heap, (other_cost, other))
+
+    def _target_indices(self) -> list[int]:
+        return [y * self.environment.x_size + x for x, y in self.targets]
@@ -1,18 +1,49 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
 from AStar import Node
 
 from .EnvironmentData import GridSquareTerrain, GridSquareStructures
 
+if TYPE_CHECKING:
+    from ._Environment import Environment
+
 
 class GridSquare(Node):
     """
 A node that contains information about the state of the grid square.
+The terrain and structure are stored in the environment's arrays, the grid square only reads and writes to them.
     """
 
-    def __init__(self, x_position: int, y_position: int):
+    def __init__(self, x_position: int, y_position: int, environment: Environment | None = None):
         super().__init__(x_position, y_position)
 
-        # The terrain of the grid square
-        self.terrain: GridSquareTerrain = GridSquareTerrain.CLEAR
+        self.grid_position: tuple[int, int] = (x_position, y_position)
+
+        # The environment holding the state of this grid square, set by the environment if not given
+        self.environment: Environment | None = environment
+
+    @property
+    def terrain(self) -> GridSquareTerrain:
+        """
+The terrain of the grid square.
+        """
+
+        return self.environment.get_terrain(*self.grid_position)
+
+    @terrain.setter
+    def terrain(self, new_terrain: GridSquareTerrain):
+        self.environment.set_terrain(*self.grid_position, new_terrain)
+
+    @property
+    def structure(self) -> GridSquareStructures:
+        """
+The current structure of the grid square.
+        """
+
+        return self.environment.get_structure(*self.grid_position)
 
-        # The current structure of the grid square
-        self.structure: GridSquareStructures = GridSquareStructures.NONE
+    @structure.setter
+    def structure(self, new_structure: GridSquareStructures):
+        self.environment.set_structure(*self.grid_position, new_structure)
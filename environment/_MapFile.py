@@ -0,0 +1,100 @@
+import json
+import struct
+from typing import Callable
+
+import numpy as np
+
+
+class MapFile:
+    """
+Reads and writes the binary map save format.
+    Header: magic, schema version, x size, y size, metadata length and the offset of the grids, little endian.
+    Metadata: UTF-8 JSON holding the player base locations and the generator parameters.
+    Grids: the terrain values then the structure values, one byte per grid square, indexed [y, x].
+The grids start on a 64 byte boundary so they can be memory mapped straight from the file.
+Older schema versions are upgraded when read, add an upgrade to _UPGRADES whenever the schema version goes up.
+    """
+
+    MAGIC: bytes = b"BRTSMAP\0"
+    SCHEMA_VERSION: int = 1
+
+    # magic, schema version, x size, y size, metadata length, grid offset
+    _HEADER: struct.Struct = struct.Struct("<8sHIIIQ")
+    _ALIGNMENT: int = 64
+
+    @classmethod
+    def write(cls, path: str, terrain: np.ndarray, structures: np.ndarray, metadata: dict):
+        """
+Writes a map file.
+        :param path: The file to write to.
+        :param terrain: The terrain values, indexed [y, x].
+        :param structures: The structure values, indexed [y, x], the same shape as the terrain.
+        :param metadata: Anything else to save, must be JSON serialisable.
+        """
+
+        assert terrain.shape == structures.shape, "Terrain and structures must have the same shape"
+
+        y_size, x_size = terrain.shape
+        metadata_bytes = json.dumps(metadata, separators=(",", ":")).encode("utf-8")
+
+        grid_offset = cls._HEADER.size + len(metadata_bytes)
+        grid_offset += -grid_offset % cls._ALIGNMENT
+
+        with open(path, "wb") as file:
+            file.write(cls._HEADER.pack(cls.MAGIC, cls.SCHEMA_VERSION, x_size, y_size, len(metadata_bytes),
+                                        grid_offset))
+            file.write(metadata_bytes)
+            file.write(bytes(grid_offset - file.tell()))
+
+            file.write(np.ascontiguousarray(terrain, dtype=np.uint8).tobytes())
+            file.write(np.ascontiguousarray(structures, dtype=np.uint8).tobytes())
+
+    @classmethod
+    def read(cls, path: str) -> tuple[np.ndarray, np.ndarray, dict]:
+        """
+Reads a map file, upgrading it to the current schema version.
+The grids are memory mapped copy on write, so nothing is read until it is used and changes never reach the file.
+        :param path: The file to read.
+        :return: The terrain values, the structure values and the metadata.
+        """
+
+        schema_version, x_size, y_size, metadata, grid_offset = cls.read_header(path)
+
+        terrain = np.memmap(path, dtype=np.uint8, mode="c", offset=grid_offset, shape=(y_size, x_size))
+        structures = np.memmap(path, dtype=np.uint8, mode="c", offset=grid_offset + x_size * y_size,
+                               shape=(y_size, x_size))
+
+        for version in range(schema_version, cls.SCHEMA_VERSION):
+            terrain, structures, metadata = _UPGRADES[version](terrain, structures, metadata)
+
+        return terrain, structures, metadata
+
+    @classmethod
+    def read_header(cls, path: str) -> tuple[int, int, int, dict, int]:
+        """
+Reads the header and metadata of a map file without touching the grids.
+Raises a ValueError if the file isn't a map file or is from a newer schema version.
+        :return: The schema version, x size, y size, metadata and the offset of the grids.
+        """
+
+        with open(path, "rb") as file:
+            header = file.read(cls._HEADER.size)
+
+            if len(header) < cls._HEADER.size:
+                raise ValueError(f"'{path}' is too short to be a map file")
+
+            magic, schema_version, x_size, y_size, metadata_length, grid_offset = cls._HEADER.unpack(header)
+
+            if magic != cls.MAGIC:
+                raise ValueError(f"'{path}' is not a map file")
+            if schema_version > cls.SCHEMA_VERSION:
+                raise ValueError(f"'{path}' has schema version {schema_version}, only up to {cls.SCHEMA_VERSION} can be "
+                                 f"read")
+
+            metadata = json.loads(file.read(metadata_length).decode("utf-8"))
+
+        return schema_version, x_size, y_size, metadata, grid_offset
+
+
+# Schema version -> a function upgrading the terrain, structures and metadata from that version to the next
+_UPGRADES: dict[int, Callable[[np.ndarray, np.ndarray, dict], tuple[np.ndarray, np.ndarray, dict]]] = {}
@@ -0,0 +1,236 @@
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+_UINT64_MASK: int = (1 << 64) - 1
+
+
+class NoiseEngine:
+    """
+Evaluates layered perlin noise for a whole grid at once using numpy.
+Produces the same values as calling a perlin_noise.PerlinNoise object for every cell, so a seed gives the same map.
+Each value only depends on its position in the grid, so the grid can be split into tiles and generated by several
+processes, giving exactly the same values.
+    """
+
+    def __init__(self, seed: int, octaves: list[int], workers: int = 1, tile_size: int = 256, endless: bool = False):
+        """
+        :param seed: The seed to use for the gradient vectors. Same seed -> same result.
+        :param octaves: The octaves to layer, in order of strength: 0.5 then 0.25 ...
+        :param workers: The number of processes to generate tiles with, 1 generates the whole grid in this process.
+        :param tile_size: The width and height of the tiles handed to each process.
+        :param endless: If true then every lattice point's gradient comes from its own hash of the seed and its
+        coordinates, so noise carried on outside the grid never repeats. perlin_noise's seeding gives the same gradient
+        to lattice points 10 apart along x and 1 back along y, and mirrors around the origin, fine inside a map but it
+        makes an endless world repeat. The values no longer match perlin_noise.
+        """
+
+        assert workers >= 1, "Workers must be a positive integer"
+        assert tile_size >= 1, "Tile size must be a positive integer"
+
+        self.seed: int = seed
+        self.octaves: list[int] = octaves.copy()
+        self.workers: int = workers
+        self.tile_size: int = tile_size
+        self.endless: bool = endless
+
+    def generate(self, x_size: int, y_size: int, initial: np.ndarray | None = None) -> np.ndarray:
+        """
+Generates the layered noise for a grid of the given size.
+Each octave is divided by its position in the list, starting at 2, and added on to the initial values.
+Split into tiles across a pool of processes if there is more than one worker.
+        :param x_size: The width of the grid.
+        :param y_size: The height of the grid.
+        :param initial: The values to add the noise on to, defaults to 0. Must have the shape (y_size, x_size).
+        :return: An array of shape (y_size, x_size) containing the noise, indexed [y, x].
+        """
+
+        if initial is None:
+            values = np.zeros((y_size, x_size), dtype=np.float64)
+        else:
+            assert initial.shape == (y_size, x_size), f"Initial values must have the shape {(y_size, x_size)}"
+            values = np.array(initial, dtype=np.float64)
+
+        tiles = self.tiles(x_size, y_size)
+
+        if self.workers == 1 or len(tiles) == 1:
+            return self.generate_tile(x_size, y_size, (0, 0, x_size, y_size), initial=values)
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = [
+                (bounds, executor.submit(self.generate_tile, x_size, y_size, bounds,
+                                         values[bounds[1]:bounds[3], bounds[0]:bounds[2]]))
+                for bounds in tiles
+            ]
+
+            for (x_start, y_start, x_stop, y_stop), future in futures:
+                values[y_start:y_stop, x_start:x_stop] = future.result()
+
+        return values
+
+    def generate_tile(self, x_size: int, y_size: int, bounds: tuple[int, int, int, int],
+                      initial: np.ndarray | None = None) -> np.ndarray:
+        """
+Generates the layered noise for part of a grid, the values are the same as that part of the whole grid.
+        :param x_size: The width of the whole grid.
+        :param y_size: The height of the whole grid.
+        :param bounds: The x start, y start, x stop and y stop of the tile, the stops are exclusive.
+        :param initial: The values to add the noise on to, defaults to 0. Must have the shape of the tile.
+        :return: An array with the shape of the tile containing the noise, indexed [y, x].
+        """
+
+        x_start, y_start, x_stop, y_stop = bounds
+
+        if initial is None:
+            values = np.zeros((y_stop - y_start, x_stop - x_start), dtype=np.float64)
+        else:
+            assert initial.shape == (y_stop - y_start, x_stop - x_start), \
+                f"Initial values must have the shape {(y_stop - y_start, x_stop - x_start)}"
+            values = np.array(initial, dtype=np.float64)
+
+        for i, octave in enumerate(self.octaves, start=2):
+            values += self.octave_noise(octave, x_size, y_size, bounds) / i
+
+        return values
+
+    def tiles(self, x_size: int, y_size: int) -> list[tuple[int, int, int, int]]:
+        """
+Splits a grid of the given size into tiles of at most tile size by tile size.
+        :return: The x start, y start, x stop and y stop of every tile, the stops are exclusive.
+        """
+
+        return [(x_start, y_start, min(x_start + self.tile_size, x_size), min(y_start + self.tile_size, y_size))
+                for y_start in range(0, y_size, self.tile_size)
+                for x_start in range(0, x_size, self.tile_size)]
+
+    def octave_noise(self, octave: int, x_size: int, y_size: int,
+                     bounds: tuple[int, int, int, int] | None = None) -> np.ndarray:
+        """
+Generates a single octave of noise for a grid of the given size.
+        :param octave: The number of noise cells across the grid.
+        :param x_size: The width of the grid.
+        :param y_size: The height of the grid.
+        :param bounds: The x start, y start, x stop and y stop of the part of the grid to generate, defaults to all of it.
+        Can go outside of the grid, the noise carries on seamlessly, used for endless worlds.
+        :return: An array with the shape of the bounds containing the noise, indexed [y, x].
+        """
+
+        x_start, y_start, x_stop, y_stop = bounds if bounds is not None else (0, 0, x_size, y_size)
+
+        # Same operations as perlin_noise so the floats come out identical, still divided by the size of the whole grid
+        x_coords = (np.arange(x_start, x_stop, dtype=np.float64) / x_size) * octave
+        y_coords = (np.arange(y_start, y_stop, dtype=np.float64) / y_size) * octave
+
+        x_lattice = np.floor(x_coords).astype(np.int64)
+        y_lattice = np.floor(y_coords).astype(np.int64)
+
+        if not self.endless and 0 <= x_start and x_stop <= x_size and 0 <= y_start and y_stop <= y_size:
+            # Sized for the whole grid so every tile shares the cached gradients
+            x_origin, y_origin = 0, 0
+            x_count = math.floor((x_size - 1) / x_size * octave) + 2
+            y_count = math.floor((y_size - 1) / y_size * octave) + 2
+        else:
+            # Only the lattice points around the bounds, the grid could be anywhere
+            x_origin, y_origin = int(x_lattice[0]), int(y_lattice[0])
+            x_count, y_count = int(x_lattice[-1]) - x_origin + 2, int(y_lattice[-1]) - y_origin + 2
+
+        gradients = _endless_gradients if self.endless else _gradients
+        x_gradients, y_gradients = gradients(self.seed, x_origin, y_origin, x_count, y_count)
+
+        values = np.zeros((y_stop - y_start, x_stop - x_start), dtype=np.float64)
+
+        y_distances = [y_coords - (y_lattice + y_corner_offset) for y_corner_offset in (0, 1)]
+        y_weights = [_fade(1 - np.abs(y_distance)) for y_distance in y_distances]
+
+        # Corner order matches itertools.product so the sum is in the same order
+        for x_corner_offset in (0, 1):
+            x_distance = x_coords - (x_lattice + x_corner_offset)
+            x_weight = _fade(1 - np.abs(x_distance))
+
+            for y_corner_offset in (0, 1):
+                y_distance, y_weight = y_distances[y_corner_offset], y_weights[y_corner_offset]
+
+                corner = np.ix_(y_lattice + (y_corner_offset - y_origin), x_lattice + (x_corner_offset - x_origin))
+
+                weight = x_weight[np.newaxis, :] * y_weight[:, np.newaxis]
+                dot = x_gradients[corner] * x_distance[np.newaxis, :] + y_gradients[corner] * y_distance[:, np.newaxis]
+
+                values += weight * dot
+
+        return values
+
+
+@lru_cache(maxsize=64)
+def _gradients(seed: int, x_origin: int, y_origin: int, x_count: int, y_count: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+Creates the random gradient vectors at each lattice point, seeded the same way as perlin_noise.
+    :param seed: The seed of the noise.
+    :param x_origin: The x of the first lattice point.
+    :param y_origin: The y of the first lattice point.
+    :param x_count: The number of lattice points along x.
+    :param y_count: The number of lattice points along y.
+    :return: The x and y components of the gradients, indexed [y, x].
+    """
+
+    x_gradients = np.empty((y_count, x_count), dtype=np.float64)
+    y_gradients = np.empty((y_count, x_count), dtype=np.float64)
+
+    generator = random.Random()
+    for y in range(y_count):
+        for x in range(x_count):
+            generator.seed(seed * max(1, int(abs(x + x_origin + 10 * (y + y_origin) + 1))))
+            x_gradients[y, x] = generator.uniform(-1, 1)
+            y_gradients[y, x] = generator.uniform(-1, 1)
+
+    return x_gradients, y_gradients
+
+
+@lru_cache(maxsize=64)
+def _endless_gradients(seed: int, x_origin: int, y_origin: int, x_count: int,
+                       y_count: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+Creates the random gradient vectors at each lattice point from a SplitMix64 hash of the seed and the lattice point, so
+no two lattice points share a gradient by how they are seeded.
+    :return: The x and y components of the gradients, indexed [y, x], each in [-1, 1).
+    """
+
+    x_lattice = np.arange(x_origin, x_origin + x_count, dtype=np.int64).view(np.uint64)
+    y_lattice = np.arange(y_origin, y_origin + y_count, dtype=np.int64).view(np.uint64)
+
+    seed_hash = _split_mix_64(np.array([seed & _UINT64_MASK], dtype=np.uint64))
+    hashes = _split_mix_64(_split_mix_64(seed_hash ^ x_lattice)[np.newaxis, :] ^ y_lattice[:, np.newaxis])
+
+    x_hashes = _split_mix_64(hashes)
+    y_hashes = _split_mix_64(x_hashes)
+
+    # The top 53 bits as a float in [0, 1), then moved into [-1, 1)
+    return ((x_hashes >> np.uint64(11)) * 2. ** -53 * 2 - 1,
+            (y_hashes >> np.uint64(11)) * 2. ** -53 * 2 - 1)
+
+
+def _split_mix_64(values: np.ndarray) -> np.ndarray:
+    """
+The SplitMix64 mixing function, for an array of uint64, wrapping around on overflow.
+    """
+
+    values = values + np.uint64(0x9E3779B97F4A7C15)
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+
+    return values ^ (values >> np.uint64(31))
+
+
+def _fade(values: np.ndarray) -> np.ndarray:
+    """
+The perlin smoothing function, 6t^5 - 15t^4 + 10t^3, for a 1d array.
+Uses math.pow per value as numpy's power can differ in the last bit, it is only ever called along one axis.
+    """
+
+    return np.fromiter(
+        (6 * math.pow(value, 5) - 15 * math.pow(value, 4) + 10 * math.pow(value, 3) for value in values.tolist()),
+        dtype=np.float64,
+        count=len(values)
+    )
@@ -1,53 +1,55 @@
-import math
+import numpy as np
 
 
 class NoiseMap:
+    """
+A 2d grid of noise values stored in a single contiguous numpy array.
+Coordinates are given as [x, y] but the underlying array is indexed [y, x] so rows are contiguous.
+    """
+
     def __init__(self, x_size: int, y_size: int):
         self._x_size: int = x_size
         self._y_size: int = y_size
 
-        self._noise_map: list[list[float]] = [[0 for _ in range(x_size)] for _ in range(y_size)]
+        self._noise_map: np.ndarray = np.zeros((y_size, x_size), dtype=np.float64)
 
-    def __getitem__(self, coords: tuple[int, int]) -> float:
+    def __getitem__(self, coords: tuple[int | slice, int | slice]) -> float | np.ndarray:
         """
 Returns the noise value at the given coordinates.
 Raises an IndexError of the coords are out of bounds.
-Does not work with slices.
+If either coordinate is a slice then a view into the noise map is returned, indexed [y, x], not a copy.
         :param coords: The coordinates of the noise to lookup.
         :return: The noise at the coordinates.
         """
 
         x, y = coords
 
-        assert isinstance(x, int) and isinstance(y, int), "Coordinates need to be integers"
+        if isinstance(x, slice) or isinstance(y, slice):
+            return self._noise_map[y, x]
 
-        # Check for within bounds
-        if x < 0 or x >= self._x_size:
-            raise IndexError(f"Provided x coordinate '{x}' is not within the bounds [0, {self._x_size})")
-        if y < 0 or y >= self._y_size:
-            raise IndexError(f"Provided y coordinate '{y}' is not within the bounds [0, {self._y_size})")
+        # Numpy checks the upper bound but negative indices would wrap around
+        if x < 0 or y < 0:
+            raise IndexError(f"Provided coordinates '{coords}' are not within the bounds "
+                             f"[0, {self._x_size}), [0, {self._y_size})")
 
-        return self._noise_map[y][x]
+        return self._noise_map.item(y, x)
 
-    def __setitem__(self, coords: tuple[int, int], value: float) -> None:
+    def __setitem__(self, coords: tuple[int | slice, int | slice], value: float | np.ndarray) -> None:
         """
 Sets the value of the noise at the given coordinates.
 Raises an IndexError of the coords are out of bounds.
+Slices set every value in the slice.
         :param coords:The coordinates of the noise to set.
         :param value: The value to set the noise to.
         """
 
         x, y = coords
 
-        assert isinstance(x, int) and isinstance(y, int), "Coordinates need to be integers"
-
-        # Check for within bounds
-        if x < 0 or x >= self._x_size:
-            raise IndexError(f"Provided x coordinate '{x}' is not within the bounds [0, {self._x_size})")
-        if y < 0 or y >= self._y_size:
-            raise IndexError(f"Provided y coordinate '{y}' is not within the bounds [0, {self._y_size})")
+        if not (isinstance(x, slice) or isinstance(y, slice)) and (x < 0 or y < 0):
+            raise IndexError(f"Provided coordinates '{coords}' are not within the bounds "
+                             f"[0, {self._x_size}), [0, {self._y_size})")
 
-        self._noise_map[y][x] = value
+        self._noise_map[y, x] = value
 
     # region - Getters
     @property
@@ -58,26 +60,102 @@ Raises an IndexError of the coords are out of bounds.
     def y_size(self) -> int:
         return self._y_size
 
+    @property
+    def values(self) -> np.ndarray:
+        """
+The underlying array, indexed [y, x].
+Changing it changes the noise map.
+        """
+
+        return self._noise_map
+
     # endregion - Getters
 
+    # region - Views
+
+    def row(self, y: int) -> np.ndarray:
+        """
+Returns a view of every value with the given y coordinate.
+        """
+
+        return self._noise_map[y, :]
+
+    def column(self, x: int) -> np.ndarray:
+        """
+Returns a view of every value with the given x coordinate.
+        """
+
+        return self._noise_map[:, x]
+
+    # endregion - Views
+
+    # region - Bulk operations
+
+    def fill(self, value: float) -> None:
+        """
+Sets every value in the noise map to the given value.
+        """
+
+        self._noise_map.fill(value)
+
+    def add(self, values: float | np.ndarray) -> None:
+        """
+Adds to every value in the noise map, in place.
+        :param values: Either a single value or an array of shape (y_size, x_size).
+        """
+
+        self._noise_map += values
+
+    def scale(self, factor: float | np.ndarray) -> None:
+        """
+Multiplies every value in the noise map, in place.
+        :param factor: Either a single value or an array of shape (y_size, x_size).
+        """
+
+        self._noise_map *= factor
+
+    def min_value(self) -> float:
+        """
+Returns the smallest value in the noise map, ignoring infinities.
+        """
+
+        return float(np.min(self._noise_map, where=~np.isinf(self._noise_map), initial=np.inf))
+
+    def max_value(self) -> float:
+        """
+Returns the largest value in the noise map, ignoring infinities.
+        """
+
+        return float(np.max(self._noise_map, where=~np.isinf(self._noise_map), initial=-np.inf))
+
+    # endregion - Bulk operations
+
     def clear(self) -> None:
         """
 Returns all values in the noise map to 0.
         """
 
-        self._noise_map: list[list[float]] = [[0 for _ in range(self._x_size)] for _ in range(self._y_size)]
+        self.fill(0.)
+
+    def set_values(self, values: np.ndarray) -> None:
+        """
+Replaces every value in the noise map with the given values.
+        :param values: An array of shape (y_size, x_size), indexed [y, x].
+        """
+
+        assert values.shape == (self._y_size, self._x_size), f"Values must have the shape {(self._y_size, self._x_size)}"
+
+        self._noise_map[...] = values
 
     def normalise_values(self, make_min_0: bool = True) -> None:
         """
 Forces every value to be between 0 and 1, inclusive.
+Done in place without copying the noise map.
         :param make_min_0: If true then finds the min value in the noise map and makes it 0 and chances every other
         value accordingly.
         """
 
         if make_min_0:
-            min_value = min([min([value for value in row if not math.isinf(value)]) for row in self._noise_map])
-            min_value = -min_value
-            self._noise_map = [[value + min_value for value in row] for row in self._noise_map]
+            self.add(-self.min_value())
 
-        max_value = max([max([value for value in row if not math.isinf(value)]) for row in self._noise_map])
-        self._noise_map = [[value / max_value for value in row] for row in self._noise_map]
+        self._noise_map /= self.max_value()
@@ -0,0 +1,176 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+
+class NoiseMapCache:
+    """
+A directory of generated noise maps, each saved as a .npy file named after a hash of everything the map depends on.
+Loading memory maps the file rather than reading it in, and the least recently used maps are deleted once the
+directory goes over its size cap.
+Shared between processes and runs, so the same map is only ever generated once.
+    """
+
+    # Goes up whenever the way noise maps are generated changes, so old maps are never loaded
+    FORMAT_VERSION: int = 1
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024):
+        """
+        :param directory: The directory to keep the noise maps in, created if it doesn't exist.
+        :param max_bytes: The most bytes of noise maps to keep, the least recently used are deleted after this.
+        """
+
+        assert max_bytes > 0, "Max bytes must be a positive integer"
+
+        self.directory: str = directory
+        self.max_bytes: int = max_bytes
+
+        os.makedirs(directory, exist_ok=True)
+
+        # Counters for sizing the cache
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    # region - Getters
+    @property
+    def size_bytes(self) -> int:
+        """
+The total size of every noise map in the cache.
+        """
+
+        return sum(size for _, size, _ in self._entries())
+
+    # endregion - Getters
+
+    @classmethod
+    def make_key(cls, *parts) -> str:
+        """
+Hashes everything a noise map depends on into a key.
+Numpy arrays are hashed by their shape, type and bytes, everything else by its repr.
+        """
+
+        hasher = hashlib.sha256(f"v{cls.FORMAT_VERSION}".encode())
+
+        for part in parts:
+            if isinstance(part, np.ndarray):
+                hasher.update(f"{part.shape}{part.dtype}".encode())
+                hasher.update(np.ascontiguousarray(part).tobytes())
+            else:
+                hasher.update(repr(part).encode())
+
+            # Keeps the parts apart, e.g. ("ab", "c") and ("a", "bc")
+            hasher.update(b"\0")
+
+        return hasher.hexdigest()
+
+    def load(self, key: str) -> np.ndarray | None:
+        """
+Returns the noise map with the key, memory mapped and read only, or None if it isn't in the cache.
+        """
+
+        path = self._path(key)
+
+        try:
+            values = np.load(path, mmap_mode="r")
+        except (FileNotFoundError, ValueError, OSError):
+            self.misses += 1
+            return None
+
+        # Marks it as recently used
+        os.utime(path)
+
+        self.hits += 1
+        return values
+
+    def store(self, key: str, values: np.ndarray):
+        """
+Saves the noise map under the key, then deletes the least recently used maps if the cache is too big.
+Written to a temporary file first so other processes never load half a map.
+        """
+
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+
+        try:
+            with os.fdopen(file_descriptor, "wb") as file:
+                np.save(file, values)
+
+            os.replace(temporary_path, self._path(key))
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+
+        self._evict()
+
+    def clear(self):
+        """
+Deletes every noise map in the cache, the counters are kept.
+        """
+
+        for path, _, _ in self._entries():
+            os.remove(path)
+
+    def stats(self) -> dict[str, int | float]:
+        """
+Returns the counters and how full the cache is, for sizing the cache.
+        """
+
+        lookups = self.hits + self.misses
+
+        return {
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.,
+            "evictions": self.evictions
+        }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def _entries(self) -> list[tuple[str, int, float]]:
+        """
+Returns the path, size and last use time of every noise map in the cache.
+        """
+
+        entries = []
+
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npy"):
+                continue
+
+            path = os.path.join(self.directory, name)
+
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # Deleted by another process
+                continue
+
+            entries.append((path, stat.st_size, stat.st_mtime))
+
+        return entries
+
+    def _evict(self):
+        """
+Deletes the least recently used noise maps until the cache is within its size cap.
+        """
+
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+            total -= size
+            self.evictions += 1
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from . import ChangeTracker
+
+if TYPE_CHECKING:
+    from ._Environment import Environment
+
+
+class PathCache:
+    """
+A least recently used cache of paths found across an environment, keyed by (start, goal).
+Remembers which grid squares each path crosses, so a change to a grid square only throws away the paths through it.
+Paths that don't cross a change are kept even if the change opened up a cheaper route, e.g. a wall being destroyed
+next to the path.
+    """
+
+    def __init__(self, environment: Environment, max_size: int = 256):
+        """
+        :param environment: The environment the paths are across.
+        :param max_size: The most paths to keep, the least recently used path is dropped after this.
+        """
+
+        assert max_size > 0, "Max size must be a positive integer"
+
+        self.environment: Environment = environment
+        self.max_size: int = max_size
+
+        self._paths: OrderedDict[tuple[tuple[int, int], tuple[int, int]], list[tuple[int, int]] | None] = OrderedDict()
+        # Grid square -> the keys of the paths crossing it
+        self._keys_by_cell: dict[tuple[int, int], set[tuple[tuple[int, int], tuple[int, int]]]] = {}
+
+        self._changes: ChangeTracker = ChangeTracker()
+        environment.add_change_tracker(self._changes)
+
+        # Counters for sizing the cache
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.invalidations: int = 0
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def __contains__(self, key: tuple[tuple[int, int], tuple[int, int]]) -> bool:
+        self._apply_changes()
+
+        return key in self._paths
+
+    def find_path(self, start: tuple[int, int], goal: tuple[int, int]) -> list[tuple[int, int]] | None:
+        """
+Returns the cached path between the grid squares, finding it with the environment's pathfinder if not cached.
+        :param start: The coordinates to start from.
+        :param goal: The coordinates to path to.
+        :return: A copy of every grid square on the path, including the start and goal, or None if there is no path.
+        """
+
+        self._apply_changes()
+
+        key = (start, goal)
+
+        if key in self._paths:
+            self.hits += 1
+            self._paths.move_to_end(key)
+            path = self._paths[key]
+        else:
+            self.misses += 1
+            path = self.environment.pathfinder.find_path(start, goal)
+            self._add(key, path)
+
+        return None if path is None else path.copy()
+
+    def stats(self) -> dict[str, int | float]:
+        """
+Returns the counters and how full the cache is, for sizing the cache.
+        """
+
+        lookups = self.hits + self.misses
+
+        return {
+            "size": len(self._paths),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+    def clear(self):
+        """
+Throws away every cached path, the counters are kept.
+        """
+
+        self._paths.clear()
+        self._keys_by_cell.clear()
+        self._changes.clear()
+
+    def detach(self):
+        """
+Stops listening to changes in the environment, call before throwing the cache away.
+        """
+
+        self.environment.remove_change_tracker(self._changes)
+
+    def _add(self, key: tuple[tuple[int, int], tuple[int, int]], path: list[tuple[int, int]] | None):
+        self._paths[key] = path
+
+        # No path at all can only change if anything changes, so file it under the start
+        for cell in path if path is not None else (key[0],):
+            self._keys_by_cell.setdefault(cell, set()).add(key)
+
+        while len(self._paths) > self.max_size:
+            self._remove(next(iter(self._paths)))
+            self.evictions += 1
+
+    def _remove(self, key: tuple[tuple[int, int], tuple[int, int]]):
+        path = self._paths.pop(key)
+
+        for cell in path if path is not None else (key[0],):
+            keys = self._keys_by_cell.get(cell)
+            if keys is None:
+                continue
+
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_cell[cell]
+
+    def _apply_changes(self):
+        """
+Drops every path crossing a grid square that changed since last time.
+        """
+
+        if not self._changes.has_changes:
+            return
+
+        if self._changes.all_changed:
+            self.invalidations += len(self._paths)
+            self.clear()
+            return
+
+        for cell in self._changes.cells:
+            for key in list(self._keys_by_cell.get(cell, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+        self._changes.clear()
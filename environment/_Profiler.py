@@ -0,0 +1,161 @@
+import cProfile
+import json
+import pstats
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from time import perf_counter as pc
+from typing import Iterator, ContextManager
+
+
+class Profiler:
+    """
+Records the wall time, cell throughput and peak memory of each stage of making and using an environment.
+Given to a GeneratorHandler, Environment, renderer or simulation, which record their stages into it:
+    noise map, apply, normalise, connection update, render and simulation.
+Stages can be inside other stages, e.g. normalise inside noise map, the outer stage's numbers include the inner one.
+    """
+
+    NOISE_MAP: str = "noise map"
+    APPLY: str = "apply"
+    NORMALISE: str = "normalise"
+    CONNECTION_UPDATE: str = "connection update"
+    RENDER: str = "render"
+    SIMULATION: str = "simulation"
+
+    def __init__(self, track_memory: bool = False, use_cprofile: bool = False):
+        """
+        :param track_memory: If true then the peak memory allocated by each stage is recorded with tracemalloc, which
+        slows everything down a lot.
+        :param use_cprofile: If true then cProfile runs during every stage, see profile_stats.
+        """
+
+        self.track_memory: bool = track_memory
+
+        self.records: list[dict[str, object]] = []
+
+        self._profile: cProfile.Profile | None = cProfile.Profile() if use_cprofile else None
+        # The stages currently running, innermost last, with the highest memory seen in each
+        self._running: list[dict[str, float]] = []
+        self._started_tracing: bool = False
+
+    @staticmethod
+    def stage_of(profiler: "Profiler | None", name: str, cells: int = 0, label: str = "") -> ContextManager:
+        """
+Returns a context manager recording a stage into the profiler, or doing nothing if there is no profiler.
+        """
+
+        if profiler is None:
+            return nullcontext()
+
+        return profiler.stage(name, cells, label)
+
+    @contextmanager
+    def stage(self, name: str, cells: int = 0, label: str = "") -> Iterator[None]:
+        """
+Records the stage run inside the with block.
+        :param name: The name of the stage, e.g. Profiler.NOISE_MAP.
+        :param cells: The number of grid squares the stage works on, for the throughput.
+        :param label: What is running the stage, e.g. the name of the generator.
+        """
+
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+        running = {"start_memory": 0., "peak_memory": 0.}
+        if self.track_memory:
+            running["start_memory"] = running["peak_memory"] = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+        self._running.append(running)
+
+        if self._profile is not None and len(self._running) == 1:
+            self._profile.enable()
+
+        start = pc()
+
+        try:
+            yield
+        finally:
+            time = pc() - start
+
+            if self._profile is not None and len(self._running) == 1:
+                self._profile.disable()
+
+            self._running.pop()
+
+            peak_memory = 0
+            if self.track_memory:
+                running["peak_memory"] = max(running["peak_memory"], tracemalloc.get_traced_memory()[1])
+                peak_memory = int(running["peak_memory"] - running["start_memory"])
+
+                # The peak was reset for this stage, so the stage around it needs to know about it
+                if self._running:
+                    self._running[-1]["peak_memory"] = max(self._running[-1]["peak_memory"], running["peak_memory"])
+
+                if self._started_tracing and not self._running:
+                    tracemalloc.stop()
+                    self._started_tracing = False
+
+            self.records.append({
+                "stage": name,
+                "label": label,
+                "depth": len(self._running),
+                "time": time,
+                "cells": cells,
+                "cells_per_second": cells / time if cells and time > 0 else 0.,
+                "peak_memory": peak_memory
+            })
+
+    def report(self) -> dict[str, object]:
+        """
+Returns every recorded stage, in the order they finished, and the totals of each stage name.
+        """
+
+        totals: dict[str, dict[str, float]] = {}
+
+        for record in self.records:
+            total = totals.setdefault(record["stage"], {"count": 0, "time": 0., "cells": 0, "peak_memory": 0})
+
+            total["count"] += 1
+            total["time"] += record["time"]
+            total["cells"] += record["cells"]
+            total["peak_memory"] = max(total["peak_memory"], record["peak_memory"])
+
+        for total in totals.values():
+            total["cells_per_second"] = total["cells"] / total["time"] if total["cells"] and total["time"] > 0 else 0.
+
+        return {"stages": [record.copy() for record in self.records], "totals": totals}
+
+    def to_json(self, path: str | None = None, indent: int | None = 2) -> str:
+        """
+Returns the report as JSON, also writing it to the file if a path is given.
+        """
+
+        text = json.dumps(self.report(), indent=indent)
+
+        if path is not None:
+            with open(path, "w") as file:
+                file.write(text)
+
+        return text
+
+    def profile_stats(self) -> pstats.Stats | None:
+        """
+Returns the cProfile stats of every stage so far, or None if cProfile isn't being used.
+        """
+
+        if self._profile is None:
+            return None
+
+        return pstats.Stats(self._profile)
+
+    def clear(self):
+        """
+Forgets every recorded stage and the cProfile stats.
+        """
+
+        self.records.clear()
+
+        if self._profile is not None:
+            self._profile = cProfile.Profile()
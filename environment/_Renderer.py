@@ -0,0 +1,378 @@
+from __future__ import annotations
+
+import struct
+import zlib
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from . import Profiler, ChangeTracker
+from .EnvironmentData import GridSquareTerrain, GridSquareStructures
+
+if TYPE_CHECKING:
+    from ._Environment import Environment
+
+
+class Renderer:
+    """
+Turns the terrain and structure values of an environment into an RGB image, one pixel per grid square.
+Every pair of terrain and structure values is given its colour once in a lookup table, so drawing the whole map is a
+single numpy index rather than a dict lookup per grid square.
+Structures without a colour show the colour of the terrain under them.
+    """
+
+    DEFAULT_TERRAIN_COLOURS: dict[GridSquareTerrain, tuple[int, int, int]] = {
+        GridSquareTerrain.CLEAR: (70, 110, 45),
+        GridSquareTerrain.HILL: (50, 80, 50),
+        GridSquareTerrain.MOUNTAIN: (50, 55, 70),
+        GridSquareTerrain.SNOW: (255, 255, 255),
+        GridSquareTerrain.RIVER: (40, 90, 160)
+    }
+
+    DEFAULT_STRUCTURE_COLOURS: dict[GridSquareStructures, tuple[int, int, int]] = {
+        GridSquareStructures.PLAYER_BASE: (255, 0, 0),
+        GridSquareStructures.TREE: (0, 255, 0),
+        GridSquareStructures.STONE: (0, 0, 255),
+        GridSquareStructures.WOOD_WALL: (120, 80, 40),
+        GridSquareStructures.STONE_WALL: (130, 130, 130),
+        GridSquareStructures.WOOD_SPAWNER: (200, 140, 60),
+        GridSquareStructures.STONE_SPAWNER: (180, 180, 200)
+    }
+
+    def __init__(self, terrain_colours: dict[GridSquareTerrain, tuple[int, int, int]] | None = None,
+                 structure_colours: dict[GridSquareStructures, tuple[int, int, int]] | None = None,
+                 profiler: Profiler | None = None):
+        """
+        :param terrain_colours: The RGB colour of each terrain, any missing are black. Defaults to
+        DEFAULT_TERRAIN_COLOURS.
+        :param structure_colours: The RGB colour of each structure, any missing show the terrain under them. Defaults
+        to DEFAULT_STRUCTURE_COLOURS.
+        :param profiler: If given then every render is recorded in it.
+        """
+
+        self.terrain_colours: dict[GridSquareTerrain, tuple[int, int, int]] = dict(
+            self.DEFAULT_TERRAIN_COLOURS if terrain_colours is None else terrain_colours)
+        self.structure_colours: dict[GridSquareStructures, tuple[int, int, int]] = dict(
+            self.DEFAULT_STRUCTURE_COLOURS if structure_colours is None else structure_colours)
+
+        self.profiler: Profiler | None = profiler
+
+        # The colour of every structure value * _TERRAIN_COUNT + terrain value
+        self._lookup: np.ndarray = self._make_lookup()
+
+    # region - Getters
+    @property
+    def lookup(self) -> np.ndarray:
+        """
+The colour of every pair of values, indexed [structure value * (number of terrains + 1) + terrain value].
+        """
+
+        return self._lookup
+
+    # endregion - Getters
+
+    def set_palette(self, terrain_colours: dict[GridSquareTerrain, tuple[int, int, int]] | None = None,
+                    structure_colours: dict[GridSquareStructures, tuple[int, int, int]] | None = None):
+        """
+Changes the colours of the given terrains and structures, leaving the rest as they were.
+        """
+
+        self.terrain_colours.update(terrain_colours or {})
+        self.structure_colours.update(structure_colours or {})
+
+        self._lookup = self._make_lookup()
+
+    def render(self, environment: Environment, downsample: int = 1, average: bool = False) -> np.ndarray:
+        """
+Draws the environment.
+        :param environment: The environment to draw.
+        :param downsample: Draws one pixel for every downsample by downsample block of grid squares, for minimaps.
+        :param average: If true then each downsampled pixel is the average colour of its block, otherwise it is the
+        colour of the top left grid square of the block, which is faster.
+        :return: The image as a uint8 array, indexed [y, x, channel].
+        """
+
+        return self.render_values(environment.terrain_values, environment.structure_values, downsample, average)
+
+    def render_values(self, terrain: np.ndarray, structures: np.ndarray, downsample: int = 1,
+                      average: bool = False) -> np.ndarray:
+        """
+Draws terrain and structure values, e.g. straight from a map file or a chunk without making an environment.
+Takes the same arguments as render.
+        """
+
+        assert terrain.shape == structures.shape, "Terrain and structures must have the same shape"
+        assert downsample >= 1, "Downsample must be a positive integer"
+
+        y_size, x_size = terrain.shape
+
+        with Profiler.stage_of(self.profiler, Profiler.RENDER, x_size * y_size, type(self).__name__):
+            if downsample > 1 and not average:
+                terrain = terrain[::downsample, ::downsample]
+                structures = structures[::downsample, ::downsample]
+
+            image = self.colour(terrain, structures)
+
+            if downsample > 1 and average:
+                image = self._block_average(image, downsample)
+
+        return image
+
+    def colour(self, terrain: np.ndarray, structures: np.ndarray) -> np.ndarray:
+        """
+Looks up the colour of every grid square, without recording a stage or downsampling.
+        :param terrain: The GridSquareTerrain values, any shape.
+        :param structures: The GridSquareStructures values, the same shape as the terrain.
+        :return: The colours, the same shape with an extra axis for the channel.
+        """
+
+        indices = structures.astype(np.intp) * _TERRAIN_COUNT
+        indices += terrain
+
+        return self._lookup[indices]
+
+    def _make_lookup(self) -> np.ndarray:
+        """
+Works out the colour of every pair of terrain and structure values.
+        """
+
+        terrain_lookup = np.zeros((_TERRAIN_COUNT, 3), dtype=np.uint8)
+        for terrain, colour in self.terrain_colours.items():
+            terrain_lookup[terrain.value] = colour
+
+        # Every structure starts off showing the terrain
+        lookup = np.tile(terrain_lookup, (_STRUCTURE_COUNT, 1, 1))
+        for structure, colour in self.structure_colours.items():
+            lookup[structure.value] = colour
+
+        return lookup.reshape(-1, 3)
+
+    @staticmethod
+    def _block_average(image: np.ndarray, downsample: int) -> np.ndarray:
+        """
+Shrinks the image by averaging each downsample by downsample block, the blocks on the edges can be smaller.
+        """
+
+        y_size, x_size = image.shape[:2]
+        y_starts, x_starts = np.arange(0, y_size, downsample), np.arange(0, x_size, downsample)
+
+        sums = np.add.reduceat(np.add.reduceat(image.astype(np.uint32), y_starts, axis=0), x_starts, axis=1)
+        counts = np.outer(np.diff(y_starts, append=y_size), np.diff(x_starts, append=x_size))
+
+        return (sums / counts[:, :, None] + 0.5).astype(np.uint8)
+
+    # region - Saving images
+
+    @classmethod
+    def save(cls, path: str, image: np.ndarray):
+        """
+Saves the image as a PNG, or as a PPM if the path ends in .ppm.
+        """
+
+        if path.lower().endswith(".ppm"):
+            cls.save_ppm(path, image)
+        else:
+            cls.save_png(path, image)
+
+    @staticmethod
+    def save_ppm(path: str, image: np.ndarray):
+        """
+Saves an RGB uint8 image, indexed [y, x, channel], as a binary PPM.
+        """
+
+        y_size, x_size = image.shape[:2]
+
+        with open(path, "wb") as file:
+            file.write(f"P6\n{x_size} {y_size}\n255\n".encode("ascii"))
+            file.write(np.ascontiguousarray(image, dtype=np.uint8).tobytes())
+
+    @staticmethod
+    def save_png(path: str, image: np.ndarray, compression: int = 6):
+        """
+Saves an RGB uint8 image, indexed [y, x, channel], as a PNG.
+        :param compression: The zlib level, 0 to 9, lower is faster but bigger.
+        """
+
+        y_size, x_size = image.shape[:2]
+
+        # Every row starts with its filter type, 0 for none
+        rows = np.zeros((y_size, x_size * 3 + 1), dtype=np.uint8)
+        rows[:, 1:] = image.reshape(y_size, x_size * 3)
+
+        def chunk(chunk_type: bytes, data: bytes) -> bytes:
+            return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+        with open(path, "wb") as file:
+            file.write(b"\x89PNG\r\n\x1a\n")
+            # Width, height, 8 bits per channel, RGB, then the default compression, filter and interlace methods
+            file.write(chunk(b"IHDR", struct.pack(">IIBBBBB", x_size, y_size, 8, 2, 0, 0, 0)))
+            file.write(chunk(b"IDAT", zlib.compress(rows.tobytes(), compression)))
+            file.write(chunk(b"IEND", b""))
+
+    # endregion - Saving images
+
+
+class IncrementalRenderer:
+    """
+Keeps an image of an environment, or of a region of it, up to date by only redrawing the parts that changed.
+The changed grid squares are gathered into tile_size by tile_size tiles, and neighbouring dirty tiles on the same row
+are joined into one rectangle, so a UI only has to copy the rectangles returned by update onto the screen.
+    """
+
+    def __init__(self, environment: Environment, renderer: Renderer | None = None,
+                 region: tuple[int, int, int, int] | None = None, tile_size: int = 16):
+        """
+        :param environment: The environment to draw.
+        :param renderer: Gives the colours, a default Renderer if not given. Its profiler records every update.
+        :param region: The x, y, width and height of the part of the environment to draw, the whole environment if not
+        given.
+        :param tile_size: The size of the tiles the changes are gathered into, smaller redraws less but gives more
+        rectangles.
+        """
+
+        assert tile_size >= 1, "Tile size must be a positive integer"
+
+        self.environment: Environment = environment
+        self.renderer: Renderer = Renderer() if renderer is None else renderer
+        self.tile_size: int = tile_size
+
+        self._region: tuple[int, int, int, int] = (0, 0, environment.x_size, environment.y_size)
+        self._framebuffer: np.ndarray = np.zeros((0, 0, 3), dtype=np.uint8)
+
+        # The rectangles redrawn by the last update, x, y, width and height in framebuffer coordinates
+        self._changed_regions: list[tuple[int, int, int, int]] = []
+
+        self._changes: ChangeTracker = ChangeTracker(all_changed=True)
+        environment.add_change_tracker(self._changes)
+
+        self.set_region(region)
+
+    # region - Getters
+    @property
+    def framebuffer(self) -> np.ndarray:
+        """
+The image of the region, indexed [y, x, channel], only up to date as of the last call to update.
+        """
+
+        return self._framebuffer
+
+    @property
+    def region(self) -> tuple[int, int, int, int]:
+        return self._region
+
+    @property
+    def changed_regions(self) -> list[tuple[int, int, int, int]]:
+        """
+The rectangles redrawn by the last update, as x, y, width and height in framebuffer coordinates.
+        """
+
+        return self._changed_regions
+
+    # endregion - Getters
+
+    def set_region(self, region: tuple[int, int, int, int] | None = None):
+        """
+Changes the part of the environment being drawn, redrawing all of it on the next update.
+        :param region: The x, y, width and height of the part to draw, the whole environment if not given.
+        """
+
+        if region is None:
+            region = (0, 0, self.environment.x_size, self.environment.y_size)
+
+        x, y, width, height = region
+        assert width > 0 and height > 0, "The region must have a positive width and height"
+        assert 0 <= x and x + width <= self.environment.x_size, "The region must be inside the environment"
+        assert 0 <= y and y + height <= self.environment.y_size, "The region must be inside the environment"
+
+        self._region = (x, y, width, height)
+        self._framebuffer = np.zeros((height, width, 3), dtype=np.uint8)
+        self._changes.mark_all()
+
+    def redraw(self):
+        """
+Redraws the whole region on the next update, e.g. after changing the renderer's palette.
+        """
+
+        self._changes.mark_all()
+
+    def update(self) -> list[tuple[int, int, int, int]]:
+        """
+Redraws the parts of the region that changed since the last update.
+        :return: The rectangles redrawn, as x, y, width and height in framebuffer coordinates.
+        """
+
+        if not self._changes.has_changes:
+            self._changed_regions = []
+            return self._changed_regions
+
+        region_x, region_y, width, height = self._region
+
+        if self._changes.all_changed:
+            rectangles = [(0, 0, width, height)]
+        else:
+            rectangles = self._dirty_rectangles()
+
+        cells = sum(rectangle[2] * rectangle[3] for rectangle in rectangles)
+
+        with Profiler.stage_of(self.renderer.profiler, Profiler.RENDER, cells, type(self).__name__):
+            terrain = self.environment.terrain_values
+            structures = self.environment.structure_values
+
+            for x, y, rectangle_width, rectangle_height in rectangles:
+                source = (slice(region_y + y, region_y + y + rectangle_height),
+                          slice(region_x + x, region_x + x + rectangle_width))
+
+                self._framebuffer[y:y + rectangle_height, x:x + rectangle_width] = self.renderer.colour(
+                    terrain[source], structures[source])
+
+        self._changes.clear()
+        self._changed_regions = rectangles
+
+        return rectangles
+
+    def detach(self):
+        """
+Stops listening to the environment's changes, call when the renderer is no longer needed.
+        """
+
+        self.environment.remove_change_tracker(self._changes)
+
+    def _dirty_rectangles(self) -> list[tuple[int, int, int, int]]:
+        """
+Gathers the changed grid squares inside the region into rectangles of whole tiles, in framebuffer coordinates.
+        """
+
+        region_x, region_y, width, height = self._region
+
+        cells = np.array(list(self._changes.cells), dtype=np.int64).reshape(-1, 2)
+        x_coords, y_coords = cells[:, 0] - region_x, cells[:, 1] - region_y
+
+        inside = (x_coords >= 0) & (x_coords < width) & (y_coords >= 0) & (y_coords < height)
+        x_tiles, y_tiles = x_coords[inside] // self.tile_size, y_coords[inside] // self.tile_size
+
+        # Sorted by row then column, so runs of neighbouring tiles are next to each other
+        x_tile_count = -(-width // self.tile_size)
+        tiles = np.unique(y_tiles * x_tile_count + x_tiles)
+
+        rectangles = []
+        run_start = 0
+
+        for index in range(1, len(tiles) + 1):
+            if index < len(tiles) and tiles[index] == tiles[index - 1] + 1 and tiles[index] % x_tile_count:
+                continue
+
+            y_tile, first_x_tile = divmod(int(tiles[run_start]), x_tile_count)
+            last_x_tile = int(tiles[index - 1]) % x_tile_count
+
+            x, y = first_x_tile * self.tile_size, y_tile * self.tile_size
+            rectangles.append((x, y, min((last_x_tile + 1) * self.tile_size, width) - x,
+                               min(self.tile_size, height - y)))
+
+            run_start = index
+
+        return rectangles
+
+
+# How many values the terrain and structure arrays can hold, enum values start at 1
+_TERRAIN_COUNT: int = len(GridSquareTerrain) + 1
+_STRUCTURE_COUNT: int = len(GridSquareStructures) + 1
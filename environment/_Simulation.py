@@ -0,0 +1,554 @@
+from __future__ import annotations
+
+import math
+from time import perf_counter as pc
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+from . import Profiler, FlowField, TimingWheel
+from .EnvironmentData import EntityTasks, TimerEvents
+
+if TYPE_CHECKING:
+    from ._Environment import Environment
+
+# Every component and its type, each is one packed array with a row per living entity
+_COMPONENTS: dict[str, type] = {
+    "ids": np.int64,
+    # The flat index, y * x_size + x, of the grid square the entity is on
+    "cells": np.int64,
+    "health": np.float32,
+    "owner": np.int16,
+    # How much movement cost is covered each tick
+    "speed": np.float32,
+    # Movement cost covered towards the next grid square
+    "progress": np.float32,
+    "task": np.uint8,
+    # The index of the flow field being followed, -1 if none
+    "flow_field": np.int16,
+    # Where the path being followed starts in the path buffer, its length and how far along it the entity is
+    "path_start": np.int64,
+    "path_length": np.int32,
+    "path_cursor": np.int32
+}
+
+
+class Simulation:
+    """
+Holds every entity on an environment and moves them all each tick.
+Entities are not objects, each component (position, health, owner, task, ...) is a packed numpy array with a row per
+living entity, so a tick is a handful of array passes no matter how many entities there are.
+Entities move by following a flow field, e.g. towards an enemy base, or a path. Stepping onto a grid square costs the
+same as the connection weight in the edge index, and an entity steps once the movement it has built up covers it.
+Spawners and harvesting entities run on timers, see TimerEvents, so a tick only costs something for the ones due.
+Entities are known by their id, the row an entity is in changes as entities die. Ids only go up and removing
+entities keeps the order of the rest, so the ids component is always sorted and an id's row is found by binary search,
+with nothing kept per id that ever died.
+    """
+
+    def __init__(self, environment: Environment, capacity: int = 1024, max_steps_per_tick: int = 4,
+                 profiler: Profiler | None = None):
+        """
+        :param environment: The environment the entities are on.
+        :param capacity: How many entities there is room for before the arrays grow.
+        :param max_steps_per_tick: The most grid squares an entity can move in one tick.
+        :param profiler: If given then every tick is recorded in it.
+        """
+
+        assert capacity >= 1, "Capacity must be a positive integer"
+        assert max_steps_per_tick >= 1, "Max steps per tick must be a positive integer"
+
+        self.environment: Environment = environment
+        self.max_steps_per_tick: int = max_steps_per_tick
+        self.profiler: Profiler | None = profiler
+
+        self._count: int = 0
+        self._components: dict[str, np.ndarray] = {name: np.zeros(capacity, dtype=dtype)
+                                                   for name, dtype in _COMPONENTS.items()}
+
+        self._next_id: int = 0
+
+        # The flow fields being followed, and the player base each one heads to
+        self._flow_fields: list[FlowField] = []
+        self._flow_field_indices: dict[tuple[int, int], int] = {}
+
+        # Every path being followed, as flat indices one after the other
+        self._paths: np.ndarray = np.zeros(1024, dtype=np.int64)
+        self._paths_used: int = 0
+
+        # Spawner production, harvesting, build completion and any other timed events, advanced once per tick
+        self.timers: TimingWheel = TimingWheel()
+        # The events fired by the timers on the last tick, in order, for the game to act on
+        self.events: list[Any] = []
+
+        # Spawner id -> its timer and what it spawns, see add_spawner
+        self._spawners: dict[int, tuple[int, dict[str, Any]]] = {}
+        self._next_spawner_id: int = 0
+        # Entity id -> the timer of its harvesting, left until it next fires after the entity stops
+        self._harvest_timers: dict[int, int] = {}
+
+        self.ticks: int = 0
+        self.last_tick_time: float = 0.
+
+    def __len__(self) -> int:
+        return self._count
+
+    # region - Getters
+    @property
+    def ids(self) -> np.ndarray:
+        """
+The id of every living entity, in row order like every other component.
+        """
+
+        return self._components["ids"][:self._count]
+
+    @property
+    def cells(self) -> np.ndarray:
+        """
+The flat index, y * x_size + x, of the grid square every living entity is on.
+        """
+
+        return self._components["cells"][:self._count]
+
+    @property
+    def x_positions(self) -> np.ndarray:
+        return self.cells % self.environment.x_size
+
+    @property
+    def y_positions(self) -> np.ndarray:
+        return self.cells // self.environment.x_size
+
+    @property
+    def health(self) -> np.ndarray:
+        return self._components["health"][:self._count]
+
+    @property
+    def owners(self) -> np.ndarray:
+        return self._components["owner"][:self._count]
+
+    @property
+    def tasks(self) -> np.ndarray:
+        """
+The EntityTasks value of every living entity.
+        """
+
+        return self._components["task"][:self._count]
+
+    @property
+    def path_cursors(self) -> np.ndarray:
+        """
+How far along its path every living entity is, 0 for those not following a path.
+        """
+
+        return self._components["path_cursor"][:self._count]
+
+    # endregion - Getters
+
+    def component(self, name: str) -> np.ndarray:
+        """
+Returns the packed array of a component, one row per living entity. Writes to it change the entities.
+        """
+
+        return self._components[name][:self._count]
+
+    def rows_of(self, ids: int | np.ndarray) -> np.ndarray:
+        """
+Returns the row of each entity in the component arrays, raising a KeyError if any are dead or never existed.
+        """
+
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        living = self.ids
+
+        rows = np.searchsorted(living, ids)
+        found = rows < self._count
+        found[found] = living[rows[found]] == ids[found]
+
+        if not found.all():
+            raise KeyError(f"Entities {ids[~found].tolist()} do not exist")
+
+        return rows
+
+    def is_alive(self, entity_id: int) -> bool:
+        row = int(np.searchsorted(self.ids, entity_id))
+        return row < self._count and self._components["ids"].item(row) == entity_id
+
+    # region - Entities
+
+    def spawn(self, x: int | np.ndarray, y: int | np.ndarray, owner: int | np.ndarray = 0,
+              health: float | np.ndarray = 100., speed: float | np.ndarray = 1., count: int = 1) -> np.ndarray:
+        """
+Adds entities, every argument can be one value for all of them or an array with one value each.
+        :param count: How many entities to add, only used if none of the arguments are arrays.
+        :return: The ids of the new entities.
+        """
+
+        x, y, owner, health, speed = np.broadcast_arrays(x, y, owner, health, speed)
+        if x.ndim == 0:
+            x, y, owner, health, speed = (np.full(count, value) for value in (x, y, owner, health, speed))
+
+        x_size, y_size = self.environment.x_size, self.environment.y_size
+        assert ((0 <= x) & (x < x_size) & (0 <= y) & (y < y_size)).all(), \
+            "Entities must be spawned inside the environment"
+
+        spawned = len(x)
+        ids = np.arange(self._next_id, self._next_id + spawned, dtype=np.int64)
+
+        self._reserve(self._count + spawned)
+
+        new_rows = slice(self._count, self._count + spawned)
+        for values in self._components.values():
+            values[new_rows] = 0
+
+        components = self._components
+        components["ids"][new_rows] = ids
+        components["cells"][new_rows] = y.astype(np.int64) * x_size + x
+        components["health"][new_rows] = health
+        components["owner"][new_rows] = owner
+        components["speed"][new_rows] = speed
+        components["task"][new_rows] = EntityTasks.IDLE.value
+        components["flow_field"][new_rows] = -1
+
+        self._count += spawned
+        self._next_id += spawned
+
+        return ids
+
+    def damage(self, ids: int | np.ndarray, amounts: float | np.ndarray):
+        """
+Takes health off entities, an entity given more than once takes all of it. Entities die at the end of the tick.
+        """
+
+        rows = self.rows_of(ids)
+        np.subtract.at(self._components["health"], rows, np.broadcast_to(amounts, rows.shape).astype(np.float32))
+
+    def kill(self, ids: int | np.ndarray):
+        """
+Removes entities straight away.
+        """
+
+        rows = self.rows_of(ids)
+
+        keep = np.ones(self._count, dtype=bool)
+        keep[rows] = False
+        self._compact(keep)
+
+    def set_task(self, ids: int | np.ndarray, task: EntityTasks):
+        """
+Sets what the entities are doing, anything other than moving stops them where they are.
+        """
+
+        rows = self.rows_of(ids)
+        self._components["task"][rows] = task.value
+
+        if task != EntityTasks.MOVING:
+            self._stop(rows)
+
+    def move_to_player_base(self, ids: int | np.ndarray, player_base_location: tuple[int, int]):
+        """
+Sends entities towards a player base along its flow field, they become idle once on it.
+        :param player_base_location: The location of the top left of the player base, as given to set_player_base.
+        """
+
+        rows = self.rows_of(ids)
+
+        flow_field_index = self._flow_field_indices.get(player_base_location)
+        if flow_field_index is None:
+            flow_field_index = len(self._flow_fields)
+            self._flow_fields.append(self.environment.get_flow_field(player_base_location))
+            self._flow_field_indices[player_base_location] = flow_field_index
+
+        self._stop(rows)
+        self._components["task"][rows] = EntityTasks.MOVING.value
+        self._components["flow_field"][rows] = flow_field_index
+
+    def move_along_path(self, ids: int | np.ndarray, path: list[tuple[int, int]]):
+        """
+Sends entities along a path, e.g. from find_path, they become idle at the end of it.
+Every entity given shares the one copy of the path, each should be standing on its first grid square.
+        """
+
+        rows = self.rows_of(ids)
+
+        x_size = self.environment.x_size
+        cells = np.array([y * x_size + x for x, y in path], dtype=np.int64)
+
+        self._stop(rows)
+        start = self._add_path(cells)
+
+        components = self._components
+        components["task"][rows] = EntityTasks.MOVING.value
+        components["path_start"][rows] = start
+        components["path_length"][rows] = len(cells)
+
+    def harvest(self, ids: int | np.ndarray, interval: int):
+        """
+Sets entities working where they are, each firing a HARVESTED event every interval ticks until it is given another
+task or dies.
+        """
+
+        assert interval >= 1, "Interval must be a positive integer"
+
+        self.set_task(ids, EntityTasks.WORKING)
+
+        for entity_id in np.atleast_1d(ids).tolist():
+            old_timer_id = self._harvest_timers.get(entity_id)
+            if old_timer_id is not None:
+                self.timers.cancel(old_timer_id)
+
+            self._harvest_timers[entity_id] = self.timers.schedule(interval, (TimerEvents.HARVESTED, entity_id),
+                                                                   interval)
+
+    # endregion - Entities
+
+    # region - Spawners
+
+    def add_spawner(self, x: int, y: int, interval: int, count: int = 1, owner: int = 0, health: float = 100.,
+                    speed: float = 1., player_base_location: tuple[int, int] | None = None) -> int:
+        """
+Spawns entities at a grid square every interval ticks, firing a SPAWNED event with their ids each time.
+        :param count: How many entities are spawned each time.
+        :param player_base_location: If given then the entities spawned are sent to this player base, see
+        move_to_player_base.
+        :return: The id of the spawner, for removing it.
+        """
+
+        assert interval >= 1, "Interval must be a positive integer"
+
+        spawner_id = self._next_spawner_id
+        self._next_spawner_id += 1
+
+        timer_id = self.timers.schedule(interval, (TimerEvents.SPAWNED, spawner_id), interval)
+        self._spawners[spawner_id] = (timer_id, {
+            "x": x, "y": y, "count": count, "owner": owner, "health": health, "speed": speed,
+            "player_base_location": player_base_location
+        })
+
+        return spawner_id
+
+    def remove_spawner(self, spawner_id: int):
+        timer_id, _ = self._spawners.pop(spawner_id)
+        self.timers.cancel(timer_id)
+
+    # endregion - Spawners
+
+    def occupancy(self) -> np.ndarray:
+        """
+Returns how many entities are on every grid square, indexed [y, x].
+        """
+
+        environment = self.environment
+        counts = np.bincount(self.cells, minlength=environment.x_size * environment.y_size)
+
+        return counts.reshape(environment.y_size, environment.x_size)
+
+    def tick(self, dt: float = 1.):
+        """
+Fires the timers due this tick into events, moves every entity, then removes any that have died.
+        :param dt: How much of each entity's speed to add to its movement.
+        """
+
+        with Profiler.stage_of(self.profiler, Profiler.SIMULATION, self._count, type(self).__name__):
+            start_time = pc()
+
+            self.events = self._fire_timers()
+
+            for flow_field in self._flow_fields:
+                flow_field.update()
+
+            self._move(dt)
+
+            health = self._components["health"][:self._count]
+            if (health <= 0).any():
+                self._compact(health > 0)
+
+            self.last_tick_time = pc() - start_time
+
+        self.ticks += 1
+
+    def _fire_timers(self) -> list[Any]:
+        """
+Advances the timers a tick, spawning the entities of any spawners due.
+        :return: The events fired, with the ids spawned added to SPAWNED events, and HARVESTED events of entities that
+        stopped harvesting dropped.
+        """
+
+        events = []
+
+        for _, event in self.timers.advance():
+            kind = event[0] if isinstance(event, tuple) and event else None
+
+            if kind == TimerEvents.SPAWNED:
+                spawner = self._spawners[event[1]][1]
+                ids = self.spawn(spawner["x"], spawner["y"], spawner["owner"], spawner["health"], spawner["speed"],
+                                 spawner["count"])
+
+                if spawner["player_base_location"] is not None:
+                    self.move_to_player_base(ids, spawner["player_base_location"])
+
+                event = (TimerEvents.SPAWNED, event[1], ids)
+
+            elif kind == TimerEvents.HARVESTED:
+                entity_id = event[1]
+
+                if not (self.is_alive(entity_id)
+                        and self._components["task"][self.rows_of(entity_id)[0]] == EntityTasks.WORKING.value):
+                    self.timers.cancel(self._harvest_timers.pop(entity_id))
+                    continue
+
+            events.append(event)
+
+        return events
+
+    def _move(self, dt: float):
+        """
+Builds up the movement of every moving entity and steps each one as far as it covers.
+        """
+
+        components = self._components
+        count = self._count
+
+        rows = np.flatnonzero(components["task"][:count] == EntityTasks.MOVING.value)
+        if not len(rows):
+            return
+
+        components["progress"][rows] += components["speed"][rows] * dt
+
+        x_size = self.environment.x_size
+        potentials = self.environment.potential_values.reshape(-1)
+
+        for _ in range(self.max_steps_per_tick):
+            cells = components["cells"][rows]
+            next_cells = self._next_cells(rows)
+
+            # Nowhere left to go
+            arrived = next_cells < 0
+            if arrived.any():
+                self._stop(rows[arrived])
+                components["task"][rows[arrived]] = EntityTasks.IDLE.value
+
+                rows, cells, next_cells = rows[~arrived], cells[~arrived], next_cells[~arrived]
+
+            # The same as the weight of the connection in the edge index
+            diagonal = (cells % x_size != next_cells % x_size) & (cells // x_size != next_cells // x_size)
+            costs = np.maximum(np.where(diagonal, _DIAGONAL_LENGTH, 1.),
+                               np.maximum(potentials[cells], potentials[next_cells]))
+
+            stepping = components["progress"][rows] >= costs
+            if not stepping.any():
+                break
+
+            rows, next_cells, costs = rows[stepping], next_cells[stepping], costs[stepping]
+
+            components["progress"][rows] -= costs
+            components["cells"][rows] = next_cells
+            components["path_cursor"][rows] += components["path_length"][rows] > 0
+
+    def _next_cells(self, rows: np.ndarray) -> np.ndarray:
+        """
+Returns the next grid square of each moving entity, -1 for those with nowhere left to go.
+        """
+
+        components = self._components
+
+        cells = components["cells"][rows]
+        next_cells = np.full(len(rows), -1, dtype=np.int64)
+
+        flow_fields = components["flow_field"][rows]
+        for flow_field_index in np.unique(flow_fields[flow_fields >= 0]).tolist():
+            following = flow_fields == flow_field_index
+            next_cells[following] = self._flow_fields[flow_field_index].next_indices[cells[following]]
+
+        # Already at a target
+        next_cells[next_cells == cells] = -1
+
+        path_lengths = components["path_length"][rows]
+        on_path = path_lengths > 0
+        if on_path.any():
+            cursors = components["path_cursor"][rows[on_path]] + 1
+            more = cursors < path_lengths[on_path]
+
+            path_next = np.full(len(cursors), -1, dtype=np.int64)
+            path_next[more] = self._paths[components["path_start"][rows[on_path]][more] + cursors[more]]
+            next_cells[on_path] = path_next
+
+        return next_cells
+
+    def _stop(self, rows: np.ndarray):
+        """
+Stops entities following anything, leaving them where they are.
+        """
+
+        components = self._components
+
+        components["progress"][rows] = 0
+        components["flow_field"][rows] = -1
+        components["path_start"][rows] = 0
+        components["path_length"][rows] = 0
+        components["path_cursor"][rows] = 0
+
+    def _add_path(self, cells: np.ndarray) -> int:
+        """
+Copies a path into the path buffer, first dropping paths no entity follows anymore if it is full.
+        :return: Where the path starts in the buffer.
+        """
+
+        if self._paths_used + len(cells) > len(self._paths):
+            self._compact_paths()
+
+        if self._paths_used + len(cells) > len(self._paths):
+            self._paths = np.resize(self._paths, max(2 * len(self._paths), self._paths_used + len(cells)))
+
+        start = self._paths_used
+        self._paths[start:start + len(cells)] = cells
+        self._paths_used += len(cells)
+
+        return start
+
+    def _compact_paths(self):
+        """
+Moves the paths still being followed to the start of the path buffer.
+        """
+
+        components = self._components
+        path_starts = components["path_start"][:self._count]
+        path_lengths = components["path_length"][:self._count]
+
+        following = path_lengths > 0
+        starts, inverse = np.unique(path_starts[following], return_inverse=True)
+        lengths = np.zeros(len(starts), dtype=np.int64)
+        lengths[inverse] = path_lengths[following]
+
+        new_starts = np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+        paths = np.zeros_like(self._paths)
+        for start, new_start, length in zip(starts.tolist(), new_starts.tolist(), lengths.tolist()):
+            paths[new_start:new_start + length] = self._paths[start:start + length]
+
+        path_starts[following] = new_starts[inverse]
+        self._paths = paths
+        self._paths_used = int(lengths.sum())
+
+    def _compact(self, keep: np.ndarray):
+        """
+Removes the rows not kept, moving the rest up so the components stay packed and in the same order.
+        """
+
+        kept = int(keep.sum())
+
+        for values in self._components.values():
+            values[:kept] = values[:self._count][keep]
+
+        self._count = kept
+
+    def _reserve(self, count: int):
+        """
+Grows the component arrays so there is room for the given number of entities.
+        """
+
+        capacity = len(self._components["ids"])
+        if count > capacity:
+            capacity = max(count, 2 * capacity)
+            for name, values in self._components.items():
+                self._components[name] = np.resize(values, capacity)
+
+
+_DIAGONAL_LENGTH: float = math.sqrt(2)
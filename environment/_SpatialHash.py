@@ -0,0 +1,560 @@
+import math
+from heapq import heappush, heappop
+
+import numpy as np
+
+
+class SpatialHash:
+    """
+Finds entities near a point, in environment coordinates, without checking every entity.
+The environment is split into bucket_size by bucket_size buckets, each holding the ids of the entities inside it, so
+a query only looks at the entities in the buckets it overlaps.
+Entities can be moved one at a time with move, or all at once with update, e.g. from a Simulation after each tick,
+which only touches the entities that changed bucket.
+    """
+
+    def __init__(self, x_size: int, y_size: int, bucket_size: int = 8):
+        """
+        :param x_size: The x size of the environment.
+        :param y_size: The y size of the environment.
+        :param bucket_size: The width and height of each bucket, about the usual query radius works well.
+        """
+
+        assert bucket_size >= 1, "Bucket size must be a positive integer"
+
+        self.x_size: int = x_size
+        self.y_size: int = y_size
+        self.bucket_size: int = bucket_size
+
+        self._x_buckets: int = -(-x_size // bucket_size)
+        self._y_buckets: int = -(-y_size // bucket_size)
+        self._buckets: list[set[int]] = [set() for _ in range(self._x_buckets * self._y_buckets)]
+
+        # The ids in the hash, sorted, and the position and bucket of each, in the same order
+        # Only the ids in the hash are stored, so the size doesn't grow with the largest id ever seen
+        self._ids: np.ndarray = np.zeros(0, dtype=np.int64)
+        self._x_positions: np.ndarray = np.zeros(0, dtype=np.float64)
+        self._y_positions: np.ndarray = np.zeros(0, dtype=np.float64)
+        self._bucket_of: np.ndarray = np.zeros(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, entity_id: int) -> bool:
+        row = int(np.searchsorted(self._ids, entity_id))
+        return row < len(self._ids) and self._ids.item(row) == entity_id
+
+    # region - Changing entities
+
+    def insert(self, entity_id: int, x: float, y: float):
+        """
+Adds an entity, or moves it if it is already in the hash.
+        """
+
+        self.update(np.array([entity_id]), np.array([x]), np.array([y]))
+
+    def move(self, entity_id: int, x: float, y: float):
+        """
+Moves an entity that is already in the hash.
+        """
+
+        assert entity_id in self, f"Entity {entity_id} is not in the spatial hash"
+
+        self.update(np.array([entity_id]), np.array([x]), np.array([y]))
+
+    def remove(self, entity_id: int):
+        assert entity_id in self, f"Entity {entity_id} is not in the spatial hash"
+
+        keep = np.ones(len(self._ids), dtype=bool)
+        keep[self._rows_of(np.array([entity_id]))] = False
+
+        self._compact(keep)
+
+    def update(self, ids: np.ndarray, x_positions: np.ndarray, y_positions: np.ndarray):
+        """
+Adds or moves many entities at once, only the ones that changed bucket are moved between buckets.
+        """
+
+        ids = np.asarray(ids, dtype=np.int64)
+        x_positions = np.asarray(x_positions, dtype=np.float64)
+        y_positions = np.asarray(y_positions, dtype=np.float64)
+
+        if not len(ids):
+            return
+
+        # The last position wins if an id is given more than once
+        ids, last = np.unique(ids[::-1], return_index=True)
+        x_positions, y_positions = x_positions[::-1][last], y_positions[::-1][last]
+
+        buckets = self._buckets_at(x_positions, y_positions)
+
+        rows = np.searchsorted(self._ids, ids)
+        found = rows < len(self._ids)
+        found[found] = self._ids[rows[found]] == ids[found]
+
+        # Entities already in the hash, only the ones that changed bucket are moved
+        moved_rows, moved_ids, moved_buckets = rows[found], ids[found], buckets[found]
+        old_buckets = self._bucket_of[moved_rows]
+
+        self._x_positions[moved_rows] = x_positions[found]
+        self._y_positions[moved_rows] = y_positions[found]
+        self._bucket_of[moved_rows] = moved_buckets
+
+        changed = np.flatnonzero(moved_buckets != old_buckets)
+        for entity_id, old_bucket, bucket in zip(moved_ids[changed].tolist(), old_buckets[changed].tolist(),
+                                                 moved_buckets[changed].tolist()):
+            self._buckets[old_bucket].discard(entity_id)
+            self._buckets[bucket].add(entity_id)
+
+        if found.all():
+            return
+
+        # New entities
+        new = np.flatnonzero(~found)
+        new_ids = ids[new]
+
+        for entity_id, bucket in zip(new_ids.tolist(), buckets[new].tolist()):
+            self._buckets[bucket].add(entity_id)
+
+        insert_at = np.searchsorted(self._ids, new_ids)
+        self._ids = np.insert(self._ids, insert_at, new_ids)
+        self._x_positions = np.insert(self._x_positions, insert_at, x_positions[new])
+        self._y_positions = np.insert(self._y_positions, insert_at, y_positions[new])
+        self._bucket_of = np.insert(self._bucket_of, insert_at, buckets[new])
+
+    def retain(self, ids: np.ndarray):
+        """
+Removes every entity not in ids, e.g. the ids still alive in a Simulation.
+        """
+
+        keep = np.isin(self._ids, np.asarray(ids, dtype=np.int64))
+
+        if not keep.all():
+            self._compact(keep)
+
+    def clear(self):
+        self._compact(np.zeros(len(self._ids), dtype=bool))
+
+    # endregion - Changing entities
+
+    # region - Queries
+
+    def query_rect(self, x: float, y: float, width: float, height: float) -> np.ndarray:
+        """
+Returns the ids of the entities inside the rectangle, edges included.
+        """
+
+        candidates = self._candidates(x, y, x + width, y + height)
+        rows = self._rows_of(candidates)
+        x_positions, y_positions = self._x_positions[rows], self._y_positions[rows]
+
+        inside = (x_positions >= x) & (x_positions <= x + width) & (y_positions >= y) & (y_positions <= y + height)
+
+        return candidates[inside]
+
+    def query_radius(self, x: float, y: float, radius: float) -> np.ndarray:
+        """
+Returns the ids of the entities within the straight line distance of the point, edges included.
+        """
+
+        candidates = self._candidates(x - radius, y - radius, x + radius, y + radius)
+        rows = self._rows_of(candidates)
+        dx, dy = self._x_positions[rows] - x, self._y_positions[rows] - y
+
+        return candidates[dx * dx + dy * dy <= radius * radius]
+
+    def nearest(self, x: float, y: float, k: int = 1, max_radius: float = math.inf) -> np.ndarray:
+        """
+Returns the ids of the k entities closest to the point, closest first, ties broken by id.
+Searches outwards a ring of buckets at a time, stopping once nothing outside can be closer.
+        :param max_radius: Entities further away than this are never returned.
+        """
+
+        if k <= 0 or not len(self._ids):
+            return np.zeros(0, dtype=np.int64)
+
+        centre_x, centre_y = self._bucket_coords(x, y)
+        most_rings = max(centre_x, self._x_buckets - 1 - centre_x, centre_y, self._y_buckets - 1 - centre_y)
+
+        found: list[np.ndarray] = []
+        found_count = 0
+
+        for ring in range(most_rings + 1):
+            found.append(self._ring(centre_x, centre_y, ring))
+            found_count += len(found[-1])
+
+            # Everything outside the rings searched so far is at least this far away
+            searched_distance = ring * self.bucket_size
+            last_ring = ring == most_rings or searched_distance > max_radius
+
+            if found_count < k and not last_ring:
+                continue
+
+            ids = np.concatenate(found)
+            rows = self._rows_of(ids)
+            dx, dy = self._x_positions[rows] - x, self._y_positions[rows] - y
+            distances = np.sqrt(dx * dx + dy * dy)
+
+            if last_ring or np.partition(distances, k - 1)[k - 1] < searched_distance:
+                break
+
+        within = distances <= max_radius
+        ids, distances = ids[within], distances[within]
+        order = np.lexsort((ids, distances))[:k]
+
+        return ids[order]
+
+    # endregion - Queries
+
+    def position(self, entity_id: int) -> tuple[float, float]:
+        assert entity_id in self, f"Entity {entity_id} is not in the spatial hash"
+
+        row = int(np.searchsorted(self._ids, entity_id))
+        return self._x_positions.item(row), self._y_positions.item(row)
+
+    def _rows_of(self, ids: np.ndarray) -> np.ndarray:
+        """
+Returns the row of each id in the per entity arrays, the ids must be in the hash.
+        """
+
+        return np.searchsorted(self._ids, ids)
+
+    def _bucket_coords(self, x: float, y: float) -> tuple[int, int]:
+        """
+Returns the bucket the point is in, points outside the environment are put in the closest bucket.
+        """
+
+        bucket_x = min(max(int(x // self.bucket_size), 0), self._x_buckets - 1)
+        bucket_y = min(max(int(y // self.bucket_size), 0), self._y_buckets - 1)
+
+        return bucket_x, bucket_y
+
+    def _buckets_at(self, x_positions: np.ndarray, y_positions: np.ndarray) -> np.ndarray:
+        bucket_x = np.clip(np.floor_divide(x_positions, self.bucket_size), 0, self._x_buckets - 1).astype(np.int64)
+        bucket_y = np.clip(np.floor_divide(y_positions, self.bucket_size), 0, self._y_buckets - 1).astype(np.int64)
+
+        return bucket_y * self._x_buckets + bucket_x
+
+    def _candidates(self, x_min: float, y_min: float, x_max: float, y_max: float) -> np.ndarray:
+        """
+Returns the ids in every bucket overlapping the rectangle.
+        """
+
+        first_x, first_y = self._bucket_coords(x_min, y_min)
+        last_x, last_y = self._bucket_coords(x_max, y_max)
+
+        buckets = self._buckets
+        ids = [entity_id
+               for bucket_y in range(first_y, last_y + 1)
+               for bucket in buckets[bucket_y * self._x_buckets + first_x:bucket_y * self._x_buckets + last_x + 1]
+               for entity_id in bucket]
+
+        return np.array(ids, dtype=np.int64)
+
+    def _ring(self, centre_x: int, centre_y: int, ring: int) -> np.ndarray:
+        """
+Returns the ids in the buckets exactly ring buckets away from the centre bucket, by chebyshev distance.
+        """
+
+        if ring == 0:
+            return np.fromiter(self._buckets[centre_y * self._x_buckets + centre_x], dtype=np.int64)
+
+        ids = []
+        for bucket_y in range(max(centre_y - ring, 0), min(centre_y + ring, self._y_buckets - 1) + 1):
+            if abs(bucket_y - centre_y) == ring:
+                bucket_xs = range(max(centre_x - ring, 0), min(centre_x + ring, self._x_buckets - 1) + 1)
+            else:
+                bucket_xs = [bucket_x for bucket_x in (centre_x - ring, centre_x + ring)
+                             if 0 <= bucket_x < self._x_buckets]
+
+            for bucket_x in bucket_xs:
+                ids.extend(self._buckets[bucket_y * self._x_buckets + bucket_x])
+
+        return np.array(ids, dtype=np.int64)
+
+    def _compact(self, keep: np.ndarray):
+        """
+Removes the entities whose row in keep is false from their buckets and the per entity arrays.
+        """
+
+        removed = np.flatnonzero(~keep)
+        for entity_id, bucket in zip(self._ids[removed].tolist(), self._bucket_of[removed].tolist()):
+            self._buckets[bucket].discard(entity_id)
+
+        self._ids = self._ids[keep]
+        self._x_positions = self._x_positions[keep]
+        self._y_positions = self._y_positions[keep]
+        self._bucket_of = self._bucket_of[keep]
+
+
+class QuadTree:
+    """
+The same queries as SpatialHash, but the environment is split into quarters, and those into quarters, only where
+there are more than leaf_capacity entities.
+Better than a SpatialHash when entities bunch up in a few places, e.g. around the bases, as crowded areas get small
+leaves and empty areas cost nothing.
+    """
+
+    def __init__(self, x_size: int, y_size: int, leaf_capacity: int = 16, max_depth: int = 12):
+        """
+        :param x_size: The x size of the environment.
+        :param y_size: The y size of the environment.
+        :param leaf_capacity: The most entities a leaf holds before it is split, unless it is at max_depth.
+        :param max_depth: The most times the environment can be split.
+        """
+
+        assert leaf_capacity >= 1, "Leaf capacity must be a positive integer"
+
+        self.x_size: int = x_size
+        self.y_size: int = y_size
+        self.leaf_capacity: int = leaf_capacity
+        self.max_depth: int = max_depth
+
+        self._root: _QuadNode = _QuadNode(0., 0., float(x_size), float(y_size), 0)
+
+        # Id -> position and the leaf holding it
+        self._positions: dict[int, tuple[float, float]] = {}
+        self._leaves: dict[int, _QuadNode] = {}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, entity_id: int) -> bool:
+        return entity_id in self._positions
+
+    # region - Changing entities
+
+    def insert(self, entity_id: int, x: float, y: float):
+        """
+Adds an entity, or moves it if it is already in the tree.
+        """
+
+        if entity_id in self._positions:
+            self.move(entity_id, x, y)
+            return
+
+        self._positions[entity_id] = (x, y)
+        self._add(self._root, entity_id, x, y)
+
+    def move(self, entity_id: int, x: float, y: float):
+        """
+Moves an entity that is already in the tree, it only changes leaf if it left its old one.
+        """
+
+        assert entity_id in self._positions, f"Entity {entity_id} is not in the quadtree"
+
+        self._positions[entity_id] = (x, y)
+
+        leaf = self._leaves[entity_id]
+        if leaf.contains(x, y):
+            return
+
+        leaf.ids.remove(entity_id)
+        self._add(self._root, entity_id, x, y)
+
+    def remove(self, entity_id: int):
+        assert entity_id in self._positions, f"Entity {entity_id} is not in the quadtree"
+
+        del self._positions[entity_id]
+        self._leaves.pop(entity_id).ids.remove(entity_id)
+
+    def update(self, ids: np.ndarray, x_positions: np.ndarray, y_positions: np.ndarray):
+        """
+Adds or moves many entities at once.
+        """
+
+        for entity_id, x, y in zip(np.asarray(ids).tolist(), np.asarray(x_positions).tolist(),
+                                   np.asarray(y_positions).tolist()):
+            self.insert(entity_id, x, y)
+
+    def retain(self, ids: np.ndarray):
+        """
+Removes every entity not in ids.
+        """
+
+        keep = set(np.asarray(ids).tolist())
+        for entity_id in [entity_id for entity_id in self._positions if entity_id not in keep]:
+            self.remove(entity_id)
+
+    def clear(self):
+        self._root = _QuadNode(0., 0., float(self.x_size), float(self.y_size), 0)
+        self._positions.clear()
+        self._leaves.clear()
+
+    # endregion - Changing entities
+
+    # region - Queries
+
+    def query_rect(self, x: float, y: float, width: float, height: float) -> np.ndarray:
+        """
+Returns the ids of the entities inside the rectangle, edges included.
+        """
+
+        found = []
+        for node in self._overlapping(x, y, x + width, y + height):
+            for entity_id in node.ids:
+                entity_x, entity_y = self._positions[entity_id]
+                if x <= entity_x <= x + width and y <= entity_y <= y + height:
+                    found.append(entity_id)
+
+        return np.array(found, dtype=np.int64)
+
+    def query_radius(self, x: float, y: float, radius: float) -> np.ndarray:
+        """
+Returns the ids of the entities within the straight line distance of the point, edges included.
+        """
+
+        found = []
+        for node in self._overlapping(x - radius, y - radius, x + radius, y + radius):
+            for entity_id in node.ids:
+                entity_x, entity_y = self._positions[entity_id]
+                if (entity_x - x) ** 2 + (entity_y - y) ** 2 <= radius * radius:
+                    found.append(entity_id)
+
+        return np.array(found, dtype=np.int64)
+
+    def nearest(self, x: float, y: float, k: int = 1, max_radius: float = math.inf) -> np.ndarray:
+        """
+Returns the ids of the k entities closest to the point, closest first, ties broken by id.
+Visits the nodes closest first, stopping once k entities are closer than every node left.
+        :param max_radius: Entities further away than this are never returned.
+        """
+
+        found = []
+        # (distance, 0 for a node or 1 for an entity, tie breaker, node or id)
+        heap: list[tuple[float, int, int, object]] = [(0., 0, 0, self._root)]
+        counter = 1
+
+        while heap and len(found) < k:
+            distance, is_entity, _, item = heappop(heap)
+            if distance > max_radius:
+                break
+
+            if is_entity:
+                found.append(item)
+                continue
+
+            node: _QuadNode = item
+            for entity_id in node.ids:
+                entity_x, entity_y = self._positions[entity_id]
+                heappush(heap, (math.hypot(entity_x - x, entity_y - y), 1, entity_id, entity_id))
+
+            for child in node.children:
+                heappush(heap, (child.distance_to(x, y), 0, counter, child))
+                counter += 1
+
+        return np.array(found, dtype=np.int64)
+
+    # endregion - Queries
+
+    def position(self, entity_id: int) -> tuple[float, float]:
+        return self._positions[entity_id]
+
+    def _add(self, node: "_QuadNode", entity_id: int, x: float, y: float):
+        """
+Puts the entity in the leaf under the node holding the point, splitting the leaf if it gets too full.
+        """
+
+        while node.children:
+            node = node.child_at(x, y)
+
+        node.ids.append(entity_id)
+        self._leaves[entity_id] = node
+
+        if len(node.ids) > self.leaf_capacity and node.depth < self.max_depth:
+            node.split()
+
+            for other_id in node.ids:
+                other_x, other_y = self._positions[other_id]
+                self._add(node, other_id, other_x, other_y)
+
+            node.ids = []
+
+    def _overlapping(self, x_min: float, y_min: float, x_max: float, y_max: float) -> list["_QuadNode"]:
+        """
+Returns every leaf overlapping the rectangle.
+        """
+
+        leaves = []
+        stack = [self._root]
+
+        while stack:
+            node = stack.pop()
+            if node.reach[0] > x_max or node.reach[2] < x_min or node.reach[1] > y_max or node.reach[3] < y_min:
+                continue
+
+            if node.children:
+                stack.extend(node.children)
+            else:
+                leaves.append(node)
+
+        return leaves
+
+
+class _QuadNode:
+    """
+A square of a QuadTree, either a leaf holding ids or split into four children.
+Points outside the environment go in the nodes on its edges, so each node also has a reach, its square stretched out
+to infinity on every side on the environment's edge, which holds every point that can be put in it.
+    """
+
+    __slots__ = ("x_min", "y_min", "x_max", "y_max", "depth", "reach", "ids", "children")
+
+    def __init__(self, x_min: float, y_min: float, x_max: float, y_max: float, depth: int,
+                 reach: tuple[float, float, float, float] = (-math.inf, -math.inf, math.inf, math.inf)):
+        """
+        :param reach: The x min, y min, x max and y max of where the points put in this node can be, the default is
+        for the root.
+        """
+
+        self.x_min: float = x_min
+        self.y_min: float = y_min
+        self.x_max: float = x_max
+        self.y_max: float = y_max
+        self.depth: int = depth
+        self.reach: tuple[float, float, float, float] = reach
+
+        self.ids: list[int] = []
+        self.children: list[_QuadNode] = []
+
+    def split(self):
+        x_middle, y_middle = (self.x_min + self.x_max) / 2, (self.y_min + self.y_max) / 2
+
+        reach_x_min, reach_y_min, reach_x_max, reach_y_max = self.reach
+
+        self.children = [
+            _QuadNode(self.x_min, self.y_min, x_middle, y_middle, self.depth + 1,
+                      (reach_x_min, reach_y_min, x_middle, y_middle)),
+            _QuadNode(x_middle, self.y_min, self.x_max, y_middle, self.depth + 1,
+                      (x_middle, reach_y_min, reach_x_max, y_middle)),
+            _QuadNode(self.x_min, y_middle, x_middle, self.y_max, self.depth + 1,
+                      (reach_x_min, y_middle, x_middle, reach_y_max)),
+            _QuadNode(x_middle, y_middle, self.x_max, self.y_max, self.depth + 1,
+                      (x_middle, y_middle, reach_x_max, reach_y_max))
+        ]
+
+    def child_at(self, x: float, y: float) -> "_QuadNode":
+        x_middle, y_middle = (self.x_min + self.x_max) / 2, (self.y_min + self.y_max) / 2
+
+        return self.children[(x >= x_middle) + 2 * (y >= y_middle)]
+
+    def contains(self, x: float, y: float) -> bool:
+        """
+Whether the point would be put in this node.
+        """
+
+        reach_x_min, reach_y_min, reach_x_max, reach_y_max = self.reach
+
+        return reach_x_min <= x < reach_x_max and reach_y_min <= y < reach_y_max
+
+    def distance_to(self, x: float, y: float) -> float:
+        """
+The straight line distance from the point to the closest point the node's entities can be at, from its reach.
+        """
+
+        reach_x_min, reach_y_min, reach_x_max, reach_y_max = self.reach
+
+        dx = max(reach_x_min - x, 0., x - reach_x_max)
+        dy = max(reach_y_min - y, 0., y - reach_y_max)
+
+        return math.hypot(dx, dy)
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import math
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from . import ChangeTracker, SpatialHash, FlowField
+from .EnvironmentData import GridSquareStructures, STRUCTURE_BY_VALUE
+
+if TYPE_CHECKING:
+    from ._Environment import Environment
+
+
+class StructureIndex:
+    """
+Where every structure of each type is in an environment, e.g. every tree, so the closest ones to a grid square can be
+found without looking through every grid square.
+Each structure type has its own SpatialHash of the grid squares holding it, keyed by flat index (y * x_size + x).
+Listens for changes through a ChangeTracker and only re-indexes the grid squares that changed, just before the next
+query.
+For many path cost queries against the same structure type, e.g. every idle worker looking for a tree, a flow field
+towards every grid square holding it can be made once, after which each query only walks the path.
+    """
+
+    def __init__(self, environment: Environment, bucket_size: int = 16):
+        """
+        :param environment: The environment to index.
+        :param bucket_size: The bucket size of each structure type's SpatialHash.
+        """
+
+        self.environment: Environment = environment
+        self.bucket_size: int = bucket_size
+
+        self._hashes: dict[GridSquareStructures, SpatialHash] = {
+            structure: SpatialHash(environment.x_size, environment.y_size, bucket_size)
+            for structure in GridSquareStructures if structure != GridSquareStructures.NONE
+        }
+
+        # The structure values as of the last time the index was brought up to date, indexed by flat index
+        self._indexed: np.ndarray = np.zeros(environment.x_size * environment.y_size, dtype=np.uint8)
+
+        # Flow fields towards every grid square holding each structure type, made when first asked for
+        self._flow_fields: dict[GridSquareStructures, FlowField] = {}
+
+        self._changes: ChangeTracker = ChangeTracker(all_changed=True)
+        environment.add_change_tracker(self._changes)
+
+    # region - Queries
+
+    def count(self, structure: GridSquareStructures) -> int:
+        """
+Returns how many grid squares hold the structure.
+        """
+
+        self._update()
+        return len(self._hashes[structure])
+
+    def cells(self, structure: GridSquareStructures) -> list[tuple[int, int]]:
+        """
+Returns the coordinates of every grid square holding the structure, in row order.
+        """
+
+        self._update()
+
+        x_size = self.environment.x_size
+        indices = np.flatnonzero(self._indexed == structure.value)
+
+        return [(index % x_size, index // x_size) for index in indices.tolist()]
+
+    def nearest(self, x: int, y: int, structure: GridSquareStructures, k: int = 1,
+                max_distance: float = math.inf) -> list[tuple[int, int]]:
+        """
+Returns the k grid squares holding the structure closest in a straight line to the given one, closest first.
+        :param max_distance: Grid squares further away than this are never returned.
+        """
+
+        self._update()
+
+        x_size = self.environment.x_size
+        indices = self._hashes[structure].nearest(x, y, k, max_distance)
+
+        return [(index % x_size, index // x_size) for index in indices.tolist()]
+
+    def nearest_by_path(self, x: int, y: int, structure: GridSquareStructures, k: int = 1,
+                        max_cost: float = math.inf) -> list[tuple[tuple[int, int], float]]:
+        """
+Returns the k grid squares holding the structure that cost the least to path to from the given one, cheapest first.
+Only the grid squares cheaper than the kth one are expanded, see Pathfinder.find_nearest.
+        :param max_cost: Grid squares costing more than this to reach are never returned.
+        :return: The coordinates of each grid square and the cost to reach it.
+        """
+
+        self._update()
+
+        x_size = self.environment.x_size
+        found = self.environment.pathfinder.find_nearest((x, y), self._hashes[structure], k, max_cost)
+
+        return [((index % x_size, index // x_size), cost) for index, cost in found]
+
+    def get_flow_field(self, structure: GridSquareStructures) -> FlowField:
+        """
+Returns the flow field towards every grid square holding the structure, brought up to date with any changes.
+Making it the first time costs a Dijkstra over the whole environment, after that grid squares gaining or losing the
+structure only repair the field around them.
+        """
+
+        self._update()
+
+        flow_field = self._flow_fields.get(structure)
+
+        if flow_field is None:
+            flow_field = FlowField(self.environment, self.cells(structure))
+            self._flow_fields[structure] = flow_field
+        else:
+            flow_field.update()
+
+        return flow_field
+
+    def nearest_by_flow_field(self, x: int, y: int,
+                              structure: GridSquareStructures) -> tuple[tuple[int, int], float] | None:
+        """
+Returns the grid square holding the structure that costs the least to path to from the given one, using the
+structure's flow field, see get_flow_field.
+        :return: The coordinates of the grid square and the cost to reach it, or None if none can be reached.
+        """
+
+        flow_field = self.get_flow_field(structure)
+
+        cost = flow_field.cost(x, y)
+        if cost == math.inf:
+            return None
+
+        cell = (x, y)
+        next_step = flow_field.next_step(x, y)
+        while next_step is not None:
+            cell = next_step
+            next_step = flow_field.next_step(*cell)
+
+        return cell, cost
+
+    # endregion - Queries
+
+    def detach(self):
+        """
+Stops listening to changes in the environment, call before throwing the index away.
+        """
+
+        self.environment.remove_change_tracker(self._changes)
+
+        for flow_field in self._flow_fields.values():
+            flow_field.detach()
+
+        self._flow_fields.clear()
+
+    def _update(self):
+        """
+Brings the index up to date with the environment, rebuilding it if every grid square changed.
+        """
+
+        if not self._changes.has_changes:
+            return
+
+        values = self.environment.structure_values.reshape(-1)
+        x_size = self.environment.x_size
+
+        if self._changes.all_changed:
+            for structure, spatial_hash in self._hashes.items():
+                indices = np.flatnonzero(values == structure.value)
+
+                spatial_hash.clear()
+                spatial_hash.update(indices, indices % x_size, indices // x_size)
+
+            self._indexed[:] = values
+
+            # Cheaper to make them again when next asked for than to work out every target that changed
+            for flow_field in self._flow_fields.values():
+                flow_field.detach()
+
+            self._flow_fields.clear()
+        else:
+            indices = np.array([y * x_size + x for x, y in self._changes.cells], dtype=np.int64)
+            old_values, new_values = self._indexed[indices], values[indices]
+
+            changed = old_values != new_values
+            indices, old_values, new_values = indices[changed], old_values[changed], new_values[changed]
+
+            # Structure -> the grid squares gaining it and the grid squares losing it, for the flow fields
+            target_changes = {structure: ([], []) for structure in self._flow_fields}
+
+            for index, old_value, new_value in zip(indices.tolist(), old_values.tolist(), new_values.tolist()):
+                cell = (index % x_size, index // x_size)
+
+                if old_value != GridSquareStructures.NONE.value:
+                    old_structure = STRUCTURE_BY_VALUE[old_value]
+                    self._hashes[old_structure].remove(index)
+
+                    if old_structure in target_changes:
+                        target_changes[old_structure][1].append(cell)
+
+                if new_value != GridSquareStructures.NONE.value:
+                    new_structure = STRUCTURE_BY_VALUE[new_value]
+                    self._hashes[new_structure].insert(index, *cell)
+
+                    if new_structure in target_changes:
+                        target_changes[new_structure][0].append(cell)
+
+            for structure, (added, removed) in target_changes.items():
+                if removed:
+                    self._flow_fields[structure].remove_targets(removed)
+                if added:
+                    self._flow_fields[structure].add_targets(added)
+
+            self._indexed[indices] = new_values
+
+        self._changes.clear()
@@ -0,0 +1,173 @@
+from heapq import heappush, heappop
+from typing import Any
+
+
+class TimingWheel:
+    """
+Fires events after a number of ticks, e.g. a spawner producing an entity or a worker finishing a build, without looking
+at every timer each tick.
+Timers sit in a slot of one of several wheels, each wheel's slots covering slots_per_level times more ticks than the
+one below. As time reaches a slot of an upper wheel its timers drop down to the wheel below, so each timer is moved at
+most once per wheel, and each tick only looks at one slot of the bottom wheel.
+Timers due further away than the top wheel covers wait in a heap until they are close enough.
+Events due on the same tick fire in the order they were scheduled, so the same calls always give the same events in
+the same order, for keeping lockstep simulations in sync.
+    """
+
+    def __init__(self, slots_per_level: int = 64, levels: int = 4, start_tick: int = 0):
+        """
+        :param slots_per_level: How many slots each wheel has, must be a power of two.
+        :param levels: How many wheels there are, the wheels cover slots_per_level ** levels ticks.
+        :param start_tick: The tick to start at.
+        """
+
+        assert slots_per_level >= 2 and slots_per_level & (slots_per_level - 1) == 0, \
+            "Slots per level must be a power of two"
+        assert levels >= 1, "Levels must be a positive integer"
+
+        self.slots_per_level: int = slots_per_level
+        self.levels: int = levels
+
+        self._bits: int = slots_per_level.bit_length() - 1
+        self._mask: int = slots_per_level - 1
+        self._span: int = slots_per_level ** levels
+
+        self._now: int = start_tick
+
+        # wheels[level][slot] holds the timers, each [due tick, order scheduled, timer id, interval, event]
+        self._wheels: list[list[list[list]]] = [[[] for _ in range(slots_per_level)] for _ in range(levels)]
+        # Timers due too far away for the wheels, by due tick then order scheduled
+        self._overflow: list[tuple[int, int, list]] = []
+
+        # Timer id -> timer, for cancelling
+        self._timers: dict[int, list] = {}
+        self._next_id: int = 0
+        self._order: int = 0
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def __contains__(self, timer_id: int) -> bool:
+        return timer_id in self._timers
+
+    # region - Getters
+    @property
+    def now(self) -> int:
+        """
+The tick the wheel is at, events due on it have already fired.
+        """
+
+        return self._now
+
+    # endregion - Getters
+
+    def schedule(self, delay: int, event: Any, interval: int = 0) -> int:
+        """
+Fires the event after the given number of ticks.
+        :param delay: How many ticks from now to fire it, at least 1.
+        :param event: Anything, given back when it fires.
+        :param interval: If more than 0 then the event fires again every this many ticks until cancelled.
+        :return: The id of the timer, for cancelling.
+        """
+
+        assert delay >= 1, "Delay must be at least 1 tick"
+        assert interval >= 0, "Interval can't be negative"
+
+        timer_id = self._next_id
+        self._next_id += 1
+
+        timer = [self._now + delay, self._order, timer_id, interval, event]
+        self._order += 1
+
+        self._timers[timer_id] = timer
+        self._insert(timer)
+
+        return timer_id
+
+    def cancel(self, timer_id: int):
+        """
+Stops a timer, does nothing if it has already fired or been cancelled.
+        """
+
+        timer = self._timers.pop(timer_id, None)
+
+        # Left where it is and skipped when reached
+        if timer is not None:
+            timer[2] = -1
+
+    def due_tick(self, timer_id: int) -> int:
+        """
+Returns the tick the timer will next fire on.
+        """
+
+        return self._timers[timer_id][0]
+
+    def advance(self, ticks: int = 1) -> list[tuple[int, Any]]:
+        """
+Moves forward the given number of ticks, firing every event due on the way.
+        :return: The tick each event fired on and the event, in order.
+        """
+
+        assert ticks >= 0, "Can't go backwards"
+
+        fired = []
+
+        for _ in range(ticks):
+            self._now += 1
+            now = self._now
+
+            while self._overflow and self._overflow[0][0] - now < self._span:
+                self._insert(heappop(self._overflow)[2])
+
+            # Upper wheels drop their timers down when the ticks below them roll over, highest first
+            for level in range(self.levels - 1, 0, -1):
+                if now & ((1 << (self._bits * level)) - 1) == 0:
+                    slot = self._wheels[level][(now >> (self._bits * level)) & self._mask]
+                    timers = slot.copy()
+                    slot.clear()
+
+                    for timer in timers:
+                        if timer[2] >= 0:
+                            self._insert(timer)
+
+            slot = self._wheels[0][now & self._mask]
+            if not slot:
+                continue
+
+            timers = sorted(slot, key=lambda timer: timer[1])
+            slot.clear()
+
+            for timer in timers:
+                # Cancelled
+                if timer[2] < 0:
+                    continue
+
+                fired.append((now, timer[4]))
+
+                if timer[3] > 0:
+                    timer[0] = now + timer[3]
+                    timer[1] = self._order
+                    self._order += 1
+                    self._insert(timer)
+                else:
+                    del self._timers[timer[2]]
+
+        return fired
+
+    def _insert(self, timer: list):
+        """
+Puts the timer in the slot of the lowest wheel that covers how far away it is.
+        """
+
+        due = timer[0]
+        delay = due - self._now
+
+        if delay >= self._span:
+            heappush(self._overflow, (due, timer[1], timer))
+            return
+
+        level = 0
+        while delay >= 1 << (self._bits * (level + 1)):
+            level += 1
+
+        self._wheels[level][(due >> (self._bits * level)) & self._mask].append(timer)
@@ -0,0 +1,396 @@
+from __future__ import annotations
+
+from heapq import heappush, heappop
+from time import perf_counter as pc
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+
+from . import Profiler, TimingWheel
+from .EnvironmentData import GridSquareStructures, TimerEvents
+
+if TYPE_CHECKING:
+    from ._Environment import Environment
+
+
+class Blueprint:
+    """
+Something the player wants built, or cut down, at a grid square, waiting for enough free workers.
+    """
+
+    def __init__(self, x: int, y: int, structure: GridSquareStructures | None = None, workers_needed: int = 1,
+                 priority: int = 0, work_ticks: int = 1):
+        """
+        :param x: The x coordinate of the grid square to work on.
+        :param y: The y coordinate of the grid square to work on.
+        :param structure: What to build, None for removing what is there, e.g. a tree.
+        :param workers_needed: The blueprint isn't started until this many workers are free.
+        :param priority: Higher priorities are started first, blueprints with the same priority are started in the
+        order they were added.
+        :param work_ticks: How many ticks after starting the blueprint is finished, walking there included. Only used
+        if the scheduler has timers.
+        """
+
+        assert workers_needed >= 1, "Workers needed must be a positive integer"
+        assert work_ticks >= 1, "Work ticks must be a positive integer"
+
+        self.x: int = x
+        self.y: int = y
+        self.structure: GridSquareStructures | None = structure
+        self.workers_needed: int = workers_needed
+        self.priority: int = priority
+        self.work_ticks: int = work_ticks
+
+        # Set by the scheduler
+        self.id: int = -1
+        self.started: bool = False
+        self.workers: list[int] = []
+        # The timer finishing it, -1 if there isn't one
+        self.timer_id: int = -1
+
+    def __repr__(self) -> str:
+        return f"Blueprint(id={self.id}, location={(self.x, self.y)}, structure={self.structure}, " \
+               f"workers_needed={self.workers_needed}, priority={self.priority})"
+
+
+class WorkerScheduler:
+    """
+Hands out free workers to blueprints, highest priority first.
+A blueprint only starts once enough workers are free, and takes the ones that cost the least to path to it, found with
+one Dijkstra outwards from the blueprint that stops at the last worker it needs.
+Workers can't change task once a blueprint has started, so they only come back once the blueprint is finished, or
+once one of them is removed, which puts the blueprint back to wait for a full set of workers again.
+Nothing is worked out again until the free workers or the blueprints waiting change, so calling update every tick
+costs nothing while there is nothing new.
+Given timers, e.g. a Simulation's, each blueprint started fires a BUILD_FINISHED event work_ticks later, which
+handle_events acts on:
+    simulation.tick()
+    scheduler.handle_events(simulation.events)
+    scheduler.update()
+    """
+
+    def __init__(self, environment: Environment, profiler: Profiler | None = None, timers: TimingWheel | None = None):
+        """
+        :param environment: The environment the workers path across.
+        :param profiler: If given then every update that assigns workers is recorded in it.
+        :param timers: If given then blueprints are finished by a timer on it, otherwise only by finish_blueprint.
+        """
+
+        self.environment: Environment = environment
+        self.profiler: Profiler | None = profiler
+        self.timers: TimingWheel | None = timers
+
+        # Worker id -> grid square
+        self._locations: dict[int, tuple[int, int]] = {}
+        self._free: set[int] = set()
+        # Worker id -> the id of the blueprint it is working on
+        self._assigned: dict[int, int] = {}
+
+        self._blueprints: dict[int, Blueprint] = {}
+        # (-priority, id) of every blueprint waiting for workers, cancelled ones are skipped when they reach the top
+        self._waiting: list[tuple[int, int]] = []
+        self._waiting_count: int = 0
+        self._next_id: int = 0
+
+        # True when the free workers or the waiting blueprints changed since the last plan
+        self._changed: bool = False
+
+        # Metrics
+        self.updates: int = 0
+        self.plans: int = 0
+        self.assignments: int = 0
+        self.last_update_time: float = 0.
+        self.total_update_time: float = 0.
+
+    # region - Getters
+    @property
+    def free_workers(self) -> set[int]:
+        return self._free
+
+    @property
+    def waiting_count(self) -> int:
+        """
+How many blueprints are waiting for workers.
+        """
+
+        return self._waiting_count
+
+    @property
+    def blueprints(self) -> dict[int, Blueprint]:
+        """
+Every blueprint that is waiting or being worked on, by id.
+        """
+
+        return self._blueprints
+
+    # endregion - Getters
+
+    # region - Workers
+
+    def add_worker(self, worker_id: int, x: int, y: int):
+        """
+Adds a free worker.
+        """
+
+        assert worker_id not in self._locations, f"Worker {worker_id} has already been added"
+
+        self._locations[worker_id] = (x, y)
+        self._free.add(worker_id)
+        self._changed = True
+
+    def remove_worker(self, worker_id: int) -> tuple[Blueprint, list[int]] | None:
+        """
+Removes a worker, e.g. when it dies.
+If it was working on a blueprint then the blueprint no longer has the workers it needs, so it is stopped, its other
+workers are freed and it goes back to waiting, keeping its place, to be started again by a later update.
+        :return: The blueprint stopped and its other workers, now free, so they can be told to stop, None if the worker
+        was free.
+        """
+
+        del self._locations[worker_id]
+        self._free.discard(worker_id)
+        self._changed = True
+
+        blueprint_id = self._assigned.pop(worker_id, None)
+        if blueprint_id is None:
+            return None
+
+        blueprint = self._blueprints[blueprint_id]
+        freed = [other_id for other_id in blueprint.workers if other_id != worker_id]
+
+        for other_id in freed:
+            del self._assigned[other_id]
+            self._free.add(other_id)
+
+        blueprint.started = False
+        blueprint.workers = []
+        self._cancel_timer(blueprint)
+
+        heappush(self._waiting, (-blueprint.priority, blueprint.id))
+        self._waiting_count += 1
+
+        return blueprint, freed
+
+    def move_worker(self, worker_id: int, x: int, y: int):
+        """
+Records where a worker is, it doesn't count as a change so nothing is planned again.
+        """
+
+        self._locations[worker_id] = (x, y)
+
+    def move_workers(self, worker_ids: np.ndarray, x_positions: np.ndarray, y_positions: np.ndarray):
+        """
+Records where many workers are, e.g. from a Simulation after each tick. Ids that aren't workers are ignored.
+        """
+
+        locations = self._locations
+        for worker_id, x, y in zip(np.asarray(worker_ids).tolist(), np.asarray(x_positions).tolist(),
+                                   np.asarray(y_positions).tolist()):
+            if worker_id in locations:
+                locations[worker_id] = (x, y)
+
+    def location_of(self, worker_id: int) -> tuple[int, int]:
+        return self._locations[worker_id]
+
+    def blueprint_of(self, worker_id: int) -> Blueprint | None:
+        """
+Returns the blueprint the worker is working on, None if it is free.
+        """
+
+        blueprint_id = self._assigned.get(worker_id)
+        return None if blueprint_id is None else self._blueprints[blueprint_id]
+
+    # endregion - Workers
+
+    # region - Blueprints
+
+    def add_blueprint(self, blueprint: Blueprint) -> int:
+        """
+Queues a blueprint to be started once enough workers are free.
+        :return: The id given to the blueprint.
+        """
+
+        blueprint.id = self._next_id
+        self._next_id += 1
+
+        self._blueprints[blueprint.id] = blueprint
+        heappush(self._waiting, (-blueprint.priority, blueprint.id))
+        self._waiting_count += 1
+        self._changed = True
+
+        return blueprint.id
+
+    def cancel_blueprint(self, blueprint_id: int):
+        """
+Removes a blueprint that hasn't started yet, started blueprints can't be cancelled.
+        """
+
+        blueprint = self._blueprints[blueprint_id]
+        assert not blueprint.started, f"Blueprint {blueprint_id} has started so can't be cancelled"
+
+        # Left in the heap and skipped when it reaches the top
+        del self._blueprints[blueprint_id]
+        self._waiting_count -= 1
+        self._changed = True
+
+    def finish_blueprint(self, blueprint_id: int) -> list[int]:
+        """
+Removes a finished blueprint, freeing its workers.
+        :return: The workers freed.
+        """
+
+        blueprint = self._blueprints.pop(blueprint_id)
+        assert blueprint.started, f"Blueprint {blueprint_id} hasn't started so can't be finished"
+
+        self._cancel_timer(blueprint)
+
+        for worker_id in blueprint.workers:
+            del self._assigned[worker_id]
+            self._free.add(worker_id)
+
+        self._changed = True
+
+        return blueprint.workers
+
+    def handle_events(self, events: list[Any]) -> list[Blueprint]:
+        """
+Finishes every blueprint with a BUILD_FINISHED event, building its structure, or removing what is there, and freeing
+its workers. Other events are ignored.
+        :param events: The events fired by the timers, e.g. a Simulation's events after a tick.
+        :return: The blueprints finished.
+        """
+
+        finished = []
+
+        for event in events:
+            if not (isinstance(event, tuple) and event and event[0] == TimerEvents.BUILD_FINISHED):
+                continue
+
+            # Finished or stopped since the timer was set
+            blueprint = self._blueprints.get(event[1])
+            if blueprint is None or not blueprint.started:
+                continue
+
+            blueprint.timer_id = -1
+            self.finish_blueprint(blueprint.id)
+
+            structure = GridSquareStructures.NONE if blueprint.structure is None else blueprint.structure
+            self.environment.set_structure(blueprint.x, blueprint.y, structure)
+
+            finished.append(blueprint)
+
+        return finished
+
+    def _cancel_timer(self, blueprint: Blueprint):
+        if self.timers is not None and blueprint.timer_id >= 0:
+            self.timers.cancel(blueprint.timer_id)
+
+        blueprint.timer_id = -1
+
+    # endregion - Blueprints
+
+    def update(self) -> list[Blueprint]:
+        """
+Starts every waiting blueprint it can, in priority order, giving each the free workers closest to it by path cost.
+Stops at the first blueprint that can't get enough workers, so large blueprints aren't held up forever by smaller
+ones behind them.
+        :return: The blueprints started.
+        """
+
+        start_time = pc()
+        self.updates += 1
+
+        started = []
+
+        if self._changed:
+            self._changed = False
+            self.plans += 1
+
+            with Profiler.stage_of(self.profiler, Profiler.SIMULATION, label=type(self).__name__):
+                started = self._plan()
+
+        self.last_update_time = pc() - start_time
+        self.total_update_time += self.last_update_time
+
+        return started
+
+    def metrics(self) -> dict[str, int | float | dict[int, int]]:
+        """
+Returns how busy the scheduler is and what its updates cost.
+        """
+
+        waiting_by_priority: dict[int, int] = {}
+        for blueprint in self._blueprints.values():
+            if not blueprint.started:
+                waiting_by_priority[blueprint.priority] = waiting_by_priority.get(blueprint.priority, 0) + 1
+
+        return {
+            "workers": len(self._locations),
+            "free_workers": len(self._free),
+            "waiting_blueprints": self._waiting_count,
+            "started_blueprints": len(self._blueprints) - self._waiting_count,
+            "waiting_by_priority": waiting_by_priority,
+            "updates": self.updates,
+            "plans": self.plans,
+            "assignments": self.assignments,
+            "last_update_time": self.last_update_time,
+            "total_update_time": self.total_update_time,
+            "mean_update_time": self.total_update_time / self.updates if self.updates else 0.
+        }
+
+    def _plan(self) -> list[Blueprint]:
+        """
+Starts waiting blueprints until one can't get enough workers.
+        """
+
+        started = []
+        x_size = self.environment.x_size
+
+        # Flat index -> the free workers standing there
+        free_cells: dict[int, list[int]] = {}
+        for worker_id in sorted(self._free):
+            x, y = self._locations[worker_id]
+            free_cells.setdefault(y * x_size + x, []).append(worker_id)
+
+        while self._waiting:
+            _, blueprint_id = self._waiting[0]
+
+            blueprint = self._blueprints.get(blueprint_id)
+            if blueprint is None:
+                heappop(self._waiting)
+                continue
+
+            if len(self._free) < blueprint.workers_needed:
+                break
+
+            workers = []
+            for index, _ in self.environment.pathfinder.find_nearest((blueprint.x, blueprint.y), free_cells,
+                                                                     blueprint.workers_needed):
+                workers.extend(free_cells[index])
+
+            # Some free workers can't reach it
+            if len(workers) < blueprint.workers_needed:
+                break
+
+            heappop(self._waiting)
+            self._waiting_count -= 1
+
+            blueprint.started = True
+            blueprint.workers = workers[:blueprint.workers_needed]
+            for worker_id in blueprint.workers:
+                self._free.remove(worker_id)
+                self._assigned[worker_id] = blueprint.id
+
+                x, y = self._locations[worker_id]
+                free_cells[y * x_size + x].remove(worker_id)
+                if not free_cells[y * x_size + x]:
+                    del free_cells[y * x_size + x]
+
+            if self.timers is not None:
+                blueprint.timer_id = self.timers.schedule(blueprint.work_ticks,
+                                                          (TimerEvents.BUILD_FINISHED, blueprint.id))
+
+            self.assignments += len(blueprint.workers)
+            started.append(blueprint)
+
+        return started
@@ -5,10 +5,27 @@ import environment.EnvironmentData
 from ._GridSquare import GridSquare
 
 # Must be before the environment
+from ._ChangeTracker import ChangeTracker
+from ._Profiler import Profiler
+from ._EdgeIndex import EdgeIndex
 from ._NoiseMap import NoiseMap
+from ._NoiseEngine import NoiseEngine
+from ._NoiseMapCache import NoiseMapCache
+from ._MapFile import MapFile
+from ._ChunkManager import Chunk, ChunkManager
+from ._Pathfinder import Pathfinder
+from ._HierarchicalPathfinder import HierarchicalPathfinder
+from ._PathCache import PathCache
+from ._FlowField import FlowField
+from ._TimingWheel import TimingWheel
+from ._SpatialHash import SpatialHash, QuadTree
+from ._StructureIndex import StructureIndex
 
 # Must be before the generators
 from ._Environment import Environment
+from ._Renderer import Renderer, IncrementalRenderer
+from ._Simulation import Simulation
+from ._WorkerScheduler import Blueprint, WorkerScheduler
 
 # Generators
 import environment.Generators
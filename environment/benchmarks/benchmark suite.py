@@ -0,0 +1,196 @@
+"""
+Times making maps, updating connections, finding paths and rendering across map sizes and seeds.
+Run from the root of the repository, e.g.
+    python "environment/benchmarks/benchmark suite.py" --output baseline.json
+    python "environment/benchmarks/benchmark suite.py" --compare baseline.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+from datetime import datetime
+from time import perf_counter as pc
+from typing import Callable
+
+import numpy as np
+
+from environment import Environment, HierarchicalPathfinder, Renderer
+from environment.EnvironmentData import GridSquareStructures
+from environment.Generators import TerrainGenerator, TreeGenerator, StoneGenerator
+
+# The AStar grid gets very big, so only time making it on the smaller maps
+MAX_GRID_SIZE: int = 250
+
+
+def timed(function: Callable[[], object]) -> float:
+    start = pc()
+    function()
+    return pc() - start
+
+
+def run_size(size: int, seed: int, path_queries: int) -> list[dict[str, object]]:
+    """
+Runs every benchmark on one map size and seed.
+    :return: A result for each benchmark, holding its time and throughput.
+    """
+
+    cells = size * size
+    results = []
+
+    def record(benchmark: str, time: float, work: int = cells, unit: str = "cells/s"):
+        results.append({
+            "benchmark": benchmark,
+            "size": size,
+            "seed": seed,
+            "time": time,
+            "throughput": work / time if time > 0 else 0.,
+            "unit": unit
+        })
+
+    if size <= MAX_GRID_SIZE:
+        record("environment with grid", timed(lambda: Environment(size, size)))
+
+    env = None
+
+    def create():
+        nonlocal env
+        env = Environment(size, size, compact=True)
+        env.set_player_base(1, 1)
+        env.set_player_base(size - 3, size - 3)
+
+    record("environment", timed(create))
+
+    # Each generator in turn, as they read what the ones before them wrote
+    for generator in (TerrainGenerator(env, seed=seed), TreeGenerator(env, seed=seed), StoneGenerator(env, seed=seed)):
+        name = type(generator).__name__
+
+        record(f"{name} noise map", timed(generator.generate_noise_map))
+        record(f"{name} generate", timed(generator.generate))
+
+    record("connections full", timed(lambda: env.update_node_connections(full_rebuild=True)))
+
+    # A handful of walls being built
+    rng = random.Random(seed)
+    changed = [(rng.randrange(size), rng.randrange(size)) for _ in range(100)]
+    for x, y in changed:
+        env.set_structure(x, y, GridSquareStructures.STONE_WALL)
+
+    record("connections 100 changed", timed(env.update_node_connections), len(changed), "changes/s")
+
+    queries = [((rng.randrange(size), rng.randrange(size)), (rng.randrange(size), rng.randrange(size)))
+               for _ in range(path_queries)]
+
+    # Path times are per path
+    record("A* paths", timed(lambda: [env.pathfinder.find_path(start, goal) for start, goal in queries]) / len(queries),
+           1, "paths/s")
+
+    hierarchical_pathfinder = HierarchicalPathfinder(env)
+    record("HPA* clusters", timed(hierarchical_pathfinder.build_all_clusters))
+    record("HPA* paths", timed(lambda: [hierarchical_pathfinder.find_path(start, goal) for start, goal in queries])
+           / len(queries), 1, "paths/s")
+
+    for start, goal in queries:
+        env.find_path(start, goal)
+    record("cached paths", timed(lambda: [env.find_path(start, goal) for start, goal in queries]) / len(queries),
+           1, "paths/s")
+
+    renderer = Renderer()
+    record("render", timed(lambda: renderer.render(env)))
+    record("render minimap", timed(lambda: renderer.render(env, downsample=4, average=True)))
+
+    return results
+
+
+def summarise(results: list[dict[str, object]]) -> dict[tuple[str, int], float]:
+    """
+Returns the median time of each benchmark and size across the seeds.
+    """
+
+    times: dict[tuple[str, int], list[float]] = {}
+
+    for result in results:
+        times.setdefault((result["benchmark"], result["size"]), []).append(result["time"])
+
+    return {key: statistics.median(values) for key, values in times.items()}
+
+
+def compare(results: list[dict[str, object]], baseline: list[dict[str, object]], threshold: float,
+            min_difference: float) -> bool:
+    """
+Prints how each benchmark changed against the baseline, flagging any that got slower by more than the threshold.
+    :param threshold: How much slower counts as a regression, 0.2 is 20%.
+    :param min_difference: How many seconds slower it also has to be, so tiny timings jumping around aren't flagged.
+    :return: True if anything regressed.
+    """
+
+    current, previous = summarise(results), summarise(baseline)
+    regressed = False
+
+    for key, time in current.items():
+        name = f"{key[0]} {key[1]}x{key[1]}"
+
+        if key not in previous:
+            print(name.ljust(40), f"{time:.6f}", "new")
+            continue
+
+        change = time / previous[key] - 1 if previous[key] > 0 else 0.
+        flag = ""
+        if change > threshold and time - previous[key] > min_difference:
+            flag = "REGRESSION"
+            regressed = True
+
+        print(name.ljust(40), f"{previous[key]:.6f} -> {time:.6f}", f"{change:+.1%}".rjust(8), flag)
+
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmarks map generation, connection updates, pathfinding and rendering.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 250, 500, 1000])
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--path-queries", type=int, default=5)
+    parser.add_argument("--output", help="Where to save the results as JSON.")
+    parser.add_argument("--compare", help="A saved results file to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="How much slower than the baseline counts as a regression, 0.2 is 20%%.")
+    parser.add_argument("--min-difference", type=float, default=0.001,
+                        help="How many seconds slower a regression also has to be.")
+    arguments = parser.parse_args()
+
+    results = []
+    for size in arguments.sizes:
+        for seed in arguments.seeds:
+            size_results = run_size(size, seed, arguments.path_queries)
+            results.extend(size_results)
+
+            for result in size_results:
+                print(f"{result['benchmark']} {size}x{size} seed {seed}".ljust(50), f"{result['time']:.6f}",
+                      f"{result['throughput']:,.0f} {result['unit']}")
+
+    if arguments.output is not None:
+        with open(arguments.output, "w") as file:
+            json.dump({
+                "meta": {
+                    "date": datetime.now().isoformat(timespec="seconds"),
+                    "python": platform.python_version(),
+                    "numpy": np.__version__,
+                    "platform": platform.platform()
+                },
+                "results": results
+            }, file, indent=2)
+
+    if arguments.compare is not None:
+        with open(arguments.compare) as file:
+            baseline = json.load(file)["results"]
+
+        print()
+        if compare(results, baseline, arguments.threshold, arguments.min_difference):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
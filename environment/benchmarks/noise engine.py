@@ -0,0 +1,62 @@
+import os
+from time import perf_counter as pc
+
+import numpy as np
+from perlin_noise import PerlinNoise
+
+from environment import NoiseEngine
+
+
+def per_cell_noise(seed: int, octaves: list[int], x_size: int, y_size: int) -> np.ndarray:
+    """
+The way the generators used to create their noise, one PerlinNoise call per cell per octave.
+    """
+
+    all_noise = [PerlinNoise(octaves=octave, seed=seed) for octave in octaves]
+
+    values = np.zeros((y_size, x_size), dtype=np.float64)
+    for y in range(y_size):
+        for x in range(x_size):
+            value = 0
+            for i, noise in enumerate(all_noise, start=2):
+                value += noise([x / x_size, y / y_size]) / i
+
+            values[y, x] = value
+
+    return values
+
+
+def main():
+    seed = 1
+    octaves = [3, 6, 12, 24]
+
+    workers = os.cpu_count() or 1
+
+    for size in (50, 100, 250, 500, 2000):
+        print(f"{size}x{size}")
+
+        start = pc()
+        engine_values = NoiseEngine(seed, octaves).generate(size, size)
+        engine_time = pc() - start
+        print("    Noise Engine".ljust(30), engine_time)
+
+        start = pc()
+        parallel_values = NoiseEngine(seed, octaves, workers=workers).generate(size, size)
+        print(f"    Noise Engine, {workers} workers".ljust(30), pc() - start)
+        print("    Identical".ljust(30), np.array_equal(engine_values, parallel_values))
+
+        # The per cell path gets very slow, so skip it on the big maps
+        if size > 250:
+            continue
+
+        start = pc()
+        per_cell_values = per_cell_noise(seed, octaves, size, size)
+        per_cell_time = pc() - start
+        print("    Per Cell PerlinNoise".ljust(30), per_cell_time)
+
+        print("    Speedup".ljust(30), per_cell_time / engine_time)
+        print("    Identical".ljust(30), np.array_equal(engine_values, per_cell_values))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import math
+import random
+from heapq import heappush, heappop
+from time import perf_counter as pc
+
+from environment import Environment, GridSquare, Pathfinder, HierarchicalPathfinder
+from environment.EnvironmentData import GridSquareStructures
+from environment.Generators import TerrainGenerator, TreeGenerator, StoneGenerator, GeneratorHandler
+
+
+def grid_square_a_star(env: Environment, start: tuple[int, int], goal: tuple[int, int]) -> float:
+    """
+A* over the AStar grid, one GridSquare at a time through its connections, like pathfinding used to work.
+    :return: The cost of the path found.
+    """
+
+    start_node: GridSquare = env[start]
+    goal_node: GridSquare = env[goal]
+
+    def heuristic(node: GridSquare) -> float:
+        dx = abs(node.grid_position[0] - goal[0])
+        dy = abs(node.grid_position[1] - goal[1])
+        return max(dx, dy) - min(dx, dy) + min(dx, dy) * math.sqrt(2)
+
+    costs = {start_node: 0.}
+    closed = set()
+    heap = [(heuristic(start_node), 0, start_node)]
+    counter = 0
+
+    while heap:
+        _, _, node = heappop(heap)
+        if node in closed:
+            continue
+        closed.add(node)
+
+        if node is goal_node:
+            return costs[node]
+
+        other_node: GridSquare
+        for other_node in node.get_connected_nodes():
+            if other_node in closed:
+                continue
+
+            other_cost = costs[node] + node.find_connection_with(other_node).weight
+            if other_cost < costs.get(other_node, math.inf):
+                costs[other_node] = other_cost
+                counter += 1
+                heappush(heap, (other_cost + heuristic(other_node), counter, other_node))
+
+    return math.inf
+
+
+def generated_environment(size: int, compact: bool) -> Environment:
+    env = Environment(size, size, compact=compact)
+    env.set_player_base(1, 1)
+    env.set_player_base(env.x_size - 3, env.y_size - 3)
+    GeneratorHandler(TerrainGenerator(env), TreeGenerator(env), StoneGenerator(env)).generate()
+
+    return env
+
+
+def walled_environment(size: int, compact: bool) -> Environment:
+    """
+Open ground with some stone walls, the large uniform regions are where jump point search does well.
+    """
+
+    env = Environment(size, size, compact=compact)
+    env.set_player_base(1, 1)
+    env.set_player_base(env.x_size - 3, env.y_size - 3)
+
+    random.seed(1)
+    for _ in range(size // 3):
+        x, y = random.randrange(size), random.randrange(size)
+        for wall_x in range(x, min(size, x + random.randint(5, size // 15 + 5))):
+            env.set_structure(wall_x, y, GridSquareStructures.STONE_WALL)
+
+    return env
+
+
+def main():
+    for size in (100, 250, 500, 1000):
+        # The AStar grid gets very big, so only make it on the smaller maps
+        use_grid = size <= 250
+
+        for name, create in (("Generated", generated_environment), ("Walled", walled_environment)):
+            print(f"{name} {size}x{size}")
+
+            env = create(size, not use_grid)
+            env.update_node_connections()
+
+            start, goal = (1, 1), (size - 3, size - 3)
+
+            for pathfinder_name, pathfinder in (("A*", Pathfinder(env)), ("Jump Point Search", Pathfinder(env, True))):
+                begin = pc()
+                path = pathfinder.find_path(start, goal)
+                print(f"    {pathfinder_name}".ljust(30), pc() - begin, f"cost {pathfinder.path_cost(path):.2f},",
+                      f"{pathfinder.last_expanded} expanded")
+
+            hierarchical_pathfinder = HierarchicalPathfinder(env)
+
+            # The first path works out every cluster it looks at
+            begin = pc()
+            hierarchical_pathfinder.find_path(start, goal)
+            print("    HPA* first path".ljust(30), pc() - begin, f"{hierarchical_pathfinder.built_clusters} clusters")
+
+            begin = pc()
+            path = hierarchical_pathfinder.find_path(start, goal)
+            print("    HPA*".ljust(30), pc() - begin, f"cost {env.pathfinder.path_cost(path):.2f},",
+                  f"{hierarchical_pathfinder.last_expanded} expanded")
+
+            begin = pc()
+            hierarchical_pathfinder.build_all_clusters()
+            print("    HPA* building the rest".ljust(30), pc() - begin)
+
+            # Only the changed cluster is worked out again
+            env.set_structure(size // 2, size // 2, GridSquareStructures.STONE_WALL)
+            begin = pc()
+            hierarchical_pathfinder.find_path(start, goal)
+            print("    HPA* after a change".ljust(30), pc() - begin)
+
+            if use_grid:
+                begin = pc()
+                cost = grid_square_a_star(env, start, goal)
+                print("    GridSquare A*".ljust(30), pc() - begin, f"cost {cost:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+from time import perf_counter as pc
+
+import numpy as np
+
+from environment import Environment, Simulation
+from environment.Generators import TerrainGenerator, TreeGenerator, StoneGenerator, GeneratorHandler
+
+
+def main():
+    size = 500
+    ticks = 100
+
+    env = Environment(size, size, compact=True)
+    env.set_player_base(1, 1)
+    env.set_player_base(env.x_size - 3, env.y_size - 3)
+    GeneratorHandler(TerrainGenerator(env), TreeGenerator(env), StoneGenerator(env)).generate()
+
+    # Making the flow fields first so they aren't part of the first tick
+    start = pc()
+    for player_base_location in env.player_base_locations:
+        env.get_flow_field(player_base_location)
+    print("Flow Fields".ljust(30), pc() - start)
+
+    rng = np.random.default_rng(1)
+
+    for count in (1000, 10000, 50000):
+        sim = Simulation(env)
+
+        # Half of the entities march on each base
+        start = pc()
+        sim.spawn(rng.integers(0, size, count), rng.integers(0, size, count), owner=rng.integers(0, 2, count))
+        for owner, player_base_location in enumerate(env.player_base_locations):
+            sim.move_to_player_base(sim.ids[sim.owners != owner], player_base_location)
+        print(f"Spawn {count}".ljust(30), pc() - start)
+
+        tick_times = []
+        for _ in range(ticks):
+            sim.tick()
+            tick_times.append(sim.last_tick_time)
+
+        print(f"Tick {count} median".ljust(30), np.median(tick_times))
+        print(f"Tick {count} max".ljust(30), max(tick_times))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+from time import perf_counter as pc
+
+import numpy as np
+
+from environment import SpatialHash, QuadTree
+
+
+def check(rng: np.random.Generator):
+    """
+Checks the queries of both against checking every entity, with some entities and query points outside the
+environment, which go in the buckets and leaves on its edges.
+    """
+
+    size = 100
+    count = 2000
+
+    ids = np.arange(count)
+    x_positions = rng.uniform(-10, size + 10, count)
+    y_positions = rng.uniform(-10, size + 10, count)
+
+    for index in (SpatialHash(size, size), QuadTree(size, size, leaf_capacity=4)):
+        index.update(ids, x_positions, y_positions)
+
+        for _ in range(200):
+            x, y = rng.uniform(-20, size + 20, 2).tolist()
+            k = int(rng.integers(1, 20))
+            radius = float(rng.uniform(0, 30))
+
+            distances = np.hypot(x_positions - x, y_positions - y)
+
+            expected = ids[np.lexsort((ids, distances))][:k]
+            assert np.array_equal(index.nearest(x, y, k), expected), f"{type(index).__name__} nearest is wrong"
+
+            expected = ids[np.lexsort((ids, distances))]
+            expected = expected[distances[expected] <= radius][:k]
+            assert np.array_equal(index.nearest(x, y, k, radius), expected), \
+                f"{type(index).__name__} nearest within a radius is wrong"
+
+            dx, dy = x_positions - x, y_positions - y
+            expected = ids[dx * dx + dy * dy <= radius * radius]
+            assert np.array_equal(np.sort(index.query_radius(x, y, radius)), expected), \
+                f"{type(index).__name__} query_radius is wrong"
+
+            inside = (x_positions >= x) & (x_positions <= x + radius) & (y_positions >= y) & (y_positions <= y + radius)
+            assert np.array_equal(np.sort(index.query_rect(x, y, radius, radius)), ids[inside]), \
+                f"{type(index).__name__} query_rect is wrong"
+
+    print("Checked against every entity")
+
+
+def main():
+    size = 500
+    queries = 1000
+    radius = 5
+
+    rng = np.random.default_rng(1)
+
+    check(rng)
+
+    for count in (1000, 10000, 50000):
+        print(f"{count} entities")
+
+        ids = np.arange(count)
+        x_positions = rng.integers(0, size, count).astype(np.float64)
+        y_positions = rng.integers(0, size, count).astype(np.float64)
+        query_ids = rng.choice(count, queries, replace=False)
+
+        # Checking every entity for every query
+        start = pc()
+        for query_id in query_ids.tolist():
+            dx, dy = x_positions - x_positions[query_id], y_positions - y_positions[query_id]
+            ids[dx * dx + dy * dy <= radius * radius]
+        print("  Scan radius".ljust(30), pc() - start)
+
+        for index in (SpatialHash(size, size), QuadTree(size, size)):
+            name = type(index).__name__
+
+            start = pc()
+            index.update(ids, x_positions, y_positions)
+            print(f"  {name} build".ljust(30), pc() - start)
+
+            # A tick of every entity moving by up to one grid square
+            x_positions = np.clip(x_positions + rng.integers(-1, 2, count), 0, size - 1)
+            y_positions = np.clip(y_positions + rng.integers(-1, 2, count), 0, size - 1)
+
+            start = pc()
+            index.update(ids, x_positions, y_positions)
+            print(f"  {name} update".ljust(30), pc() - start)
+
+            start = pc()
+            for query_id in query_ids.tolist():
+                index.query_radius(x_positions[query_id], y_positions[query_id], radius)
+            print(f"  {name} radius".ljust(30), pc() - start)
+
+            start = pc()
+            for query_id in query_ids.tolist():
+                index.nearest(x_positions[query_id], y_positions[query_id], 8)
+            print(f"  {name} nearest 8".ljust(30), pc() - start)
+
+
+if __name__ == "__main__":
+    main()
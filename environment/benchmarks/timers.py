@@ -0,0 +1,40 @@
+import random
+from time import perf_counter as pc
+
+from environment import TimingWheel
+
+
+def main():
+    ticks = 1000
+
+    for count in (1000, 10000, 100000):
+        print(f"{count} timers")
+
+        random.seed(1)
+        intervals = [random.randint(10, 600) for _ in range(count)]
+
+        # Counting down every timer every tick
+        remaining = intervals.copy()
+        fired = 0
+        start = pc()
+        for _ in range(ticks):
+            for index in range(count):
+                remaining[index] -= 1
+                if remaining[index] == 0:
+                    remaining[index] = intervals[index]
+                    fired += 1
+        print("  Polling".ljust(30), pc() - start, fired)
+
+        timing_wheel = TimingWheel()
+        for index, interval in enumerate(intervals):
+            timing_wheel.schedule(interval, index, interval)
+
+        fired = 0
+        start = pc()
+        for _ in range(ticks):
+            fired += len(timing_wheel.advance())
+        print("  Timing wheel".ljust(30), pc() - start, fired)
+
+
+if __name__ == "__main__":
+    main()
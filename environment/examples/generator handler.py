@@ -2,8 +2,7 @@ from time import perf_counter as pc
 
 import matplotlib.pyplot as plt
 
-from environment import Environment
-from environment.EnvironmentData import GridSquareTerrain, GridSquareStructures
+from environment import Environment, Renderer
 from environment.Generators import TerrainGenerator, TreeGenerator, StoneGenerator, GeneratorHandler
 
 
@@ -20,7 +19,7 @@ def main():
     # Generator Handler
     start = pc()
     generator_handler = GeneratorHandler(
-        TerrainGenerator(env),  # Should come first
+        TerrainGenerator(env),
         TreeGenerator(env),
         StoneGenerator(env)
     )
@@ -46,32 +45,9 @@ def main():
     env.update_node_connections()
     print("Updating Node Connections".ljust(30), pc() - start)
 
-    # Colours
-    terrain_colours = {
-        GridSquareTerrain.CLEAR: (70, 110, 45),
-        GridSquareTerrain.HILL: (50, 80, 50),
-        GridSquareTerrain.MOUNTAIN: (50, 55, 70),
-        GridSquareTerrain.SNOW: (255, 255, 255)
-    }
-
-    structure_colours = {
-        GridSquareStructures.PLAYER_BASE: (255, 0, 0),
-        GridSquareStructures.TREE: (0, 255, 0),
-        GridSquareStructures.STONE: (0, 0, 255)
-    }
-
     # Drawing the environment
     start = pc()
-    colour_map = [[(0, 0, 0) for _ in range(env.x_size)] for _ in range(env.y_size)]
-    for y in range(env.y_size):
-        for x in range(env.x_size):
-            # Check for structure first
-            if env[x, y].structure in structure_colours:
-                colour_map[y][x] = structure_colours[env[x, y].structure]
-                continue
-
-            # Then terrain
-            colour_map[y][x] = terrain_colours[env[x, y].terrain]
+    colour_map = Renderer().render(env)
     print("Drawing Environment".ljust(30), pc() - start)
 
     print("Total Time".ljust(30), pc() - very_start)
@@ -1,7 +1,6 @@
 # ToDo: UI Time
 # ToDo: Map creating tool
 #   Add in a way of storing a var reference, name, min, max and increment for the ui
-# ToDo: Create a save format for maps that is easily upgradable
 
 import tkinter as tk
 from tkinter import ttk